@@ -0,0 +1,67 @@
+"""
+Binary table responses.
+
+Tables (processed minute-level data, the bulk summary dataframe and the feature
+correlation matrix) can be returned as Arrow IPC streams (requested with
+"Accept: application/vnd.apache.arrow.stream") or as Parquet files instead of
+JSON, so that clients load them into pandas/polars without parsing JSON. Both
+need pyarrow; without it only JSON is available.
+"""
+
+from typing import Optional
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+
+# Value of the format query parameter requesting a Parquet file
+PARQUET_FORMAT = "parquet"
+
+
+def arrow_available() -> bool:
+    """
+    Return True if Arrow and Parquet output is available (pyarrow is installed)
+    """
+    return pa is not None
+
+
+def accepts_arrow_stream(accept: Optional[str]) -> bool:
+    """
+    Return True if an Accept header asks for an Arrow IPC stream
+    """
+    if not accept:
+        return False
+    media_types = [part.split(";")[0].strip().lower() for part in accept.split(",")]
+    return ARROW_STREAM_MEDIA_TYPE in media_types
+
+
+def _to_arrow_table(df: pd.DataFrame):
+    # Named indexes (e.g. TIMESTAMP or the features of a correlation matrix) become columns
+    return pa.Table.from_pandas(df, preserve_index=None)
+
+
+def dataframe_to_arrow_stream(df: pd.DataFrame) -> bytes:
+    """
+    Serialize a DataFrame to an Arrow IPC stream
+    """
+    table = _to_arrow_table(df)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def dataframe_to_parquet(df: pd.DataFrame) -> bytes:
+    """
+    Serialize a DataFrame to a Parquet file
+    """
+    sink = pa.BufferOutputStream()
+    pq.write_table(_to_arrow_table(df), sink)
+    return sink.getvalue().to_pybytes()
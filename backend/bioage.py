@@ -0,0 +1,102 @@
+"""
+CosinorAge prediction from precomputed cosinor parameters.
+
+CosinorAge refits the cosinor model on the minute-level data of every record.
+When MESOR, amplitude and acrophase are already known (e.g. from
+WearableFeatures), the prediction only requires the model arithmetic below,
+which uses the coefficients of the cosinorage package. Many predictions are
+scored at once with predict_cosinorage_batch.
+"""
+
+import math
+from typing import Dict, Sequence, Union
+
+import numpy as np
+from cosinorage.bioages.cosinorage import (BA_d, BA_i, BA_n, m_d, m_n,
+                                           model_params_female,
+                                           model_params_generic,
+                                           model_params_male)
+
+
+def get_model_params(gender: str) -> dict:
+    """
+    Return the model coefficients for the given gender
+    """
+    if gender == "female":
+        return model_params_female
+    elif gender == "male":
+        return model_params_male
+    return model_params_generic
+
+
+# Biomarkers weighted by the model coefficients
+MODEL_FEATURES = ("mesor", "amp1", "phi1", "age")
+
+# Coefficients of MODEL_FEATURES and the rate, one row per model (female, male, generic)
+MODEL_COEFFICIENTS = np.array([
+    [params[key] for key in MODEL_FEATURES + ("rate",)]
+    for params in (model_params_female, model_params_male, model_params_generic)
+])
+
+
+def _is_valid(value) -> bool:
+    try:
+        return value is not None and math.isfinite(float(value))
+    except (TypeError, ValueError):
+        return False
+
+
+def predict_cosinorage_from_params(mesor: float, amp1: float, phi1: float,
+                                   age: float, gender: str = "unknown") -> dict:
+    """
+    Compute the CosinorAge prediction from cosinor parameters
+
+    Returns a dictionary with the same keys CosinorAge adds to its records
+    (mesor, amp1, phi1, cosinorage, cosinorage_advance). All values are None if
+    the cosinor parameters are missing or not finite.
+    """
+    if not (_is_valid(mesor) and _is_valid(amp1) and _is_valid(phi1)):
+        return {
+            "mesor": None,
+            "amp1": None,
+            "phi1": None,
+            "cosinorage": None,
+            "cosinorage_advance": None
+        }
+
+    prediction = predict_cosinorage_batch([mesor], [amp1], [phi1], [age], [gender])
+    return {
+        "mesor": mesor,
+        "amp1": amp1,
+        "phi1": phi1,
+        "cosinorage": float(prediction["cosinorage"][0]),
+        "cosinorage_advance": float(prediction["cosinorage_advance"][0])
+    }
+
+
+def predict_cosinorage_batch(mesor: Sequence[float], amp1: Sequence[float], phi1: Sequence[float],
+                             age: Sequence[float], gender: Union[str, Sequence[str]]) -> Dict[str, np.ndarray]:
+    """
+    Compute the CosinorAge predictions of many subjects at once
+
+    Takes one value per subject (gender may also be a single value for all
+    subjects) and applies the female, male or generic model coefficients to
+    all subjects in one vectorized step. Returns arrays of cosinorage and
+    cosinorage_advance; predictions with missing or non-finite values are NaN.
+    """
+    features = np.array([np.asarray(values, dtype=float)
+                         for values in (mesor, amp1, phi1, age)])
+    gender = np.broadcast_to(np.asarray(gender, dtype=object), features.shape[1:])
+    model = np.where(gender == "female", 0, np.where(gender == "male", 1, 2))
+    coef = MODEL_COEFFICIENTS[model]
+
+    with np.errstate(invalid="ignore", over="ignore", divide="ignore"):
+        xb = np.einsum("ij,ji->i", coef[:, :-1], features) + coef[:, -1]
+        m_val = 1 - np.exp((m_n * np.exp(xb)) / m_d)
+        cosinorage = ((np.log(BA_n * np.log(1 - m_val))) / BA_d) + BA_i
+    cosinorage[~np.isfinite(features).all(axis=0)] = np.nan
+
+    return {
+        "cosinorage": cosinorage,
+        "cosinorage_advance": cosinorage - features[3]
+    }
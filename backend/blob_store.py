@@ -0,0 +1,178 @@
+"""
+Content-addressed store for uploaded files.
+
+Uploads are hashed (SHA-256) while they are streamed to disk and stored once
+per content: identical files uploaded several times (or under different names)
+share one blob on disk. Everything derived from the content alone (the CSV
+schema, the columnar copy, the ZIP directory tree and the extracted files) is
+kept with the blob and computed only once.
+
+Every file_id referencing a blob is recorded as one of its holders. A blob,
+together with its derived files, is deleted when its last holder is released.
+Blobs and holders are recorded in the shared state database, so all worker
+processes use the same blobs.
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from state_store import StateDatabase
+except ImportError:
+    from backend.state_store import StateDatabase
+
+logger = logging.getLogger(__name__)
+
+
+class BlobStore:
+    """
+    Keeps uploaded files by content hash and records the file_ids using them
+
+    Blobs are stored as <root_dir>/objects/<hash>/<filename>; files derived from
+    a blob are written to the same directory (see derived_path).
+    """
+
+    def __init__(self, root_dir: str, db: StateDatabase):
+        self.root_dir = root_dir
+        self.db = db
+        self._locks: Dict[str, asyncio.Lock] = {}  # Per-process locks by content hash
+
+    def staging_path(self, filename: str) -> str:
+        """
+        Return a new path to stream an upload to before its hash is known
+        """
+        staging_dir = os.path.join(self.root_dir, "staging")
+        os.makedirs(staging_dir, exist_ok=True)
+        return os.path.join(staging_dir, f"{uuid.uuid4().hex}_{os.path.basename(filename)}")
+
+    def add(self, file_path: str, content_hash: str, filename: str) -> Tuple[Dict[str, Any], bool]:
+        """
+        Move a file with the given content hash into the store
+
+        If a blob with the same content exists, the file is deleted instead.
+        Returns the blob and whether it already existed.
+        """
+        blob = self.db.get_blob(content_hash)
+        if blob is not None and os.path.exists(blob["path"]):
+            os.remove(file_path)
+            logger.info(
+                f"Upload {filename} is a duplicate of blob {content_hash[:12]} ({blob['size']} bytes)")
+            return blob, True
+
+        blob_dir = os.path.join(self.root_dir, "objects", content_hash)
+        os.makedirs(blob_dir, exist_ok=True)
+        blob_path = os.path.join(blob_dir, os.path.basename(filename))
+        # Files from another file system are copied
+        shutil.move(file_path, blob_path)
+
+        blob = {
+            "content_hash": content_hash,
+            "path": blob_path,
+            "dir": blob_dir,
+            "size": os.path.getsize(blob_path),
+            "derived": {},
+            "created_at": time.time()
+        }
+        self.db.insert_blob(blob)
+        return blob, False
+
+    def get(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the blob with the given content hash, or None
+        """
+        return self.db.get_blob(content_hash)
+
+    def get_for_file(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the blob used by file_id, or None
+        """
+        content_hash = self.db.get_blob_ref(file_id)
+        return None if content_hash is None else self.db.get_blob(content_hash)
+
+    def file_ids(self, content_hash: str) -> List[str]:
+        """
+        Return the file_ids using a blob
+        """
+        return self.db.blob_file_ids(content_hash)
+
+    def set_derived(self, content_hash: str, key: str, value: Any):
+        """
+        Record a value derived from a blob (a JSON value, e.g. a path or a schema)
+        """
+        self.db.set_blob_derived(content_hash, key, value)
+
+    def lock(self, content_hash: str) -> asyncio.Lock:
+        """
+        Return the lock serializing the derivation of files from a blob in this process
+
+        Other processes may derive the same files concurrently, so derived
+        directories are written to a temporary path and renamed into place.
+        """
+        return self._locks.setdefault(content_hash, asyncio.Lock())
+
+    def derived_path(self, content_hash: str, name: str) -> str:
+        """
+        Return the path of a file or directory derived from a blob
+
+        Derived files are deleted together with the blob.
+        """
+        return os.path.join(self.root_dir, "objects", content_hash, name)
+
+    def acquire(self, content_hash: str, file_id: str):
+        """
+        Record file_id as a holder of the blob
+        """
+        previous_hash = self.db.get_blob_ref(file_id)
+        if previous_hash not in (None, content_hash):
+            # file_id is reused for other content
+            self.release(file_id)
+        self.db.add_blob_ref(content_hash, file_id)
+
+    def release(self, file_id: str) -> bool:
+        """
+        Remove file_id from the holders of its blob
+
+        Deletes the blob and its derived files if no other file_id uses it.
+        Returns True if the blob was deleted.
+        """
+        content_hash = self.db.remove_blob_ref(file_id)
+        if content_hash is None:
+            return False
+        return self.discard_if_unused(content_hash)
+
+    def discard_if_unused(self, content_hash: str) -> bool:
+        """
+        Delete a blob and its derived files if no file_id uses it. Returns True if it was deleted.
+        """
+        blob = self.db.delete_blob_if_unused(content_hash)
+        if blob is None:
+            return False
+        self._locks.pop(content_hash, None)
+        shutil.rmtree(blob["dir"], ignore_errors=True)
+        logger.info(f"Deleted blob {content_hash[:12]} ({blob['size']} bytes)")
+        return True
+
+    def clear(self):
+        """
+        Delete all blobs and staged uploads
+        """
+        self.db.clear_blobs()
+        self._locks.clear()
+        shutil.rmtree(self.root_dir, ignore_errors=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the number and size of the stored blobs and the bytes saved by deduplication
+        """
+        blobs, files, stored_bytes, referenced_bytes = self.db.blob_stats()
+        return {
+            "blobs": blobs,
+            "files": files,
+            "stored_bytes": stored_bytes,
+            "deduplicated_bytes": max(referenced_bytes - stored_bytes, 0)
+        }
@@ -0,0 +1,127 @@
+"""
+Parallel bulk feature computation.
+
+Builds the cohort statistics of BulkWearableFeatures from the features that
+were computed per subject in parallel on the execution engine.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from cosinorage.features.bulk_features import BulkWearableFeatures
+
+logger = logging.getLogger(__name__)
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float, np.number))
+
+
+def flatten_features(features_list: List[dict]) -> pd.DataFrame:
+    """
+    Flatten per-subject feature dictionaries into one row per subject
+
+    Numeric features become <category>_<feature> columns (CosinorAge features
+    keep their name), numeric lists are averaged and flags and other values
+    are skipped, like BulkWearableFeatures does.
+    """
+    rows = []
+    for i, features in enumerate(features_list):
+        row = {"handler_index": i}
+        for category, category_features in features.items():
+            if not isinstance(category_features, dict):
+                if _is_number(category_features):
+                    row[category] = category_features
+                continue
+            for feature_name, feature_value in category_features.items():
+                if feature_name.endswith("_flag"):
+                    continue
+                column = feature_name if category == "cosinorage" else f"{category}_{feature_name}"
+                if isinstance(feature_value, (list, np.ndarray)):
+                    if len(feature_value) > 0 and all(_is_number(x) for x in feature_value):
+                        row[column] = np.mean(feature_value)
+                elif _is_number(feature_value):
+                    row[column] = feature_value
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def compute_distribution_stats(individual_features: List[Optional[dict]]) -> Dict[str, Dict[str, float]]:
+    """
+    Return the statistics of every numeric feature across the subjects
+
+    Failed subjects (None) are skipped. The statistics are the ones reported by
+    BulkWearableFeatures.get_distribution_stats.
+    """
+    valid_features = [f for f in individual_features if f is not None]
+    if not valid_features:
+        return {}
+
+    df = flatten_features(valid_features)
+    stats = {}
+    for column in df.select_dtypes(include=[np.number]).columns:
+        if column == "handler_index":
+            continue
+        values = df[column].dropna()
+        if len(values) == 0:
+            continue
+        q25, q75 = np.percentile(values, [25, 75])
+        mode_values = values.mode()
+        stats[column] = {
+            "count": len(values),
+            "mean": float(np.mean(values)),
+            "std": float(np.std(values)),
+            "min": float(np.min(values)),
+            "max": float(np.max(values)),
+            "median": float(np.median(values)),
+            "q25": float(q25),
+            "q75": float(q75),
+            "iqr": float(q75 - q25),
+            "mode": float(mode_values.iloc[0]) if len(mode_values) > 0 else float("nan"),
+            "skewness": float(values.skew())
+        }
+    return stats
+
+
+class ParallelBulkWearableFeatures(BulkWearableFeatures):
+    """
+    BulkWearableFeatures built from features that were computed per subject in parallel
+
+    The features are computed by the caller (e.g. on the execution engine); this class
+    provides the cohort statistics, summary and correlation matrix on top of them.
+
+    Args:
+        individual_features (List[Optional[dict]]): Features per subject, None for failed subjects.
+        failed_handlers (List[tuple], optional): (index, error message) of every failed subject.
+        compute_distributions (bool, optional): Whether to compute statistical distributions.
+    """
+
+    def __init__(
+        self,
+        individual_features: List[Optional[dict]],
+        failed_handlers: Optional[List[tuple]] = None,
+        compute_distributions: bool = True
+    ):
+        # Without handlers, BulkWearableFeatures computes nothing itself
+        super().__init__(handlers=[], compute_distributions=False)
+        self.individual_features = list(individual_features)
+        self.failed_handlers = list(failed_handlers or [])
+        if compute_distributions:
+            self.distribution_stats = compute_distribution_stats(self.individual_features)
+
+    @classmethod
+    def from_individual_features(
+        cls,
+        individual_features: List[Optional[dict]],
+        failed_handlers: Optional[List[tuple]] = None,
+        compute_distributions: bool = True
+    ) -> "ParallelBulkWearableFeatures":
+        """
+        Build the cohort statistics from features that were already computed per subject
+
+        individual_features and failed_handlers follow the same conventions as the
+        attributes computed by BulkWearableFeatures (None marks a failed subject).
+        """
+        return cls(individual_features, failed_handlers, compute_distributions)
@@ -0,0 +1,164 @@
+"""
+Columnar copies of uploaded CSV files.
+
+After upload, every CSV file is converted once to an uncompressed Arrow IPC
+(Feather v2) file next to it. Later reads (column names, previews and the data
+handlers) memory-map that copy instead of parsing the text file again. If
+pyarrow is not installed or the copy does not exist (yet), the CSV file is read
+as before.
+"""
+
+import logging
+import os
+import types
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from pandas._libs.parsers import STR_NA_VALUES
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+COLUMNAR_SUFFIX = ".arrow"
+
+# Strings read as missing values, in any column, like pd.read_csv does by default
+NULL_VALUES = sorted(STR_NA_VALUES)
+
+
+def columnar_available() -> bool:
+    """
+    Return True if columnar copies can be written (pyarrow is installed)
+    """
+    return pa is not None
+
+
+def get_columnar_path(file_path: str) -> str:
+    """
+    Return the path of the columnar copy of file_path
+    """
+    return file_path + COLUMNAR_SUFFIX
+
+
+def has_columnar_copy(file_path: str) -> bool:
+    """
+    Return True if a complete columnar copy of file_path exists
+    """
+    return pa is not None and os.path.exists(get_columnar_path(file_path))
+
+
+def convert_to_columnar(file_path: str) -> Optional[str]:
+    """
+    Write a typed columnar copy of a CSV file and return its path
+
+    Missing values are recognized like pd.read_csv does, also in text columns.
+    The copy is written to a temporary file and moved into place, so readers never
+    see a partially written copy. Returns None if pyarrow is not installed.
+    """
+    if pa is None:
+        return None
+
+    columnar_path = get_columnar_path(file_path)
+    temp_path = columnar_path + ".tmp"
+
+    # Keep date/time columns as text so that they are parsed exactly like the CSV
+    # (Arrow would otherwise convert timestamps with UTC offsets to UTC)
+    null_options = {"null_values": NULL_VALUES, "strings_can_be_null": True}
+    with pa_csv.open_csv(file_path, convert_options=pa_csv.ConvertOptions(**null_options)) as reader:
+        schema = reader.schema
+    column_types = {
+        field.name: pa.string() for field in schema
+        if pa.types.is_temporal(field.type)
+    }
+    table = pa_csv.read_csv(
+        file_path, convert_options=pa_csv.ConvertOptions(column_types=column_types, **null_options))
+    # Uncompressed so that the file can be memory-mapped without decoding
+    feather.write_feather(table, temp_path, compression="uncompressed")
+    os.replace(temp_path, columnar_path)
+
+    logger.info(
+        f"Wrote columnar copy of {file_path} ({table.num_rows} rows, {table.num_columns} columns)")
+    return columnar_path
+
+
+def read_table(file_path: str, nrows: int = None, columns: List[str] = None) -> pd.DataFrame:
+    """
+    Read an uploaded CSV file, from its memory-mapped columnar copy if available
+    """
+    if has_columnar_copy(file_path):
+        table = feather.read_table(
+            get_columnar_path(file_path), columns=columns, memory_map=True)
+        if nrows is not None:
+            table = table.slice(0, nrows)
+        data = table.to_pandas()
+        # Arrow returns missing values of object columns (e.g. booleans) as None, pandas as NaN
+        for column in data.columns[data.dtypes == object]:
+            data[column] = data[column].where(data[column].notna(), np.nan)
+        return data
+    return pd.read_csv(file_path, nrows=nrows, usecols=columns)
+
+
+def read_column_names(file_path: str) -> List[str]:
+    """
+    Return the column names of an uploaded CSV file
+
+    With a columnar copy only the schema is read.
+    """
+    if has_columnar_copy(file_path):
+        with pa.memory_map(get_columnar_path(file_path)) as source:
+            return pa.ipc.open_file(source).schema.names
+    return pd.read_csv(file_path, nrows=0).columns.tolist()
+
+
+class _ColumnarPandas:
+    """
+    pandas, except that read_csv of a whole file reads its columnar copy if available
+    """
+
+    def __getattr__(self, name):
+        return getattr(pd, name)
+
+    @staticmethod
+    def read_csv(filepath_or_buffer, *args, **kwargs):
+        if not args and not kwargs and isinstance(filepath_or_buffer, str):
+            return read_table(filepath_or_buffer)
+        return pd.read_csv(filepath_or_buffer, *args, **kwargs)
+
+
+def with_columnar_reads(reader):
+    """
+    Return a copy of a cosinorage reader function that reads CSV files through read_table
+
+    Only the pd.read_csv calls of the reader are redirected; everything else
+    runs the code of the installed cosinorage version.
+    """
+    if reader.__globals__.get("pd") is not pd:
+        logger.warning(
+            f"{reader.__module__}.{reader.__name__} does not use pandas as pd, columnar copies are not used")
+        return reader
+    columnar_reader = types.FunctionType(
+        reader.__code__, {**reader.__globals__, "pd": _ColumnarPandas()},
+        reader.__name__, reader.__defaults__, reader.__closure__)
+    columnar_reader.__kwdefaults__ = reader.__kwdefaults__
+    columnar_reader.__doc__ = reader.__doc__
+    return columnar_reader
+
+
+def use_columnar_readers():
+    """
+    Make GenericDataHandler and GalaxyDataHandler read CSV files through the columnar copies
+
+    Both handlers look their readers up in their module namespaces, so replacing
+    them there is enough. Called on import of the processing module.
+    """
+    from cosinorage.datahandlers import galaxydatahandler, genericdatahandler
+    from cosinorage.datahandlers.utils.galaxy_csv import read_galaxy_csv_data
+    from cosinorage.datahandlers.utils.generic import read_generic_xD_data
+    genericdatahandler.read_generic_xD_data = with_columnar_reads(read_generic_xD_data)
+    galaxydatahandler.read_galaxy_csv_data = with_columnar_reads(read_galaxy_csv_data)
@@ -0,0 +1,277 @@
+"""
+Response compression.
+
+CompressionMiddleware compresses API responses above a minimum size with
+brotli (if the brotli package is installed and accepted by the client) or
+gzip. Large bodies are compressed in a worker thread so that the event loop is
+not blocked. Responses that already carry a Content-Encoding (such as the
+precompressed static downloads) or that hold compressed data are passed
+through unchanged.
+
+Static downloads are compressed once at startup (see precompress_file) and the
+matching variant is served directly (see precompressed_file_response).
+"""
+
+import asyncio
+import logging
+import os
+import zlib
+from typing import Dict, List, Optional
+
+from fastapi.responses import FileResponse
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Responses smaller than this are sent uncompressed (set via the COMPRESSION_MINIMUM_SIZE environment variable)
+COMPRESSION_MINIMUM_SIZE = int(os.environ.get("COMPRESSION_MINIMUM_SIZE", 1024))
+
+# Bodies at least this large are compressed in a worker thread
+COMPRESSION_THREAD_THRESHOLD_BYTES = 256 * 1024
+
+# Compression levels for responses (fast) and for precompressed files (small)
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+PRECOMPRESS_GZIP_LEVEL = 9
+PRECOMPRESS_BROTLI_QUALITY = 11
+
+# Precompressed variants are only kept if they are at most this fraction of the original size
+PRECOMPRESS_MAX_RATIO = 0.9
+
+# Media types whose content is already compressed
+COMPRESSED_MEDIA_TYPES = (
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/vnd.apache.parquet",
+    "image/",
+    "video/",
+    "audio/",
+)
+
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def available_encodings() -> List[str]:
+    """
+    Return the supported content encodings in order of preference
+    """
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def choose_encoding(accept_encoding: Optional[str], encodings: List[str] = None) -> Optional[str]:
+    """
+    Return the preferred encoding accepted by an Accept-Encoding header, or None
+
+    Encodings listed with q=0 are treated as not accepted.
+    """
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for part in accept_encoding.split(","):
+        params = [param.strip() for param in part.split(";")]
+        coding = params[0].lower()
+        q = 1.0
+        for param in params[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if coding and q > 0:
+            accepted.add(coding)
+
+    for encoding in available_encodings() if encodings is None else encodings:
+        if encoding in accepted or "*" in accepted:
+            return encoding
+    return None
+
+
+class _Encoder:
+    """
+    Incremental gzip or brotli compressor
+    """
+
+    def __init__(self, encoding: str, level: int = None):
+        if encoding == "br":
+            self._compressor = brotli.Compressor(
+                quality=BROTLI_QUALITY if level is None else level)
+            self.compress = self._compressor.process
+            self.finish = self._compressor.finish
+        else:
+            # wbits=31 writes a gzip header and trailer
+            self._compressor = zlib.compressobj(
+                GZIP_LEVEL if level is None else level, zlib.DEFLATED, 31)
+            self.compress = self._compressor.compress
+            self.finish = self._compressor.flush
+
+
+def compress_bytes(data: bytes, encoding: str, level: int = None) -> bytes:
+    """
+    Compress data with the given content encoding
+    """
+    encoder = _Encoder(encoding, level)
+    return encoder.compress(data) + encoder.finish()
+
+
+def _is_compressible(headers: Headers) -> bool:
+    if "content-encoding" in headers:
+        return False
+    media_type = headers.get("content-type", "").lower()
+    return not media_type.startswith(COMPRESSED_MEDIA_TYPES)
+
+
+class CompressionMiddleware:
+    """
+    Compress HTTP responses of at least minimum_size bytes with brotli or gzip
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MINIMUM_SIZE) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+            if encoding is not None:
+                responder = _CompressionResponder(self.app, encoding, self.minimum_size)
+                await responder(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class _CompressionResponder:
+    """
+    Compress the response of a single request (see starlette's GZipResponder)
+    """
+
+    def __init__(self, app: ASGIApp, encoding: str, minimum_size: int) -> None:
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send = None
+        self.initial_message: Message = {}
+        self.started = False
+        self.passthrough = False
+        self.encoder = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            # Wait for the first body message to decide on the headers
+            self.initial_message = message
+            return
+        if message_type != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if not self.started:
+            self.started = True
+            headers = MutableHeaders(raw=self.initial_message["headers"])
+            if not _is_compressible(headers) or (len(body) < self.minimum_size and not more_body):
+                self.passthrough = True
+                await self.send(self.initial_message)
+                await self.send(message)
+                return
+
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                # Streaming response: compress chunk by chunk
+                del headers["Content-Length"]
+                self.encoder = _Encoder(self.encoding)
+                message["body"] = self.encoder.compress(body)
+            else:
+                message["body"] = await self._compress_body(body)
+                headers["Content-Length"] = str(len(message["body"]))
+            await self.send(self.initial_message)
+            await self.send(message)
+            return
+
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        compressed = self.encoder.compress(body)
+        if not more_body:
+            compressed += self.encoder.finish()
+        message["body"] = compressed
+        await self.send(message)
+
+    async def _compress_body(self, body: bytes) -> bytes:
+        if len(body) >= COMPRESSION_THREAD_THRESHOLD_BYTES:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, compress_bytes, body, self.encoding)
+        return compress_bytes(body, self.encoding)
+
+
+def precompress_file(file_path: str, target_dir: str) -> Dict[str, str]:
+    """
+    Write compressed variants of a static file to target_dir and return {encoding: path}
+
+    Existing variants newer than the file are reused. Variants that do not make
+    the file noticeably smaller (e.g. of ZIP archives) are not kept.
+    """
+    variants = {}
+    if not os.path.exists(file_path):
+        return variants
+
+    os.makedirs(target_dir, exist_ok=True)
+    source_size = os.path.getsize(file_path)
+    source_mtime = os.path.getmtime(file_path)
+    for encoding in available_encodings():
+        variant_path = os.path.join(
+            target_dir, os.path.basename(file_path) + ENCODING_SUFFIXES[encoding])
+        if not (os.path.exists(variant_path) and os.path.getmtime(variant_path) >= source_mtime):
+            level = PRECOMPRESS_BROTLI_QUALITY if encoding == "br" else PRECOMPRESS_GZIP_LEVEL
+            encoder = _Encoder(encoding, level)
+            temp_path = variant_path + ".tmp"
+            with open(file_path, "rb") as source, open(temp_path, "wb") as target:
+                while True:
+                    chunk = source.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    target.write(encoder.compress(chunk))
+                target.write(encoder.finish())
+            os.replace(temp_path, variant_path)
+
+        if os.path.getsize(variant_path) <= source_size * PRECOMPRESS_MAX_RATIO:
+            variants[encoding] = variant_path
+        else:
+            os.remove(variant_path)
+
+    logger.info(
+        f"Precompressed {file_path}: {', '.join(f'{enc} {os.path.getsize(path)} bytes' for enc, path in variants.items()) or 'not compressible'} (original {source_size} bytes)")
+    return variants
+
+
+def precompressed_file_response(request: Request, file_path: str, variants: Dict[str, str],
+                                filename: str, media_type: str) -> FileResponse:
+    """
+    Serve the precompressed variant of a static file accepted by the client, or the file itself
+    """
+    encoding = choose_encoding(
+        request.headers.get("accept-encoding"), [enc for enc in available_encodings() if enc in variants])
+    if encoding is None or not os.path.exists(variants[encoding]):
+        return FileResponse(path=file_path, filename=filename, media_type=media_type,
+                            headers={"Vary": "Accept-Encoding"})
+    return FileResponse(
+        path=variants[encoding],
+        filename=filename,
+        media_type=media_type,
+        headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"}
+    )
@@ -0,0 +1,84 @@
+"""
+Upload-time schema index of CSV files.
+
+The header, the first rows, the inferred dtypes, the delimiter and a candidate
+time column are sniffed once from the beginning of every uploaded CSV file and
+kept with the file's entry, so that column and preview requests (and the column
+inference of bulk processing) are answered from memory.
+"""
+
+import csv
+import io
+import logging
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Number of bytes read from the beginning of the file
+SCHEMA_SAMPLE_BYTES = 64 * 1024
+
+# Number of rows kept for previews
+SCHEMA_PREVIEW_ROWS = 5
+
+# Column names that are used as time column, in order of preference
+COMMON_TIME_COLUMNS = ['timestamp', 'time', 'datetime', 'date', 't']
+
+
+def infer_time_column(columns: List[str]) -> Optional[str]:
+    """
+    Return the most likely time column, or None if no column looks like one
+    """
+    lower_columns = {str(col).lower(): col for col in columns}
+    for name in COMMON_TIME_COLUMNS:
+        if name in lower_columns:
+            return lower_columns[name]
+    for col in columns:
+        if 'time' in str(col).lower() or 'date' in str(col).lower():
+            return col
+    return None
+
+
+def sniff_csv_schema(sample: bytes, complete: bool = False) -> Dict[str, Any]:
+    """
+    Sniff the schema of a CSV file from the first bytes of the file
+
+    complete indicates that sample holds the whole file; otherwise the last
+    (possibly truncated) line is ignored. Columns, preview rows and dtypes are
+    parsed like the data handlers parse the file (comma-separated); the sniffed
+    delimiter is reported separately.
+    """
+    text = sample.decode("utf-8", errors="replace")
+    if not complete and "\n" in text:
+        text = text[:text.rindex("\n") + 1]
+
+    try:
+        delimiter = csv.Sniffer().sniff(text, delimiters=",;\t|").delimiter
+    except csv.Error:
+        delimiter = ","
+
+    df = pd.read_csv(io.StringIO(text), nrows=SCHEMA_PREVIEW_ROWS)
+    columns = df.columns.tolist()
+
+    return {
+        "columns": columns,
+        "dtypes": {col: str(dtype) for col, dtype in df.dtypes.items()},
+        "preview": df.to_dict(orient='records'),
+        "delimiter": delimiter,
+        "time_column": infer_time_column(columns)
+    }
+
+
+def read_csv_schema(file_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Sniff the schema of a CSV file on disk, or return None if it cannot be parsed
+    """
+    try:
+        with open(file_path, "rb") as f:
+            sample = f.read(SCHEMA_SAMPLE_BYTES + 1)
+        complete = len(sample) <= SCHEMA_SAMPLE_BYTES
+        return sniff_csv_schema(sample[:SCHEMA_SAMPLE_BYTES], complete=complete)
+    except Exception as e:
+        logger.warning(f"Could not read CSV schema of {file_path}: {str(e)}")
+        return None
@@ -0,0 +1,254 @@
+"""
+Downsampling of timeseries for charts.
+
+Two modes are supported:
+
+- points: Largest-Triangle-Three-Buckets (LTTB) selects the given number of
+  points that preserve the visual shape of the series (including peaks that
+  averaging would hide). Each selected point carries the mean/min/max envelope
+  and wear fraction of its bucket.
+- resolution: the series is aggregated into fixed time buckets (e.g. '1h')
+  with the mean as value, the min/max envelope and the wear fraction.
+
+Both operate on level frames (see series_to_level), so that raw data and
+pre-aggregated levels of the ENMO pyramid are downsampled the same way. All
+reductions run on NumPy arrays; only LTTB iterates over the (few) output
+buckets.
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+# Resolution used when neither points nor resolution is requested
+DEFAULT_RESOLUTION = "1h"
+
+# Bounds of the number of points requested for LTTB
+MIN_POINTS = 3
+MAX_POINTS = 100000
+
+
+def parse_resolution(resolution: str) -> pd.Timedelta:
+    """
+    Parse a resolution such as '5min', '1h' or '1D'
+
+    Raises ValueError if the resolution is invalid or not positive.
+    """
+    try:
+        delta = pd.Timedelta(resolution)
+    except (TypeError, ValueError):
+        raise ValueError(
+            f"Invalid resolution '{resolution}'. Use e.g. '1min', '15min', '1h' or '1D'")
+    if delta <= pd.Timedelta(0):
+        raise ValueError("resolution must be positive")
+    return delta
+
+
+def validate_downsampling(points: Optional[int] = None, resolution: Optional[str] = None) -> None:
+    """
+    Check the points/resolution parameters of a downsampling request
+
+    Raises ValueError if both are given or one of them is invalid.
+    """
+    if points is not None and resolution is not None:
+        raise ValueError("Specify either points or resolution, not both")
+    if points is not None and not MIN_POINTS <= points <= MAX_POINTS:
+        raise ValueError(
+            f"points must be between {MIN_POINTS} and {MAX_POINTS}")
+    if resolution is not None:
+        parse_resolution(resolution)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Return the indices of the points selected by Largest-Triangle-Three-Buckets
+
+    x must be increasing. The first and last points are always kept; the others
+    are split into n_out - 2 buckets of (almost) equal size, and from each bucket
+    the point forming the largest triangle with the previously selected point
+    and the average of the next bucket is selected.
+    """
+    n = len(x)
+    if n_out >= n or n_out < MIN_POINTS:
+        return np.arange(n)
+
+    edges = _lttb_edges(n, n_out)
+    starts = edges[:-1]
+    ends = edges[1:]
+
+    # Average point of the bucket following each bucket (the last point for the last bucket)
+    cum_x = np.concatenate(([0.0], np.cumsum(x)))
+    cum_y = np.concatenate(([0.0], np.cumsum(y)))
+    next_starts = np.append(starts[1:], n - 1)
+    next_ends = np.append(ends[1:], n)
+    next_counts = next_ends - next_starts
+    avg_x = (cum_x[next_ends] - cum_x[next_starts]) / next_counts
+    avg_y = (cum_y[next_ends] - cum_y[next_starts]) / next_counts
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        bucket_x = x[starts[i]:ends[i]]
+        bucket_y = y[starts[i]:ends[i]]
+        areas = np.abs((x[a] - avg_x[i]) * (bucket_y - y[a]) -
+                       (x[a] - bucket_x) * (avg_y[i] - y[a]))
+        a = starts[i] + int(np.argmax(areas))
+        selected[i + 1] = a
+
+    return selected
+
+
+def _lttb_edges(n: int, n_out: int) -> np.ndarray:
+    """
+    Return the n_out - 1 edges of the n_out - 2 LTTB buckets between the first and last point
+    """
+    # Strictly increasing since the step (n - 2) / (n_out - 2) is at least 1
+    return np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+
+
+def series_to_level(values: pd.Series, wear: Optional[pd.Series] = None) -> pd.DataFrame:
+    """
+    Convert a Series with a sorted DatetimeIndex to a level frame
+
+    A level frame holds one row per bucket with the 'mean', 'min', 'max' and
+    'count' of the values, the 'wear' fraction (NaN without wear data) and the
+    number of values with wear data ('wear_count'). Raw data is a level with one
+    value per bucket. Missing values are dropped, as are negative wear values
+    (cosinorage marks minutes without wear detection with -1).
+    """
+    valid = values.notna()
+    index = pd.DatetimeIndex(values.index[valid.to_numpy()])
+    values = values[valid].to_numpy(dtype=np.float64)
+    wear_values = (wear[valid].to_numpy(dtype=np.float64, copy=True) if wear is not None
+                   else np.full(len(values), np.nan))
+    wear_values[wear_values < 0] = np.nan
+    return pd.DataFrame({
+        "mean": values, "min": values, "max": values,
+        "count": np.ones(len(values), dtype=np.int64), "wear": wear_values,
+        "wear_count": (~np.isnan(wear_values)).astype(np.int64)
+    }, index=index)
+
+
+def _wear_count(level: pd.DataFrame) -> np.ndarray:
+    # Levels built before wear_count was tracked count every value with wear data
+    if "wear_count" in level:
+        return level["wear_count"].to_numpy()
+    wear = level["wear"].to_numpy()
+    return np.where(np.isnan(wear) | (wear < 0), 0, level["count"].to_numpy())
+
+
+def aggregate_buckets(level: pd.DataFrame, starts: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Combine consecutive rows of a level frame into buckets beginning at starts
+
+    starts must be strictly increasing and begin with 0. Means are weighted by
+    the number of values and wear fractions by the number of values with wear
+    data per row, so aggregating a level gives the same result as aggregating
+    the raw data. Buckets without wear data have a NaN wear fraction.
+    """
+    count = level["count"].to_numpy()
+    total = np.add.reduceat(count, starts)
+    wear_count = _wear_count(level)
+    wear_total = np.add.reduceat(wear_count, starts)
+    wear_sum = np.add.reduceat(
+        np.where(wear_count > 0, level["wear"].to_numpy() * wear_count, 0.0), starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        wear = np.where(wear_total > 0, wear_sum / wear_total, np.nan)
+    return {
+        "mean": np.add.reduceat(level["mean"].to_numpy() * count, starts) / total,
+        "min": np.minimum.reduceat(level["min"].to_numpy(), starts),
+        "max": np.maximum.reduceat(level["max"].to_numpy(), starts),
+        "count": total,
+        "wear": wear,
+        "wear_count": wear_total
+    }
+
+
+def _wear_fraction(level: pd.DataFrame) -> np.ndarray:
+    return np.where(_wear_count(level) > 0, level["wear"].to_numpy(), np.nan)
+
+
+def resample_level(level: pd.DataFrame, resolution: str) -> pd.DataFrame:
+    """
+    Aggregate a level frame to fixed time buckets of the given resolution
+
+    Buckets are aligned to the midnight of the first timestamp in the time
+    zone of the index (like DataFrame.resample) and empty buckets are left
+    out. The result is again a level frame indexed by bucket start, in the
+    time zone of the index.
+    """
+    if level.empty:
+        return level
+
+    step = parse_resolution(resolution).value
+    tz = level.index.tz
+    # Days follow the local calendar (they are not 24 hours long across DST
+    # changes); shorter buckets are fixed durations
+    calendar = tz is not None and step % pd.Timedelta("1D").value == 0
+    times = level.index.tz_localize(None) if calendar else level.index
+    origin = times[0].normalize().value
+    keys = (times.to_numpy(dtype="datetime64[ns]").astype(np.int64) - origin) // step
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+
+    index = pd.DatetimeIndex(
+        (origin + keys[starts] * step).astype("datetime64[ns]"), name=level.index.name)
+    if calendar:
+        index = index.tz_localize(tz, ambiguous=True, nonexistent="shift_forward")
+    elif tz is not None:
+        index = index.tz_localize("UTC").tz_convert(tz)
+    return pd.DataFrame(aggregate_buckets(level, starts), index=index)
+
+
+def downsample_points(level: pd.DataFrame, points: int) -> pd.DataFrame:
+    """
+    Downsample a level frame to the given number of points with LTTB
+
+    LTTB runs on the bucket means. Returns a frame with the selected 'timestamp'
+    and 'value' and the 'mean', 'min', 'max' and 'wear' fraction of the bucket
+    each point was selected from.
+    """
+    n = len(level)
+    timestamps = level.index.to_numpy(dtype="datetime64[ns]")
+    values = level["mean"].to_numpy()
+    if n <= points:
+        return pd.DataFrame({
+            "timestamp": timestamps, "value": values, "mean": values,
+            "min": level["min"].to_numpy(), "max": level["max"].to_numpy(),
+            "wear": _wear_fraction(level)
+        })
+
+    # Relative times keep float precision for nanosecond timestamps
+    x = (timestamps - timestamps[0]).astype(np.int64).astype(np.float64)
+    indices = lttb_indices(x, values, points)
+    envelope = aggregate_buckets(
+        level, np.concatenate(([0], _lttb_edges(n, points))))
+
+    return pd.DataFrame({
+        "timestamp": timestamps[indices], "value": values[indices],
+        "mean": envelope["mean"], "min": envelope["min"], "max": envelope["max"],
+        "wear": envelope["wear"]
+    })
+
+
+def downsample_level(level: pd.DataFrame, points: Optional[int] = None,
+                     resolution: Optional[str] = None, resample: bool = True) -> pd.DataFrame:
+    """
+    Downsample a level frame by points (LTTB) or by resolution
+
+    Without points and resolution, the level is aggregated at
+    DEFAULT_RESOLUTION. resample=False indicates that the level already has the
+    requested resolution. Resolution output has the bucket start 'timestamp',
+    the mean as 'value' and the 'min', 'max' and 'wear' fraction.
+    """
+    if points is not None:
+        return downsample_points(level, points)
+    if resample:
+        level = resample_level(level, resolution or DEFAULT_RESOLUTION)
+    return pd.DataFrame({
+        "timestamp": level.index.to_numpy(dtype="datetime64[ns]"),
+        "value": level["mean"].to_numpy(), "min": level["min"].to_numpy(),
+        "max": level["max"].to_numpy(), "wear": _wear_fraction(level)
+    })
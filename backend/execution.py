@@ -0,0 +1,189 @@
+"""
+Execution engine for CPU-bound work.
+
+Data handler construction, feature extraction and CosinorAge prediction are
+submitted to a process pool so that the event loop only performs I/O and
+stays responsive (including /health) while large files are processed.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Number of worker processes (set via the PROCESS_POOL_WORKERS environment variable)
+PROCESS_POOL_WORKERS = int(os.environ.get(
+    "PROCESS_POOL_WORKERS", os.cpu_count() or 1))
+
+# Queue used by worker processes to report progress (set in each worker by _init_worker)
+_progress_queue = None
+
+
+def _init_worker(progress_queue=None):
+    """
+    Configure logging and the progress channel in freshly spawned worker processes
+    """
+    global _progress_queue
+    _progress_queue = progress_queue
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
+def report_progress(progress_key: str, completed: int, total: int, stage: str = None):
+    """
+    Report the progress of a long-running task from inside a worker process
+
+    Does nothing if progress_key is None or no progress channel is configured.
+    """
+    if progress_key is None or _progress_queue is None:
+        return
+    try:
+        _progress_queue.put((progress_key, completed, total, stage))
+    except Exception as e:
+        logger.warning(f"Could not report progress for {progress_key}: {str(e)}")
+
+
+class ExecutionEngine:
+    """
+    Thin wrapper around a ProcessPoolExecutor that can be awaited from async endpoints
+    """
+
+    def __init__(self, max_workers: int = PROCESS_POOL_WORKERS):
+        self.max_workers = max(1, max_workers)
+        self._executor = None
+        self._progress_queue = None
+        self._progress_thread = None
+        self.progress = {}  # Latest progress reported per progress key
+
+    def start(self):
+        """
+        Create the worker pool if it is not running yet
+        """
+        if self._executor is None:
+            # Use spawn so workers never inherit the running event loop or its threads
+            mp_context = multiprocessing.get_context("spawn")
+            self._progress_queue = mp_context.Queue()
+            self._progress_thread = threading.Thread(
+                target=self._drain_progress, args=(self._progress_queue,), daemon=True)
+            self._progress_thread.start()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=mp_context,
+                initializer=_init_worker,
+                initargs=(self._progress_queue,)
+            )
+            logger.info(
+                f"Execution engine started with {self.max_workers} worker processes")
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stop the worker pool
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+            # Stop the progress listener
+            self._progress_queue.put(None)
+            self._progress_thread.join(timeout=5)
+            self._progress_queue = None
+            self._progress_thread = None
+            logger.info("Execution engine shut down")
+
+    def _drain_progress(self, progress_queue):
+        """
+        Collect progress updates sent by worker processes
+        """
+        while True:
+            try:
+                item = progress_queue.get()
+            except Exception:
+                # The queue was closed (e.g. during interpreter shutdown)
+                break
+            if item is None:
+                break
+            self.set_progress(*item)
+
+    def set_progress(self, progress_key: str, completed: int, total: int, stage: str = None):
+        """
+        Record the progress of progress_key (does nothing if progress_key is None)
+        """
+        if progress_key is None:
+            return
+        self.progress[progress_key] = {
+            "completed": completed,
+            "total": total,
+            "stage": stage
+        }
+
+    def get_progress(self, progress_key: str) -> Optional[dict]:
+        """
+        Return the latest progress reported for progress_key, if any
+        """
+        return self.progress.get(progress_key)
+
+    def clear_progress(self, progress_key: str):
+        """
+        Forget the progress reported for progress_key
+        """
+        self.progress.pop(progress_key, None)
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Run func(*args, **kwargs) in a worker process and await its result
+        """
+        self.start()
+        loop = asyncio.get_event_loop()
+        try:
+            return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); recreate the pool for subsequent requests
+            logger.error(
+                "Worker process terminated unexpectedly, restarting execution engine")
+            self.shutdown(wait=False)
+            raise
+
+    async def map(self, func: Callable, args_list: List[tuple],
+                  progress_key: str = None, stage: str = None) -> List[tuple]:
+        """
+        Run func(*args) in the worker pool for every argument tuple
+
+        The calls share the pool with all other work, so at most max_workers of
+        them run at the same time. Returns a (result, error) tuple per entry of
+        args_list, in the same order; error is None on success and the error
+        message otherwise. The number of finished calls is recorded as the
+        progress of progress_key.
+        """
+        total = len(args_list)
+        completed = 0
+        self.set_progress(progress_key, 0, total, stage)
+
+        async def run_one(args):
+            nonlocal completed
+            try:
+                outcome = (await self.run(func, *args), None)
+            except Exception as e:
+                outcome = (None, str(e))
+            completed += 1
+            self.set_progress(progress_key, completed, total, stage)
+            return outcome
+
+        return list(await asyncio.gather(*(run_one(args) for args in args_list)))
+
+    def get_stats(self) -> dict:
+        """
+        Return the engine configuration and state
+        """
+        return {
+            "max_workers": self.max_workers,
+            "running": self._executor is not None
+        }
+
+
+engine = ExecutionEngine()
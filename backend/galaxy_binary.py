@@ -0,0 +1,269 @@
+"""
+Samsung Galaxy Watch binary data.
+
+Galaxy Watch exports are ZIP archives with one directory per day, each holding
+acceleration_data*.binary files (plus other sensor files and macOS metadata).
+Only the accelerometer files are needed by GalaxyDataHandler, so they are
+streamed straight from the archive to their final location in a single pass.
+
+The module also provides a columnar decoder for the accelerometer files that
+replaces cosinorage's read_galaxy_binary_data (see use_fast_binary_reader).
+"""
+
+import logging
+import os
+import shutil
+import zipfile
+from operator import attrgetter
+from typing import Any, Dict, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from numpy.lib.recfunctions import structured_to_unstructured
+from cosinorage.datahandlers.utils.frequency_detection import \
+    detect_frequency_from_timestamps
+from cosinorage.datahandlers.utils.galaxy_binary import load_acceleration_data
+
+try:
+    from execution import report_progress
+except ImportError:
+    from backend.execution import report_progress
+
+logger = logging.getLogger(__name__)
+
+ACCELERATION_FILE_PREFIX = "acceleration_data"
+ACCELERATION_FILE_SUFFIX = ".binary"
+
+# Block size used to copy archive members to disk
+EXTRACT_BLOCK_SIZE_BYTES = 1024 * 1024
+
+
+def _is_macosx_member(name: str) -> bool:
+    return any(part.startswith("__MACOSX") for part in name.split("/"))
+
+
+def is_acceleration_member(info: zipfile.ZipInfo) -> bool:
+    """
+    Return True if the archive member is a Galaxy Watch accelerometer file
+    """
+    if info.is_dir() or _is_macosx_member(info.filename):
+        return False
+    basename = os.path.basename(info.filename)
+    return basename.startswith(ACCELERATION_FILE_PREFIX) and basename.endswith(ACCELERATION_FILE_SUFFIX)
+
+
+def create_zip_directory_tree(zip_path: str) -> Dict[str, Any]:
+    """
+    Create a tree structure of the archive contents without extracting it
+
+    Uses the same format as the tree created for extracted directories.
+    """
+    root = {
+        'name': os.path.basename(zip_path),
+        'type': 'directory',
+        'children': []
+    }
+
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        names = [name for name in zip_ref.namelist()
+                 if not _is_macosx_member(name)]
+
+    directories = {"": root}
+    for name in sorted(names):
+        parts = [part for part in name.split("/") if part]
+        is_dir = name.endswith("/")
+        parent = root
+        for depth, part in enumerate(parts):
+            path = "/".join(parts[:depth + 1])
+            if depth < len(parts) - 1 or is_dir:
+                if path not in directories:
+                    directories[path] = {
+                        'name': part,
+                        'type': 'directory',
+                        'children': []
+                    }
+                    parent['children'].append(directories[path])
+                parent = directories[path]
+            else:
+                parent['children'].append({
+                    'name': part,
+                    'type': 'file'
+                })
+
+    return root
+
+
+def extract_acceleration_data(zip_path: str, target_dir: str, progress_key: str = None) -> Dict[str, Any]:
+    """
+    Extract only the accelerometer files of a Galaxy Watch archive to target_dir
+
+    Members are streamed to disk block by block. Returns the directory containing
+    the per-day directories (the directory expected by GalaxyDataHandler), the
+    number of extracted files and their total size.
+    """
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        members: List[zipfile.ZipInfo] = [
+            info for info in zip_ref.infolist() if is_acceleration_member(info)]
+        if not members:
+            raise ValueError(
+                "No acceleration data files found in ZIP file")
+
+        target_root = os.path.realpath(target_dir)
+        os.makedirs(target_root, exist_ok=True)
+
+        n_bytes = 0
+        for i, info in enumerate(members):
+            destination = os.path.realpath(
+                os.path.join(target_root, info.filename))
+            # Refuse members that would be written outside of target_dir
+            if os.path.commonpath([target_root, destination]) != target_root:
+                raise ValueError(
+                    f"Invalid path in ZIP file: {info.filename}")
+
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            with zip_ref.open(info) as source, open(destination, "wb") as target:
+                shutil.copyfileobj(source, target, EXTRACT_BLOCK_SIZE_BYTES)
+            n_bytes += info.file_size
+            report_progress(progress_key, i + 1, len(members), "extracting")
+
+    # Files are stored as <child_dir>/<day_dir>/acceleration_data*.binary
+    parts = [part for part in members[0].filename.split("/") if part]
+    child_dir = os.path.join(target_root, *parts[:-2])
+
+    logger.info(
+        f"Extracted {len(members)} acceleration data files ({n_bytes} bytes) to {target_root}")
+    return {
+        "child_dir": child_dir,
+        "n_files": len(members),
+        "n_bytes": n_bytes
+    }
+
+
+def acceleration_data_to_arrays(data, time_column: str, data_columns: list) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Convert a decoded AccelerationData message to NumPy arrays
+
+    Returns the timestamps (int64, as stored in time_column) and an
+    (n_samples, n_columns) float64 array with the data columns. The samples are
+    read in a single pass into a preallocated record array instead of building
+    one dictionary per sample.
+    """
+    samples = data.samples
+    record_dtype = np.dtype(
+        [("timestamp", np.int64)] + [(f"c{i}", np.float64) for i in range(len(data_columns))])
+
+    records = np.fromiter(
+        map(attrgetter(time_column, *data_columns), samples),
+        dtype=record_dtype,
+        count=len(samples)
+    )
+    values = structured_to_unstructured(records[list(record_dtype.names[1:])])
+
+    return records["timestamp"], values
+
+
+def read_day_directory(day_dir: str, time_column: str, data_columns: list) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Decode all accelerometer files of one per-day directory
+
+    Returns the concatenated timestamps and values and the number of files read.
+    """
+    timestamps = []
+    values = []
+    n_files = 0
+    for file in sorted(os.listdir(day_dir)):
+        # only consider binary files
+        if not (file.startswith(ACCELERATION_FILE_PREFIX) and file.endswith(ACCELERATION_FILE_SUFFIX)):
+            continue
+        data = load_acceleration_data(os.path.join(day_dir, file))
+        n_files += 1
+        if data is None:
+            logger.warning(f"Skipping empty or unreadable file {file} in {day_dir}")
+            continue
+        file_timestamps, file_values = acceleration_data_to_arrays(
+            data, time_column, data_columns)
+        timestamps.append(file_timestamps)
+        values.append(file_values)
+
+    if not timestamps:
+        return (np.empty(0, dtype=np.int64),
+                np.empty((0, len(data_columns)), dtype=np.float64),
+                n_files)
+    return np.concatenate(timestamps), np.concatenate(values), n_files
+
+
+def read_galaxy_binary_data(
+    galaxy_file_dir: str,
+    meta_dict: dict,
+    time_column: str = "unix_timestamp_in_ms",
+    data_columns: Union[list, None] = None,
+    verbose: bool = False,
+) -> pd.DataFrame:
+    """
+    Read accelerometer data from Galaxy Watch binary files
+
+    Drop-in replacement for cosinorage's read_galaxy_binary_data producing the
+    same DataFrame and metadata. The per-day directories are decoded one after
+    the other (this runs in a worker process of the execution engine, which
+    already uses all cores across requests) and concatenated once.
+    """
+    # Set default data_columns if not provided
+    if data_columns is None:
+        data_columns = ["acceleration_x", "acceleration_y", "acceleration_z"]
+
+    day_dirs = [
+        os.path.join(galaxy_file_dir, day_dir)
+        for day_dir in sorted(os.listdir(galaxy_file_dir))
+        if os.path.isdir(os.path.join(galaxy_file_dir, day_dir))
+    ]
+
+    results = []
+    for day_dir in day_dirs:
+        try:
+            results.append(read_day_directory(day_dir, time_column, data_columns))
+        except Exception as e:
+            raise ValueError(f"Failed to read {day_dir}: {str(e)}")
+
+    n_files = sum(result[2] for result in results)
+    if n_files == 0:
+        raise ValueError(
+            f"No acceleration data files found in {galaxy_file_dir}")
+    if verbose:
+        print(f"Read {n_files} files from {galaxy_file_dir}")
+
+    timestamps = np.concatenate([result[0] for result in results])
+    values = np.concatenate([result[1] for result in results])
+
+    data = pd.DataFrame(
+        values,
+        columns=["x", "y", "z"][:len(data_columns)],
+        index=pd.DatetimeIndex(pd.to_datetime(timestamps, unit="ms"), name="timestamp")
+    )
+    data = data.fillna(0)
+    data.sort_index(inplace=True)
+
+    if verbose:
+        print(
+            f"Loaded {data.shape[0]} accelerometer data records from {galaxy_file_dir}"
+        )
+
+    meta_dict["raw_n_datapoints"] = data.shape[0]
+    meta_dict["raw_start_datetime"] = data.index.min()
+    meta_dict["raw_end_datetime"] = data.index.max()
+    meta_dict["sf"] = detect_frequency_from_timestamps(data.index)
+    meta_dict["raw_data_frequency"] = f'{meta_dict["sf"]:.3g}Hz'
+    meta_dict["raw_data_unit"] = "Custom"
+
+    return data
+
+
+def use_fast_binary_reader():
+    """
+    Make GalaxyDataHandler decode binary data with read_galaxy_binary_data above
+
+    GalaxyDataHandler looks the reader up in its module namespace, so replacing
+    it there is enough. Called on import of the processing module, i.e. in every
+    worker process that builds handlers.
+    """
+    from cosinorage.datahandlers import galaxydatahandler
+    galaxydatahandler.read_galaxy_binary_data = read_galaxy_binary_data
@@ -0,0 +1,295 @@
+"""
+Background job management.
+
+Long-running work (such as bulk processing of whole cohorts) is registered as a
+job and executed on the execution engine in the background. Clients receive a
+job ID immediately and poll for status, progress and the final result.
+"""
+
+import asyncio
+import logging
+import os
+import pickle
+import shutil
+import socket
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+try:
+    from execution import engine, PROCESS_POOL_WORKERS
+    from state_store import StateDatabase
+except ImportError:
+    from backend.execution import engine, PROCESS_POOL_WORKERS
+    from backend.state_store import StateDatabase
+
+logger = logging.getLogger(__name__)
+
+# Number of jobs allowed to run at the same time in each API worker process
+# (set via the MAX_CONCURRENT_JOBS environment variable)
+MAX_CONCURRENT_JOBS = int(os.environ.get(
+    "MAX_CONCURRENT_JOBS", PROCESS_POOL_WORKERS))
+
+# How often the progress of a running job is written to the state database
+JOB_PROGRESS_INTERVAL_SECONDS = 1.0
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+
+def _process_exists(pid: int) -> bool:
+    """
+    Return True if a process with the given pid is running on this host
+    """
+    if os.name == "nt":
+        # os.kill would terminate the process on Windows
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _dump_pickle(value: Any, path: str):
+    with open(path, "wb") as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _load_pickle(path: str) -> Any:
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp is not None else None
+
+
+class JobManager:
+    """
+    Keeps track of background jobs and runs them on the execution engine
+
+    Jobs are recorded in the shared state database and their results are
+    pickled to results_dir (one directory per job), so that every API worker
+    process can report the status and return the result of a job submitted to
+    another one.
+    """
+
+    def __init__(self, db: StateDatabase, results_dir: str,
+                 max_concurrent_jobs: int = MAX_CONCURRENT_JOBS):
+        self.db = db
+        self.results_dir = results_dir
+        self.max_concurrent_jobs = max(1, max_concurrent_jobs)
+        self._semaphore = None
+        self._tasks = set()  # Running job tasks, referenced until they are done
+        self._owner = None
+        self._owner_pid = None
+
+    @property
+    def owner(self):
+        """
+        (host, pid, start time) identifying the process that runs the jobs it submits
+        """
+        if self._owner_pid != os.getpid():
+            self._owner = (socket.gethostname(), os.getpid(), time.time())
+            self._owner_pid = os.getpid()
+        return self._owner
+
+    def _owner_is_gone(self, owner) -> bool:
+        host, pid, started_at = owner
+        if host != self.owner[0] or pid is None:
+            # Processes of other hosts cannot be checked from here
+            return False
+        if pid == self.owner[1]:
+            # The pid was reused by this process (e.g. after a container restart)
+            return started_at != self.owner[2]
+        return not _process_exists(pid)
+
+    def submit(self, job_type: str, func, *args, **kwargs) -> str:
+        """
+        Register a job and schedule the coroutine function func(*args, **kwargs)
+
+        func runs its work on the execution engine and must accept a progress_key
+        keyword argument, which is set to the job ID so that progress can be
+        reported. Returns the job ID.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_jobs)
+
+        job_id = uuid.uuid4().hex
+        self.db.insert_job(job_id, job_type, JOB_QUEUED, time.time(), self.owner)
+        # The event loop only keeps weak references to tasks
+        task = asyncio.create_task(self._run(job_id, job_type, func, args, kwargs))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        logger.info(f"Queued {job_type} job {job_id}")
+        return job_id
+
+    async def _run(self, job_id: str, job_type: str, func, args, kwargs):
+        """
+        Execute a queued job once a slot is available
+        """
+        async with self._semaphore:
+            self.db.update_job(job_id, status=JOB_RUNNING, started_at=time.time())
+            logger.info(f"Started {job_type} job {job_id}")
+            try:
+                task = asyncio.ensure_future(func(*args, progress_key=job_id, **kwargs))
+                result = await self._track_progress(job_id, task)
+                # Pickling a cohort result takes a while, keep it off the event loop
+                result_path = await asyncio.get_event_loop().run_in_executor(
+                    None, self._store_result, job_id, result)
+                self.db.update_job(job_id, status=JOB_COMPLETED, finished_at=time.time(),
+                                   result_path=result_path)
+                logger.info(f"Completed {job_type} job {job_id}")
+            except Exception as e:
+                self.db.update_job(job_id, status=JOB_FAILED, finished_at=time.time(),
+                                   error=str(e))
+                logger.error(
+                    f"Job {job_id} failed: {str(e)}", exc_info=True)
+            finally:
+                engine.clear_progress(job_id)
+
+    async def _track_progress(self, job_id: str, task: asyncio.Future):
+        """
+        Copy the progress recorded by the execution engine to the state database until task is done
+        """
+        reported = None
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=JOB_PROGRESS_INTERVAL_SECONDS)
+            progress = engine.get_progress(job_id)
+            if progress is not None and progress != reported:
+                self.db.update_job(job_id, progress=progress)
+                reported = progress
+            if done:
+                return task.result()
+
+    def _store_result(self, job_id: str, result: Any) -> str:
+        """
+        Pickle the result of a job to its own directory and return the directory
+
+        DataFrames under the "tables" key of a dictionary result are pickled to
+        separate files, so that they can be loaded one at a time.
+        """
+        result_dir = os.path.join(self.results_dir, job_id)
+        temp_dir = f"{result_dir}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(os.path.join(temp_dir, "tables"))
+        try:
+            tables = {}
+            if isinstance(result, dict) and "tables" in result:
+                result = dict(result)
+                tables = result.pop("tables") or {}
+            _dump_pickle(result, os.path.join(temp_dir, "result.pkl"))
+            for table, df in tables.items():
+                _dump_pickle(df, os.path.join(temp_dir, "tables", f"{table}.pkl"))
+            os.replace(temp_dir, result_dir)
+        except BaseException:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+        return result_dir
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the job record for job_id (without its result), or None if it does not exist
+        """
+        return self.db.get_job(job_id)
+
+    async def get_result(self, job_id: str) -> Any:
+        """
+        Load the result of a completed job without its tables (None if there is none)
+        """
+        job = self.db.get_job(job_id)
+        if job is None or job["status"] != JOB_COMPLETED or job["result_path"] is None:
+            return None
+        return await asyncio.get_event_loop().run_in_executor(
+            None, _load_pickle, os.path.join(job["result_path"], "result.pkl"))
+
+    def get_result_tables(self, job_id: str) -> List[str]:
+        """
+        Return the names of the tables stored with the result of a completed job
+        """
+        job = self.db.get_job(job_id)
+        if job is None or job["status"] != JOB_COMPLETED or job["result_path"] is None:
+            return []
+        tables_dir = os.path.join(job["result_path"], "tables")
+        if not os.path.isdir(tables_dir):
+            return []
+        return sorted(os.path.splitext(name)[0] for name in os.listdir(tables_dir))
+
+    async def get_result_table(self, job_id: str, table: str) -> Any:
+        """
+        Load one table of the result of a completed job (None if it does not exist)
+        """
+        if table not in self.get_result_tables(job_id):
+            return None
+        job = self.db.get_job(job_id)
+        return await asyncio.get_event_loop().run_in_executor(
+            None, _load_pickle, os.path.join(job["result_path"], "tables", f"{table}.pkl"))
+
+    def get_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return status and progress information for job_id (without the result)
+        """
+        job = self.db.get_job(job_id)
+        if job is None:
+            return None
+
+        progress = dict(engine.get_progress(job_id) or job["progress"] or {
+            "completed": 0, "total": 0, "stage": None})
+        if job["status"] == JOB_COMPLETED:
+            progress["completed"] = progress["total"]
+            progress["stage"] = "completed"
+            fraction = 1.0
+        elif progress["total"]:
+            fraction = progress["completed"] / progress["total"]
+        else:
+            fraction = 0.0
+
+        return {
+            "job_id": job_id,
+            "job_type": job["job_type"],
+            "status": job["status"],
+            "progress": {**progress, "fraction": fraction},
+            "created_at": _isoformat(job["created_at"]),
+            "started_at": _isoformat(job["started_at"]),
+            "finished_at": _isoformat(job["finished_at"]),
+            "error": job["error"]
+        }
+
+    def fail_interrupted_jobs(self) -> int:
+        """
+        Mark queued and running jobs whose process is gone as failed
+
+        Such jobs were interrupted by a crash or restart of their API worker and
+        would never finish otherwise. Returns the number of failed jobs.
+        """
+        failed = 0
+        for job_id, owner in self.db.unfinished_jobs():
+            if self._owner_is_gone(owner) and self.db.fail_unfinished_job(
+                    job_id, JOB_FAILED, "Job was interrupted because its worker process stopped", time.time()):
+                logger.warning(f"Job {job_id} was interrupted (worker process {owner[1]} is gone)")
+                failed += 1
+        return failed
+
+    def cleanup(self, cutoff_time: datetime) -> int:
+        """
+        Remove finished jobs that finished before cutoff_time. Returns the number of removed jobs.
+        """
+        jobs_removed = self.db.delete_jobs_finished_before(cutoff_time.timestamp())
+        for job_id, result_path in jobs_removed:
+            if result_path is not None:
+                shutil.rmtree(result_path, ignore_errors=True)
+        return len(jobs_removed)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Return the number of jobs per status
+        """
+        counts = {JOB_QUEUED: 0, JOB_RUNNING: 0,
+                  JOB_COMPLETED: 0, JOB_FAILED: 0}
+        counts.update(self.db.count_jobs_by_status())
+        return {"max_concurrent_jobs": self.max_concurrent_jobs, "jobs": counts}
@@ -1,27 +1,61 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from typing import Dict, Any, Optional, List
-from cosinorage.bioages.cosinorage import CosinorAge
-from cosinorage.datahandlers import GalaxyDataHandler
-from cosinorage.datahandlers.genericdatahandler import GenericDataHandler
+from fastapi.responses import FileResponse, Response
+from typing import Dict, Any, Optional, List, Tuple
 import os
 import shutil
-import tempfile
 import logging
 import zipfile
 from datetime import datetime, timedelta
 import asyncio
-from cosinorage.features.features import WearableFeatures
-from cosinorage.features.bulk_features import BulkWearableFeatures
+import hashlib
+import uuid
+import aiofiles
 from pydantic import BaseModel
 import pandas as pd
-import numpy as np
 import pytz
 try:
     from docs_service import setup_docs_routes
+    from execution import engine
+    from jobs import JobManager, JOB_COMPLETED, JOB_FAILED
+    import processing
+    import bioage
+    import preprocess_cache
+    import result_cache
+    import galaxy_binary
+    import columnar
+    import csv_schema
+    from uploads import UploadSessionManager, UploadSessionError, DEFAULT_UPLOAD_CHUNK_SIZE_BYTES
+    from serialization import ORJSONResponse, COLUMNAR_FORMAT, RECORDS_FORMAT, RESPONSE_FORMATS, dataframe_to_format
+    import timeseries
+    import downsampling
+    import pyramid
+    import arrow_format
+    from compression import CompressionMiddleware, precompress_file, precompressed_file_response
+    from blob_store import BlobStore
+    from result_store import ResultStore
+    from state_store import StateDatabase
 except ImportError:
     from backend.docs_service import setup_docs_routes
+    from backend.execution import engine
+    from backend.jobs import JobManager, JOB_COMPLETED, JOB_FAILED
+    from backend import processing
+    from backend import bioage
+    from backend import preprocess_cache
+    from backend import result_cache
+    from backend import galaxy_binary
+    from backend import columnar
+    from backend import csv_schema
+    from backend.uploads import UploadSessionManager, UploadSessionError, DEFAULT_UPLOAD_CHUNK_SIZE_BYTES
+    from backend.serialization import ORJSONResponse, COLUMNAR_FORMAT, RECORDS_FORMAT, RESPONSE_FORMATS, dataframe_to_format
+    from backend import timeseries
+    from backend import downsampling
+    from backend import pyramid
+    from backend import arrow_format
+    from backend.compression import CompressionMiddleware, precompress_file, precompressed_file_response
+    from backend.blob_store import BlobStore
+    from backend.result_store import ResultStore
+    from backend.state_store import StateDatabase
 import uvicorn
 
 
@@ -35,7 +69,26 @@ EXTRACTED_FILES_DIR = os.path.join(os.path.dirname(
     os.path.abspath(__file__)), "extracted_files")
 os.makedirs(EXTRACTED_FILES_DIR, exist_ok=True)
 
-app = FastAPI()
+# Directory shared by all worker processes (and replicas) holding the state database,
+# the content-addressed store of the uploaded files and the processed results
+# (set via the ARTIFACT_DIR environment variable; kept out of the age-based sweep of EXTRACTED_FILES_DIR)
+ARTIFACT_DIR = os.environ.get("ARTIFACT_DIR", os.path.join(EXTRACTED_FILES_DIR, "state"))
+STATE_DB_PATH = os.path.join(ARTIFACT_DIR, "state.db")
+BLOB_STORE_DIR = os.path.join(ARTIFACT_DIR, "blobs")
+RESULT_STORE_DIR = os.path.join(ARTIFACT_DIR, "results")
+JOB_RESULTS_DIR = os.path.join(ARTIFACT_DIR, "jobs")
+UPLOAD_SESSIONS_DIR = os.path.join(ARTIFACT_DIR, "uploads")
+
+# Static sample downloads and the directory holding their precompressed variants
+SAMPLE_DATA_DIR = os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), "data", "sample")
+PRECOMPRESSED_FILES_DIR = os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), "precompressed_files")
+SAMPLE_DOWNLOADS = ["sample_data_single.csv", "sample_data_multi.zip"]
+
+# Responses are encoded with orjson; endpoints returning large payloads return an
+# ORJSONResponse directly to skip FastAPI's recursive jsonable_encoder pass
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Configure CORS
 app.add_middleware(
@@ -45,15 +98,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+# Compress responses above COMPRESSION_MINIMUM_SIZE with brotli or gzip
+app.add_middleware(CompressionMiddleware)
+
 # Setup documentation routes
 setup_docs_routes(app)
 
-# Store uploaded data in memory (in a real app, you'd want to use a proper database)
-uploaded_data = {}
-temp_dirs = {}  # Store temporary directories
-file_upload_times = {}  # Track when files were uploaded
+# State of the uploaded files, shared by all worker processes and kept across restarts;
+# processed results beyond RESULT_STORE_MAX_BYTES are dropped from memory and reloaded from disk
+state_db = StateDatabase(STATE_DB_PATH)
+uploaded_data = ResultStore(state_db, RESULT_STORE_DIR)
+blob_store = BlobStore(BLOB_STORE_DIR, state_db)  # Uploaded files by content hash, shared by identical uploads
+job_manager = JobManager(state_db, JOB_RESULTS_DIR)
+upload_sessions = UploadSessionManager(state_db, UPLOAD_SESSIONS_DIR)
+columnar_tasks = {}  # Columnar conversions started by this process ({content_hash: task})
+background_tasks = set()  # Running background tasks, referenced until they are done
+process_results = result_cache.ResultCache()  # Memoized /process results by result key
+age_predictions = result_cache.ResultCache()  # Memoized /predict_age responses by ETag
+precompressed_downloads = {}  # Precompressed variants of the sample downloads ({filename: {encoding: path}})
 
 # Cleanup configuration
 CLEANUP_INTERVAL_MINUTES = 60 * 24 # Run cleanup every day
@@ -63,6 +128,7 @@ CLEANUP_TASK_RUNNING = False
 # File upload configuration
 ENABLE_FILE_SIZE_LIMIT = True  # Global switch to enable/disable file size limit
 MAX_FILE_SIZE_BYTES = 150 * 1024 * 1024  # 150MB in bytes
+UPLOAD_CHUNK_SIZE_BYTES = 1024 * 1024  # Uploads are streamed to disk in 1MB chunks
 
 
 async def scheduled_cleanup():
@@ -81,53 +147,23 @@ async def scheduled_cleanup():
                 cutoff_time = datetime.now() - timedelta(minutes=FILE_AGE_LIMIT_MINUTES)
                 
                 # Clean up old files from uploaded_data
-                files_to_remove = []
-                for file_id, upload_time in file_upload_times.items():
-                    if upload_time < cutoff_time:
-                        files_to_remove.append(file_id)
+                files_to_remove = uploaded_data.uploaded_before(cutoff_time.timestamp())
                 
                 for file_id in files_to_remove:
                     try:
-                        if file_id in uploaded_data:
-                            file_data = uploaded_data[file_id]
-                            
-                            # Clean up temporary directory
-                            if "temp_dir" in file_data and os.path.exists(file_data["temp_dir"]):
-                                shutil.rmtree(file_data["temp_dir"])
-                                logger.info(f"Cleaned up old temp directory: {file_data['temp_dir']}")
-                            
-                            # Clean up permanent directory
-                            if "permanent_dir" in file_data and os.path.exists(file_data["permanent_dir"]):
-                                shutil.rmtree(file_data["permanent_dir"])
-                                logger.info(f"Cleaned up old permanent directory: {file_data['permanent_dir']}")
-                            
-                            # Remove from memory
-                            del uploaded_data[file_id]
-                            if file_id in temp_dirs:
-                                del temp_dirs[file_id]
-                            del file_upload_times[file_id]
-                            
-                            logger.info(f"Cleaned up old file: {file_id}")
+                        # Blobs are deleted once no file uses them anymore
+                        remove_file_state(file_id)
+                        logger.info(f"Cleaned up old file: {file_id}")
                     except Exception as e:
                         logger.warning(f"Failed to clean up file {file_id}: {str(e)}")
                 
-                # Clean up old temporary directories that might not be tracked
-                for temp_dir in list(temp_dirs.values()):
-                    try:
-                        if os.path.exists(temp_dir):
-                            # Check if directory is old enough to be cleaned up
-                            dir_time = datetime.fromtimestamp(os.path.getctime(temp_dir))
-                            if dir_time < cutoff_time:
-                                shutil.rmtree(temp_dir)
-                                logger.info(f"Cleaned up old untracked temp directory: {temp_dir}")
-                    except Exception as e:
-                        logger.warning(f"Failed to clean up temp directory {temp_dir}: {str(e)}")
-                
                 # Clean up old files in extracted_files directory
                 if os.path.exists(EXTRACTED_FILES_DIR):
                     try:
                         for item in os.listdir(EXTRACTED_FILES_DIR):
                             item_path = os.path.join(EXTRACTED_FILES_DIR, item)
+                            if item_path == ARTIFACT_DIR:
+                                continue
                             if os.path.exists(item_path):
                                 item_time = datetime.fromtimestamp(os.path.getctime(item_path))
                                 if item_time < cutoff_time:
@@ -139,7 +175,12 @@ async def scheduled_cleanup():
                     except Exception as e:
                         logger.warning(f"Failed to clean up extracted files directory: {str(e)}")
                 
-                logger.info(f"Scheduled cleanup completed. Removed {len(files_to_remove)} old files.")
+                # Fail jobs of stopped workers, forget finished jobs and abandoned chunked uploads
+                job_manager.fail_interrupted_jobs()
+                jobs_removed = job_manager.cleanup(cutoff_time)
+                uploads_removed = upload_sessions.cleanup(cutoff_time)
+
+                logger.info(f"Scheduled cleanup completed. Removed {len(files_to_remove)} old files, {jobs_removed} finished jobs and {uploads_removed} abandoned uploads.")
                 
             else:
                 logger.info("Cleanup task already running, skipping this iteration")
@@ -153,62 +194,122 @@ async def scheduled_cleanup():
         await asyncio.sleep(CLEANUP_INTERVAL_MINUTES * 60)
 
 
+def start_background_task(coroutine) -> asyncio.Task:
+    """
+    Run coroutine as a task that is referenced until it is done
+
+    The event loop only keeps weak references to tasks, so a task that is not
+    referenced elsewhere could be garbage collected before it finishes.
+    """
+    task = asyncio.create_task(coroutine)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
 @app.on_event("startup")
 async def startup_event():
     """
-    Clear all state when the server starts and start the cleanup task
+    Start the worker pool and the cleanup task when the server starts
+
+    The uploaded files and results are kept in ARTIFACT_DIR, which is shared
+    by all workers, so they are not cleared here (the scheduled cleanup removes
+    old files).
     """
-    # Clear in-memory state
-    uploaded_data.clear()
-    temp_dirs.clear()
-    file_upload_times.clear()
+    os.makedirs(EXTRACTED_FILES_DIR, exist_ok=True)
+    logger.info(
+        f"Using shared state in {ARTIFACT_DIR} ({len(uploaded_data)} uploaded files)")
+
+    # Jobs of a worker that crashed or was restarted would stay queued or running forever
+    interrupted_jobs = job_manager.fail_interrupted_jobs()
+    if interrupted_jobs:
+        logger.info(f"Marked {interrupted_jobs} interrupted jobs as failed")
 
-    # Clean up extracted files directory (handle volume mount)
-    if os.path.exists(EXTRACTED_FILES_DIR):
+    # Start the worker pool for CPU-bound processing
+    engine.start()
+
+    # Compress the static downloads once instead of on every request
+    for filename in SAMPLE_DOWNLOADS:
         try:
-            # Instead of removing the directory, clear its contents
-            for item in os.listdir(EXTRACTED_FILES_DIR):
-                item_path = os.path.join(EXTRACTED_FILES_DIR, item)
-                if os.path.isdir(item_path):
-                    shutil.rmtree(item_path)
-                else:
-                    os.remove(item_path)
+            precompressed_downloads[filename] = precompress_file(
+                os.path.join(SAMPLE_DATA_DIR, filename), PRECOMPRESSED_FILES_DIR)
         except Exception as e:
-            logger.warning(
-                f"Could not clear extracted_files directory: {str(e)}")
-            # Ensure the directory exists
-            os.makedirs(EXTRACTED_FILES_DIR, exist_ok=True)
-    else:
-        os.makedirs(EXTRACTED_FILES_DIR, exist_ok=True)
+            logger.warning(f"Could not precompress {filename}: {str(e)}")
 
     # Start the scheduled cleanup task
-    asyncio.create_task(scheduled_cleanup())
+    start_background_task(scheduled_cleanup())
     
-    logger.info("Server started - all state cleared and cleanup task started (runs every 10 minutes)")
+    logger.info("Server started - cleanup task started (runs every 10 minutes)")
 
 
-def create_directory_tree(path: str) -> Dict[str, Any]:
-    """Create a tree structure of the directory contents."""
-    result = {
-        'name': os.path.basename(path),
-        'type': 'directory',
-        'children': []
-    }
+def remove_file_state(file_id: str):
+    """
+    Forget an uploaded file and release its blob
+
+    The blob (with its columnar copy and extracted files) is only deleted if no
+    other file_id uses it.
+    """
+    uploaded_data.pop(file_id, None)
+    blob_store.release(file_id)
+
 
+async def save_upload_file(file: UploadFile, file_path: str) -> Tuple[int, str]:
+    """
+    Stream an uploaded file to disk in fixed-size chunks and return its size and SHA-256 digest
+
+    The file is hashed while it is written. Raises HTTPException (413) as soon
+    as the file exceeds MAX_FILE_SIZE_BYTES (if the limit is enabled); the
+    partially written file is removed.
+    """
+    file_size = 0
+    digest = hashlib.sha256()
     try:
-        for item in os.listdir(path):
-            item_path = os.path.join(path, item)
-            if os.path.isdir(item_path):
-                result['children'].append(create_directory_tree(item_path))
-            else:
-                result['children'].append({
-                    'name': item,
-                    'type': 'file'
-                })
-    except Exception as e:
-        logger.error(f"Error creating directory tree: {str(e)}")
+        async with aiofiles.open(file_path, "wb") as buffer:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE_BYTES)
+                if not chunk:
+                    break
+                file_size += len(chunk)
+                if ENABLE_FILE_SIZE_LIMIT and file_size > MAX_FILE_SIZE_BYTES:
+                    max_size_mb = MAX_FILE_SIZE_BYTES / (1024 * 1024)
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File '{file.filename}' exceeds the maximum allowed size of {max_size_mb}MB"
+                    )
+                digest.update(chunk)
+                await buffer.write(chunk)
+    except BaseException:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
 
-    return result
+    return file_size, digest.hexdigest()
+
+
+async def store_upload_file(file: UploadFile) -> Tuple[Dict[str, Any], int]:
+    """
+    Stream an uploaded file into the blob store and return its blob and size
+
+    Identical content that is already stored is not kept a second time.
+    """
+    staging_path = blob_store.staging_path(file.filename)
+    file_size, content_hash = await save_upload_file(file, staging_path)
+    blob, duplicate = blob_store.add(staging_path, content_hash, file.filename)
+    logger.info(
+        f"File saved successfully. File size: {file_size} bytes, SHA-256: {content_hash}{' (duplicate)' if duplicate else ''}")
+    return blob, file_size
+
+
+def get_file_columns(file_info: Dict[str, Any]) -> List[str]:
+    """
+    Return the column names of an uploaded CSV file
+
+    Uses the schema sniffed at upload and only reads the file if it is missing.
+    """
+    schema = file_info.get("schema")
+    if schema is not None:
+        return schema["columns"]
+    return columnar.read_column_names(file_info["file_path"])
 
 
 @app.get("/columns/{file_id}")
@@ -227,15 +328,17 @@ async def get_csv_columns(file_id: str) -> Dict[str, Any]:
             raise HTTPException(
                 status_code=404, detail="File not found on disk")
 
-        # Read the CSV file to get column names
+        # Answer from the schema sniffed at upload
         try:
-            # Only read first row to get headers
-            df = pd.read_csv(file_path, nrows=1)
-            columns = df.columns.tolist()
+            columns = get_file_columns(file_info)
+            schema = file_info.get("schema") or {}
             return {
                 "columns": columns,
                 "data_type": file_info.get("data_type"),
-                "data_source": file_info.get("data_source")
+                "data_source": file_info.get("data_source"),
+                "dtypes": schema.get("dtypes"),
+                "delimiter": schema.get("delimiter"),
+                "suggested_time_column": schema.get("time_column")
             }
         except Exception as e:
             logger.error(f"Error reading CSV file: {str(e)}")
@@ -265,10 +368,14 @@ async def get_csv_preview(file_id: str) -> Dict[str, Any]:
             raise HTTPException(
                 status_code=404, detail="File not found on disk")
 
-        # Read the CSV file to get preview data
+        # Answer from the schema sniffed at upload
         try:
-            df = pd.read_csv(file_path, nrows=2)  # Read first 2 rows
-            preview_data = df.to_dict(orient='records')
+            schema = file_info.get("schema")
+            if schema is not None:
+                preview_data = schema["preview"][:2]  # First 2 rows
+            else:
+                df = columnar.read_table(file_path, nrows=2)  # Read first 2 rows
+                preview_data = df.to_dict(orient='records')
             return {
                 "preview": preview_data
             }
@@ -284,6 +391,151 @@ async def get_csv_preview(file_id: str) -> Dict[str, Any]:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def convert_upload_to_columnar(blob: Dict[str, Any]):
+    """
+    Write the columnar copy of an uploaded CSV file in a worker process
+
+    The copy is shared by all files using the blob. Failures are only logged;
+    reads fall back to the CSV file.
+    """
+    try:
+        columnar_path = await engine.run(columnar.convert_to_columnar, blob["path"])
+        if columnar_path:
+            blob_store.set_derived(blob["content_hash"], "columnar_path", columnar_path)
+            for file_id in blob_store.file_ids(blob["content_hash"]):
+                if file_id in uploaded_data:
+                    uploaded_data[file_id]["columnar_path"] = columnar_path
+    except Exception as e:
+        logger.warning(
+            f"Could not create columnar copy of {blob['path']}: {str(e)}")
+    finally:
+        columnar_tasks.pop(blob["content_hash"], None)
+
+
+def validate_upload_type(filename: str, data_source: str):
+    """
+    Check that the file type is supported for the data source
+    """
+    if data_source == "samsung_galaxy_binary" and not filename.endswith('.zip'):
+        raise HTTPException(
+            status_code=400, detail="Only ZIP files are supported for binary data")
+    if data_source == "samsung_galaxy_csv" and not filename.endswith('.csv'):
+        raise HTTPException(
+            status_code=400, detail="Only CSV files are supported for CSV data")
+    if data_source not in ["samsung_galaxy_binary", "samsung_galaxy_csv", "other", "bulk_csv"]:
+        raise HTTPException(status_code=400, detail="Invalid data source")
+
+
+def register_uploaded_file(
+    filename: str,
+    blob: Dict[str, Any],
+    data_source: str,
+    data_type: str = None,
+    data_unit: str = None,
+    time_format: str = None,
+    time_column: str = None,
+    data_columns: str = None
+) -> Dict[str, Any]:
+    """
+    Register a file stored in the blob store in uploaded_data and return the upload response
+
+    Shared by the single, bulk and chunked upload endpoints. Information derived
+    from the file content is computed once per blob.
+    """
+    # Validate the file type before the file gets an ID
+    validate_upload_type(filename, data_source)
+
+    file_path = blob["path"]
+    content_hash = blob["content_hash"]
+    derived = blob["derived"]
+
+    if data_source == "samsung_galaxy_binary":
+        # The archive is only listed here; /extract/{file_id} extracts the data files once
+        if "directory_tree" not in derived:
+            logger.info("File is a ZIP file, reading its contents...")
+            try:
+                derived["directory_tree"] = galaxy_binary.create_zip_directory_tree(file_path)
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail="Invalid ZIP file")
+            blob_store.set_derived(content_hash, "directory_tree", derived["directory_tree"])
+        directory_tree = derived["directory_tree"]
+
+    # Random IDs are unique across worker processes and restarts
+    file_id = uuid.uuid4().hex
+
+    # Reference the blob (the upload time is recorded for cleanup)
+    blob_store.acquire(content_hash, file_id)
+
+    # Handle based on data source
+    if data_source == "samsung_galaxy_binary":
+        # Store the archive path
+        uploaded_data[file_id] = {
+            "filename": filename,
+            "zip_path": file_path,
+            "content_hash": content_hash,
+            "data_source": "samsung_galaxy_binary"
+        }
+
+        return {
+            "file_id": file_id,
+            "filename": filename,
+            "content_hash": content_hash,
+            "directory_tree": directory_tree
+        }
+    elif data_source == "samsung_galaxy_csv":
+        logger.info("File is a CSV file, storing path...")
+        file_info = {
+            "filename": filename,
+            "file_path": file_path,
+            "content_hash": content_hash,
+            "data_source": "samsung_galaxy_csv"
+        }
+
+        # Store data_type if provided (for alternative_counts)
+        if data_type:
+            file_info["data_type"] = data_type
+            logger.info(f"Storing data_type: {data_type}")
+
+        uploaded_data[file_id] = file_info
+    elif data_source == "other":
+        uploaded_data[file_id] = {
+            "filename": filename,
+            "file_path": file_path,
+            "content_hash": content_hash,
+            "data_source": "other",
+            "data_type": data_type,
+            "data_unit": data_unit,
+            "time_format": time_format,
+            "time_column": time_column,
+            "data_columns": data_columns.split(",") if data_columns else None
+        }
+    else:
+        uploaded_data[file_id] = {
+            "filename": filename,
+            "file_path": file_path,
+            "content_hash": content_hash,
+            "data_source": "bulk_csv"
+        }
+
+    # Index the header, first rows and dtypes of the CSV file once per blob
+    if "schema" not in derived:
+        derived["schema"] = csv_schema.read_csv_schema(file_path)
+        blob_store.set_derived(content_hash, "schema", derived["schema"])
+    uploaded_data[file_id]["schema"] = derived["schema"]
+
+    # Convert CSV files to a columnar copy in the background (once per blob)
+    if "columnar_path" in derived:
+        uploaded_data[file_id]["columnar_path"] = derived["columnar_path"]
+    elif columnar.columnar_available() and content_hash not in columnar_tasks:
+        columnar_tasks[content_hash] = start_background_task(convert_upload_to_columnar(blob))
+
+    return {
+        "file_id": file_id,
+        "filename": filename,
+        "content_hash": content_hash
+    }
+
+
 @app.post("/upload")
 async def upload_file(
     file: UploadFile = File(...),
@@ -307,124 +559,26 @@ async def upload_file(
         logger.info(
             f"File size: {file.size if hasattr(file, 'size') else 'Unknown'}")
 
-        # Check file size limit if enabled
-        if ENABLE_FILE_SIZE_LIMIT:
-            # Read file content to get actual size
-            file_content = await file.read()
-            file_size = len(file_content)
-            
-            if file_size > MAX_FILE_SIZE_BYTES:
-                max_size_mb = MAX_FILE_SIZE_BYTES / (1024 * 1024)
-                file_size_mb = file_size / (1024 * 1024)
-                raise HTTPException(
-                    status_code=413, 
-                    detail=f"File size ({file_size_mb:.1f}MB) exceeds the maximum allowed size of {max_size_mb}MB"
-                )
-            
-            # Reset file position for later reading
-            await file.seek(0)
-            logger.info(f"File size check passed: {file_size} bytes")
-
-        # Create a temporary directory to store the uploaded files
-        # Create a temporary directory that won't be automatically deleted
-        temp_dir = tempfile.mkdtemp()
-        # Store the temp directory path
-        temp_dirs[str(len(uploaded_data))] = temp_dir
-
-        # Save the uploaded file
-        file_path = os.path.join(temp_dir, file.filename)
-        logger.info(f"Saving file to temporary directory: {file_path}")
-
-        with open(file_path, "wb") as buffer:
-            if ENABLE_FILE_SIZE_LIMIT:
-                # Use the content we already read for size checking
-                buffer.write(file_content)
-                logger.info(
-                    f"File saved successfully. File size on disk: {len(file_content)} bytes")
-            else:
-                # Read file content normally
-                contents = await file.read()
-                buffer.write(contents)
-                logger.info(
-                    f"File saved successfully. File size on disk: {len(contents)} bytes")
-
-        file_id = str(len(uploaded_data))
-        
-        # Track upload time for cleanup
-        file_upload_times[file_id] = datetime.now()
-
-        # Handle based on data source
-        if data_source == "samsung_galaxy_binary":
-            if not file.filename.endswith('.zip'):
-                raise HTTPException(
-                    status_code=400, detail="Only ZIP files are supported for binary data")
-
-            logger.info("File is a ZIP file, extracting...")
-            extract_dir = os.path.join(temp_dir, "extracted")
-            os.makedirs(extract_dir, exist_ok=True)
-            with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                zip_ref.extractall(extract_dir)
-            logger.info(f"Extracted ZIP file to: {extract_dir}")
-
-            # Create directory tree
-            directory_tree = create_directory_tree(extract_dir)
-
-            # Store the extracted directory path
-            uploaded_data[file_id] = {
-                "filename": file.filename,
-                "extracted_dir": extract_dir,
-                "temp_dir": temp_dir,
-                "data_source": "samsung_galaxy_binary"
-            }
-
-            return {
-                "file_id": file_id,
-                "filename": file.filename,
-                "directory_tree": directory_tree
-            }
-        elif data_source == "samsung_galaxy_csv":
-            if not file.filename.endswith('.csv'):
-                raise HTTPException(
-                    status_code=400, detail="Only CSV files are supported for CSV data")
-
-            logger.info("File is a CSV file, storing path...")
-            file_info = {
-                "filename": file.filename,
-                "file_path": file_path,
-                "temp_dir": temp_dir,
-                "data_source": "samsung_galaxy_csv"
-            }
-
-            # Store data_type if provided (for alternative_counts)
-            if data_type:
-                file_info["data_type"] = data_type
-                logger.info(f"Storing data_type: {data_type}")
+        # Stream the uploaded file into the blob store (enforces the file size limit if enabled)
+        blob, file_size = await store_upload_file(file)
 
-            uploaded_data[file_id] = file_info
-
-            return {
-                "file_id": file_id,
-                "filename": file.filename
-            }
-        elif data_source == "other":
-            uploaded_data[file_id] = {
-                "filename": file.filename,
-                "file_path": file_path,
-                "temp_dir": temp_dir,
-                "data_source": "other",
-                "data_type": data_type,
-                "data_unit": data_unit,
-                "time_format": time_format,
-                "time_column": time_column,
-                "data_columns": data_columns.split(",") if data_columns else None
-            }
-            return {
-                "file_id": file_id,
-                "filename": file.filename
-            }
-        else:
-            raise HTTPException(status_code=400, detail="Invalid data source")
+        try:
+            return register_uploaded_file(
+                filename=file.filename,
+                blob=blob,
+                data_source=data_source,
+                data_type=data_type,
+                data_unit=data_unit,
+                time_format=time_format,
+                time_column=time_column,
+                data_columns=data_columns
+            )
+        except HTTPException:
+            blob_store.discard_if_unused(blob["content_hash"])
+            raise
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing file: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -445,41 +599,123 @@ async def extract_files(file_id: str) -> Dict[str, Any]:
         if file_data.get("data_source") in ["samsung_galaxy_csv", "other"]:
             return {"message": "No extraction needed for CSV files"}
 
-        temp_dir = file_data["temp_dir"]
-        zip_path = os.path.join(temp_dir, file_data["filename"])
+        # Files are only extracted once
+        if "child_dir" in file_data and os.path.exists(file_data["child_dir"]):
+            return {"message": "Files extracted successfully", "child_dir": file_data["child_dir"]}
+
+        # The extracted files are kept with the blob and shared by identical uploads
+        content_hash = file_data["content_hash"]
+        async with blob_store.lock(content_hash):
+            blob = blob_store.get(content_hash)
+            child_dir = blob["derived"].get("child_dir")
+            if child_dir is None or not os.path.exists(child_dir):
+                extracted_dir = blob_store.derived_path(content_hash, "extracted")
+                # Extract next to the final directory and rename it into place, as
+                # another worker process may extract the same archive concurrently
+                temp_dir = blob_store.derived_path(content_hash, f"extracting_{uuid.uuid4().hex}")
+
+                # Stream the acceleration data files (skipping __MACOSX) in a worker process
+                try:
+                    result = await engine.run(
+                        galaxy_binary.extract_acceleration_data,
+                        file_data["zip_path"],
+                        temp_dir,
+                        progress_key=f"extract_{file_id}"
+                    )
+                except (ValueError, zipfile.BadZipFile) as e:
+                    shutil.rmtree(temp_dir, ignore_errors=True)
+                    raise HTTPException(status_code=400, detail=str(e))
+                finally:
+                    engine.clear_progress(f"extract_{file_id}")
 
-        # Create a permanent directory for extracted files
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        extracted_dir = os.path.join(
-            "extracted_files", f"extracted_{timestamp}")
-        os.makedirs(extracted_dir, exist_ok=True)
+                try:
+                    os.rename(temp_dir, extracted_dir)
+                except OSError:
+                    # Extracted by another worker in the meantime
+                    shutil.rmtree(temp_dir, ignore_errors=True)
+                child_dir = os.path.join(extracted_dir, os.path.relpath(
+                    result["child_dir"], os.path.realpath(temp_dir)))
+                blob_store.set_derived(content_hash, "child_dir", child_dir)
+                logger.info(
+                    f"Extracted {result['n_files']} files ({result['n_bytes']} bytes). Child directory for processing: {child_dir}")
 
-        # Extract the ZIP file
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extracted_dir)
+        if file_id in uploaded_data:
+            uploaded_data[file_id]["child_dir"] = child_dir
+        return {"message": "Files extracted successfully", "child_dir": child_dir}
 
-        # Find the actual data directory (skip __MACOSX)
-        child_dirs = [d for d in os.listdir(extracted_dir)
-                      if os.path.isdir(os.path.join(extracted_dir, d))
-                      and not d.startswith('__MACOSX')]
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error extracting files: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
 
-        if not child_dirs:
-            raise HTTPException(
-                status_code=400, detail="No valid data directory found in ZIP file")
 
-        child_dir = os.path.join(extracted_dir, child_dirs[0])
+@app.get("/extract/{file_id}/progress")
+async def get_extract_progress(file_id: str) -> Dict[str, Any]:
+    """
+    Get the progress of the extraction of an uploaded ZIP file
+    """
+    if file_id not in uploaded_data:
+        raise HTTPException(status_code=404, detail="File not found")
 
-        # Update the uploaded_data with the permanent directory
-        uploaded_data[file_id]["permanent_dir"] = extracted_dir
-        uploaded_data[file_id]["child_dir"] = child_dir
+    if "child_dir" in uploaded_data[file_id]:
+        return {"status": "completed", "completed": None, "total": None}
 
-        logger.info(
-            f"Files extracted successfully. Child directory for processing: {child_dir}")
-        return {"message": "Files extracted successfully", "child_dir": child_dir}
+    progress = engine.get_progress(f"extract_{file_id}")
+    if progress is None:
+        return {"status": "pending", "completed": 0, "total": 0}
+    return {"status": "running", "completed": progress["completed"], "total": progress["total"]}
 
-    except Exception as e:
-        logger.error(f"Error extracting files: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+
+# Output formats of endpoints returning a single table
+TABLE_FORMATS = RESPONSE_FORMATS + (arrow_format.PARQUET_FORMAT,)
+
+
+def validate_response_format(response_format: str, formats=RESPONSE_FORMATS) -> None:
+    """
+    Raise a 400 error if response_format is not a supported output format
+    """
+    if response_format not in formats:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid format '{response_format}'. Must be one of: {', '.join(formats)}")
+
+
+async def binary_table_response(df: pd.DataFrame, request: Request, response_format: str,
+                                filename: str) -> Optional[Response]:
+    """
+    Return df as Arrow IPC stream or Parquet file if requested, otherwise None
+
+    An Arrow IPC stream is returned for "Accept: application/vnd.apache.arrow.stream"
+    and a Parquet file for format=parquet.
+    """
+    wants_arrow = arrow_format.accepts_arrow_stream(request.headers.get("accept"))
+    if response_format != arrow_format.PARQUET_FORMAT and not wants_arrow:
+        return None
+    if not arrow_format.arrow_available():
+        raise HTTPException(
+            status_code=406, detail="Arrow and Parquet output require pyarrow on the server")
+
+    loop = asyncio.get_running_loop()
+    if response_format == arrow_format.PARQUET_FORMAT:
+        content = await loop.run_in_executor(None, arrow_format.dataframe_to_parquet, df)
+        return Response(
+            content=content,
+            media_type=arrow_format.PARQUET_MEDIA_TYPE,
+            headers={"Content-Disposition": f'attachment; filename="{filename}.parquet"'}
+        )
+    content = await loop.run_in_executor(None, arrow_format.dataframe_to_arrow_stream, df)
+    return Response(content=content, media_type=arrow_format.ARROW_STREAM_MEDIA_TYPE)
+
+
+def validate_downsampling(points: Optional[int], resolution: Optional[str]) -> None:
+    """
+    Raise a 400 error if the points/resolution downsampling parameters are invalid
+    """
+    try:
+        downsampling.validate_downsampling(points, resolution)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 class ProcessRequest(BaseModel):
@@ -505,10 +741,26 @@ class ProcessRequest(BaseModel):
 
 
 @app.post("/process/{file_id}")
-async def process_data(file_id: str, request: ProcessRequest) -> Dict[str, Any]:
+async def process_data(file_id: str, request: ProcessRequest, http_request: Request,
+                       response_format: str = Query(RECORDS_FORMAT, alias="format"),
+                       include_data: bool = True, points: Optional[int] = None,
+                       resolution: Optional[str] = None) -> Dict[str, Any]:
     """
     Process the data using appropriate data handler
+
+    With format=columnar, data and enmo_timeseries are returned as one array per
+    column (timestamps in epoch milliseconds) instead of a list of rows. With
+    include_data=false the minute-level data is left out of the response; it can
+    be queried with GET /results/{file_id}/timeseries. enmo_timeseries is
+    downsampled to the given number of points (LTTB) or to the given resolution
+    (e.g. '15min', hourly by default).
+
+    Results are memoized, so processing a file again with the same settings
+    does not recompute them. Responses carry an ETag; a request with the
+    current ETag in If-None-Match is answered with 304 Not Modified.
     """
+    validate_response_format(response_format)
+    validate_downsampling(points, resolution)
     try:
         logger.info(f"=== DATA PROCESSING REQUEST ===")
         logger.info(f"File ID: {file_id}")
@@ -531,28 +783,32 @@ async def process_data(file_id: str, request: ProcessRequest) -> Dict[str, Any]:
                 data_columns = file_data["data_columns"]
                 logger.info(
                     f"Using GalaxyCSVDataHandler for CSV file: {file_data['file_path']} with selected columns: time_column={time_column}, data_columns={data_columns}")
-                handler = GalaxyDataHandler(
-                    galaxy_file_path=file_data["file_path"],
-                    preprocess_args=request.preprocess_args,
-                    verbose=False,
-                    data_format='csv',
-                    data_type='alternative_count',
-                    time_column=time_column,
-                    data_columns=data_columns
-                )
+                handler_spec = {
+                    "handler": "galaxy",
+                    "kwargs": {
+                        "galaxy_file_path": file_data["file_path"],
+                        "verbose": False,
+                        "data_format": 'csv',
+                        "data_type": 'alternative_count',
+                        "time_column": time_column,
+                        "data_columns": data_columns
+                    }
+                }
             else:
                 # Use hardcoded parameters for default ENMO
                 logger.info(
                     f"Using GalaxyCSVDataHandler for CSV file: {file_data['file_path']} with hardcoded parameters for Samsung Galaxy CSV")
-                handler = GalaxyDataHandler(
-                    galaxy_file_path=file_data["file_path"],
-                    preprocess_args=request.preprocess_args,
-                    verbose=False,
-                    data_format='csv',
-                    data_type='enmo',
-                    time_column='time',
-                    data_columns=['enmo_mg']
-                )
+                handler_spec = {
+                    "handler": "galaxy",
+                    "kwargs": {
+                        "galaxy_file_path": file_data["file_path"],
+                        "verbose": False,
+                        "data_format": 'csv',
+                        "data_type": 'enmo',
+                        "time_column": 'time',
+                        "data_columns": ['enmo_mg']
+                    }
+                }
         elif file_data.get("data_source") == "other":
             # Validate that data_type is available for processing
             if not file_data.get("data_type"):
@@ -626,17 +882,19 @@ async def process_data(file_id: str, request: ProcessRequest) -> Dict[str, Any]:
                 logger.info(f"Detected datetime/iso format, setting time_zone to None to avoid tz-aware conflict")
                 time_zone = None
             
-            handler = GenericDataHandler(
-                file_path=file_data["file_path"],
-                data_format="csv",
-                data_type=data_type,
-                time_format=time_format,
-                time_column=time_column,
-                time_zone=time_zone,
-                data_columns=data_columns,
-                preprocess_args=request.preprocess_args,
-                verbose=True
-            )
+            handler_spec = {
+                "handler": "generic",
+                "kwargs": {
+                    "file_path": file_data["file_path"],
+                    "data_format": "csv",
+                    "data_type": data_type,
+                    "time_format": time_format,
+                    "time_column": time_column,
+                    "time_zone": time_zone,
+                    "data_columns": data_columns,
+                    "verbose": True
+                }
+            }
         else:
             if "child_dir" not in file_data:
                 raise HTTPException(
@@ -648,116 +906,56 @@ async def process_data(file_id: str, request: ProcessRequest) -> Dict[str, Any]:
                 child_dir = child_dir + '/'
 
             logger.info(f"Using GalaxyDataHandler with directory: {child_dir}")
-            handler = GalaxyDataHandler(
-                galaxy_file_path=child_dir,
-                preprocess_args=request.preprocess_args,
-                verbose=False,
-                data_format='binary',
-                data_type='accelerometer',
-                time_column='unix_timestamp_in_ms',
-                data_columns=['acceleration_x',
-                              'acceleration_y', 'acceleration_z']
-            )
+            handler_spec = {
+                "handler": "galaxy",
+                "kwargs": {
+                    "galaxy_file_path": child_dir,
+                    "verbose": False,
+                    "data_format": 'binary',
+                    "data_type": 'accelerometer',
+                    "time_column": 'unix_timestamp_in_ms',
+                    "data_columns": ['acceleration_x',
+                                     'acceleration_y', 'acceleration_z']
+                }
+            }
+
+        # Preprocessed data is cached by file content (see processing.load_handler)
+        handler_spec["content_hash"] = file_data.get("content_hash")
 
         # Accept any valid numeric value for all preprocess_args
-        default_preprocess = {
-            'required_daily_coverage': 0.5,
-            'autocalib_sd_criter': 0.00013,
-            'autocalib_sphere_crit': 0.02,
-            'filter_type': 'lowpass',
-            'filter_cutoff': 2,
-            'wear_sd_crit': 0.00013,
-            'wear_range_crit': 0.00067,
-            'wear_window_length': 45,
-            'wear_window_skip': 7,
-        }
-        for k, v in request.preprocess_args.items():
-            if isinstance(v, (int, float)):
-                continue
-            try:
-                request.preprocess_args[k] = float(v)
-            except (ValueError, TypeError):
-                logger.warning(
-                    f"Invalid value for {k}: {v}, setting to default {default_preprocess.get(k)}")
-                request.preprocess_args[k] = default_preprocess.get(k)
+        processing.normalize_preprocess_args(request.preprocess_args)
 
         logger.info(f"Using preprocessing args: {request.preprocess_args}")
         logger.info(f"Using features args: {request.features_args}")
 
-        # Get metadata
-        metadata = handler.get_meta_data()
-
-        # Extract features using WearableFeatures with provided parameters
-        wf = WearableFeatures(handler, features_args=request.features_args)
-        features = wf.get_features()
-        df = wf.get_ml_data()
-        df = df.reset_index()
-        df = df.rename(columns={'timestamp': 'TIMESTAMP', 'enmo': 'ENMO'})
-        logger.info(f"ML data: {df.head()}")
-
-        # Keep all columns as they are, just ensure TIMESTAMP is the index name
-        df = df.rename(columns={'index': 'TIMESTAMP'})
-
-        # Clean the data to handle NaN and infinity values for JSON serialization
-        def clean_for_json(obj):
-            if isinstance(obj, dict):
-                return {k: clean_for_json(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [clean_for_json(v) for v in obj]
-            elif isinstance(obj, float):
-                if pd.isna(obj) or np.isinf(obj):
-                    return None
-                return obj
-            elif isinstance(obj, (int, str, bool)) or obj is None:
-                return obj
-            else:
-                return str(obj)
-
-        def safe_isinf(value):
-            """Safely check if a value is infinite, handling non-numeric types"""
-            try:
-                if isinstance(value, (int, float, np.number)):
-                    return np.isinf(value)
-                return False
-            except:
-                return False
-
-        # Clean the DataFrame before converting to JSON
-        cleaned_df = []
-        for _, row in df.iterrows():
-            cleaned_row = {}
-            for col, value in row.items():
-                if pd.isna(value) or safe_isinf(value):
-                    cleaned_row[col] = None
-                else:
-                    cleaned_row[col] = value
-            cleaned_df.append(cleaned_row)
-
-        df_json = cleaned_df
-
-        # Extract ENMO timeseries data (similar to bulk processing)
-        enmo_timeseries = []
-        try:
-            # Resample to hourly data for better performance
-            df['TIMESTAMP'] = pd.to_datetime(df['TIMESTAMP'])
-            df.set_index('TIMESTAMP', inplace=True)
-
-            # Resample to hourly and take the mean
-            hourly_df = df.resample('1H').mean()
-
-            # Create data structure with timestamp and ENMO values
-            for timestamp, row in hourly_df.iterrows():
-                if pd.notna(row['ENMO']):
-                    enmo_timeseries.append({
-                        'timestamp': timestamp.isoformat(),
-                        'enmo': float(row['ENMO'])
-                    })
-
-            logger.info(
-                f"Extracted {len(enmo_timeseries)} hourly ENMO values (from {len(df)} original points)")
-        except Exception as e:
-            logger.warning(f"Error extracting ENMO timeseries data: {e}")
-            enmo_timeseries = []
+        # Results are memoized by file content and settings (including the time zone)
+        result_key = result_cache.result_key(
+            handler_spec, request.preprocess_args, request.features_args)
+        etag = None if result_key is None else result_cache.make_etag(
+            result_key, response_format, include_data, points, resolution)
+        headers = {} if etag is None else {"ETag": etag}
+        etag_matches = etag is not None and result_cache.etag_matches(
+            http_request.headers.get("if-none-match"), etag)
+
+        # The client already has this result and the file holds it
+        if etag_matches and file_data.get("result_key") == result_key:
+            return Response(status_code=304, headers=headers)
+
+        result = process_results.get(result_key)
+        if result is not None:
+            logger.info(f"Using memoized processing result {result_key[:12]}")
+            df_json, enmo_timeseries = None, None
+        else:
+            # Preprocessing and feature extraction run in the worker pool
+            result = await engine.run(
+                processing.process_file, handler_spec, request.preprocess_args, request.features_args,
+                output_format=response_format, include_data=include_data,
+                points=points, resolution=resolution)
+            df_json = result.pop('data')
+            enmo_timeseries = result.pop('enmo_timeseries')
+            process_results.put(result_key, result)
+        features = result['features']
+        processed_data = result['frame']
 
         cosinor_features = features['cosinor']
         non_parametric_features = features['nonparam']
@@ -766,8 +964,8 @@ async def process_data(file_id: str, request: ProcessRequest) -> Dict[str, Any]:
 
         # Log the processed data summary
         logger.info(f"=== PROCESSING RESULTS ===")
-        logger.info(f"Data points processed: {len(df_json)}")
-        logger.info(f"Metadata: {metadata}")
+        logger.info(f"Data points processed: {len(processed_data)}")
+        logger.info(f"Metadata: {result['metadata']}")
         logger.info(
             f"Cosinor features keys: {list(cosinor_features.keys()) if cosinor_features else 'None'}")
         logger.info(
@@ -777,51 +975,145 @@ async def process_data(file_id: str, request: ProcessRequest) -> Dict[str, Any]:
         logger.info(
             f"Sleep features keys: {list(sleep_features.keys()) if sleep_features else 'None'}")
 
-        # Store all the processed data in uploaded_data
-        uploaded_data[file_id].update({
-            'handler': handler,
-            'data': df_json,
-            'features': {
-                'cosinor': clean_for_json(cosinor_features),
-                'nonparam': clean_for_json(non_parametric_features),
-                'physical_activity': clean_for_json(physical_activity_features),
-                'sleep': clean_for_json(sleep_features)
-            },
-            'metadata': {
-                'raw_data_frequency': metadata.get('raw_data_frequency'),
-                'raw_start_datetime': metadata.get('raw_start_datetime'),
-                'raw_end_datetime': metadata.get('raw_end_datetime'),
-                'raw_data_type': metadata.get('raw_data_type'),
-                'raw_data_unit': metadata.get('raw_data_unit'),
-                'raw_n_datapoints': metadata.get('raw_n_datapoints')
-            }
-        })
+        # Store all the processed data in uploaded_data (the minute-level data as time-indexed frame)
+        # unless the file already holds this result
+        if result_key is None or file_data.get("result_key") != result_key:
+            uploaded_data[file_id].update({
+                'handler': result['handler'],
+                'processed_data': processed_data,
+                'enmo_pyramid': result['enmo_pyramid'],
+                'features': features,
+                'metadata': result['metadata'],
+                'result_key': result_key
+            })
 
-        return {
+        if etag_matches:
+            return Response(status_code=304, headers=headers)
+
+        if enmo_timeseries is None:
+            df_json, enmo_timeseries = processing.format_processed_data(
+                processed_data, result['enmo_pyramid'], response_format, include_data,
+                points=points, resolution=resolution)
+
+        response = {
             "message": "Data processed successfully",
-            "data": df_json,
-            "features": {
-                "cosinor": clean_for_json(cosinor_features),
-                "nonparam": clean_for_json(non_parametric_features),
-                "physical_activity": clean_for_json(physical_activity_features),
-                "sleep": clean_for_json(sleep_features)
-            },
-            "metadata": {
-                "raw_data_frequency": metadata.get('raw_data_frequency'),
-                "raw_start_datetime": metadata.get('raw_start_datetime'),
-                "raw_end_datetime": metadata.get('raw_end_datetime'),
-                "raw_data_type": metadata.get('raw_data_type'),
-                "raw_data_unit": metadata.get('raw_data_unit'),
-                "raw_n_datapoints": metadata.get('raw_n_datapoints')
-            },
+            "features": features,
+            "metadata": result['metadata'],
             "enmo_timeseries": enmo_timeseries
         }
+        if include_data:
+            response["data"] = df_json
+        return ORJSONResponse(response, headers=headers)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing data: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/results/{file_id}/timeseries")
+async def get_timeseries(file_id: str, request: Request, start: Optional[str] = None,
+                         end: Optional[str] = None, columns: Optional[str] = None, page: int = 1,
+                         page_size: int = timeseries.DEFAULT_PAGE_SIZE,
+                         response_format: str = Query(RECORDS_FORMAT, alias="format")) -> Dict[str, Any]:
+    """
+    Get a page of the processed minute-level data of a file
+
+    start and end (inclusive) are ISO 8601 datetimes or epoch milliseconds,
+    columns is a comma-separated list of columns (all columns by default) and
+    page is 1-based. Arrow IPC streams (see binary_table_response) and Parquet
+    files (format=parquet) hold all selected rows instead of a page.
+    """
+    validate_response_format(response_format, TABLE_FORMATS)
+    if file_id not in uploaded_data:
+        raise HTTPException(status_code=404, detail="File not found")
+    processed_data = uploaded_data[file_id].get("processed_data")
+    if processed_data is None:
+        raise HTTPException(
+            status_code=409, detail="File has not been processed yet")
+    if page < 1:
+        raise HTTPException(status_code=400, detail="page must be at least 1")
+    if not 1 <= page_size <= timeseries.MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=400, detail=f"page_size must be between 1 and {timeseries.MAX_PAGE_SIZE}")
+
+    try:
+        start_time = timeseries.parse_time_bound(start)
+        end_time = timeseries.parse_time_bound(end)
+        selected_columns = [col.strip() for col in columns.split(",") if col.strip()] if columns else None
+        selection = timeseries.select_timeseries(
+            processed_data, start_time, end_time, selected_columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    binary_response = await binary_table_response(
+        selection, request, response_format, f"timeseries_{file_id}")
+    if binary_response is not None:
+        return binary_response
+
+    rows, total_pages = timeseries.paginate(selection, page, page_size)
+
+    return ORJSONResponse({
+        "file_id": file_id,
+        "start": start_time,
+        "end": end_time,
+        "columns": [timeseries.TIME_INDEX] + selection.columns.tolist(),
+        "page": page,
+        "page_size": page_size,
+        "total_rows": len(selection),
+        "total_pages": total_pages,
+        "data": dataframe_to_format(rows.reset_index(), response_format)
+    })
+
+
+@app.get("/results/{file_id}/enmo")
+async def get_enmo_timeseries(file_id: str, start: Optional[str] = None, end: Optional[str] = None,
+                              points: Optional[int] = None, resolution: Optional[str] = None,
+                              response_format: str = Query(RECORDS_FORMAT, alias="format")) -> Dict[str, Any]:
+    """
+    Get the downsampled ENMO timeseries of a processed file
+
+    The ENMO values between start and end (inclusive, ISO 8601 datetimes or epoch
+    milliseconds) are downsampled to the given number of points (LTTB) or to the
+    given resolution (hourly by default), with the min/max envelope and wear
+    fraction of each bucket. The data is taken from the precomputed ENMO pyramid
+    level that fits the request; 'level' reports which one was used.
+    """
+    validate_response_format(response_format)
+    validate_downsampling(points, resolution)
+    if file_id not in uploaded_data:
+        raise HTTPException(status_code=404, detail="File not found")
+    processed_data = uploaded_data[file_id].get("processed_data")
+    if processed_data is None:
+        raise HTTPException(
+            status_code=409, detail="File has not been processed yet")
+
+    if "ENMO" not in processed_data.columns:
+        raise HTTPException(
+            status_code=400, detail="Processed data has no ENMO column")
+
+    try:
+        start_time = timeseries.parse_time_bound(start)
+        end_time = timeseries.parse_time_bound(end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    level, enmo_timeseries = pyramid.downsample_enmo_pyramid(
+        uploaded_data[file_id].get("enmo_pyramid"), processed_data,
+        start=start_time, end=end_time, points=points, resolution=resolution)
+
+    return ORJSONResponse({
+        "file_id": file_id,
+        "start": start_time,
+        "end": end_time,
+        "points": points,
+        "resolution": (resolution or downsampling.DEFAULT_RESOLUTION) if points is None else None,
+        "level": level,
+        "enmo_timeseries": processing.format_enmo_timeseries(enmo_timeseries, response_format)
+    })
+
+
 @app.get("/health")
 async def health_check():
     """
@@ -877,21 +1169,13 @@ async def get_timezones():
 @app.on_event("shutdown")
 async def cleanup():
     """
-    Clean up all temporary and extracted files, and clear in-memory state when the application shuts down
-    """
-    # Clean up temporary directories
-    for temp_dir in temp_dirs.values():
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
+    Clear the in-memory state of this process when the application shuts down
 
-    # Clean up extracted files directory
-    if os.path.exists(EXTRACTED_FILES_DIR):
-        shutil.rmtree(EXTRACTED_FILES_DIR)
-        os.makedirs(EXTRACTED_FILES_DIR, exist_ok=True)
-
-    # Clear in-memory state
-    uploaded_data.clear()
-    temp_dirs.clear()
+    The uploaded files, results, jobs and chunked uploads in ARTIFACT_DIR are
+    kept for the other workers and the next start.
+    """
+    # Stop the worker pool
+    engine.shutdown()
 
     logger.info("Application state cleaned up successfully")
 
@@ -910,6 +1194,20 @@ class AgePredictionRequest(BaseModel):
     gender: str
 
 
+class BatchAgePredictionItem(BaseModel):
+    # Either a processed file or its cosinor parameters
+    file_id: Optional[str] = None
+    mesor: Optional[float] = None
+    amplitude: Optional[float] = None
+    acrophase: Optional[float] = None
+    chronological_age: float
+    gender: str
+
+
+class BatchAgePredictionRequest(BaseModel):
+    items: List[BatchAgePredictionItem]
+
+
 @app.post("/update_columns/{file_id}")
 async def update_column_selections(file_id: str, request: ColumnSelectionRequest):
     """
@@ -962,10 +1260,88 @@ async def update_column_selections(file_id: str, request: ColumnSelectionRequest
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/predict_age/batch")
+async def predict_age_batch(request: BatchAgePredictionRequest):
+    """
+    Predict the biological age of many subjects at once
+
+    Every item gives a processed file (file_id) or the cosinor parameters
+    (mesor, amplitude, acrophase) together with the chronological age and
+    gender. All predictions are scored in one vectorized step. Items whose
+    file is unknown or has no cosinor parameters get an error and no
+    prediction; they do not fail the request.
+    """
+    try:
+        logger.info(f"=== BATCH AGE PREDICTION REQUEST ({len(request.items)} items) ===")
+
+        # Cosinor parameters of the referenced files (looked up once per file)
+        file_params = {}
+        params = []
+        errors = []
+        for item in request.items:
+            error = None
+            if item.file_id is not None:
+                if item.file_id not in file_params:
+                    record = uploaded_data[item.file_id] if item.file_id in uploaded_data else {}
+                    features = record.get('features')
+                    file_params[item.file_id] = None if features is None else (features.get('cosinor') or {})
+                cosinor = file_params[item.file_id]
+                if cosinor is None:
+                    cosinor, error = {}, "File not found or not processed"
+                item_params = (cosinor.get('mesor'), cosinor.get('amplitude'), cosinor.get('acrophase'))
+            else:
+                item_params = (item.mesor, item.amplitude, item.acrophase)
+            if error is None and any(value is None for value in item_params):
+                error = "Cosinor parameters not available"
+            params.append(item_params)
+            errors.append(error)
+
+        mesor, amplitude, acrophase = zip(*params) if params else ((), (), ())
+        predictions = bioage.predict_cosinorage_batch(
+            mesor, amplitude, acrophase,
+            [item.chronological_age for item in request.items],
+            [item.gender for item in request.items])
+
+        results = []
+        for item, item_params, error, predicted_age in zip(
+                request.items, params, errors, predictions["cosinorage"].tolist()):
+            result = {
+                "file_id": item.file_id,
+                "predicted_age": None if error else predicted_age,
+                "chronological_age": item.chronological_age,
+                "gender": item.gender,
+                "features": {
+                    "mesor": item_params[0],
+                    "amplitude": item_params[1],
+                    "acrophase": item_params[2]
+                }
+            }
+            if error:
+                result["error"] = error
+            results.append(result)
+
+        n_failed = sum(1 for error in errors if error)
+        logger.info(f"Predicted {len(results) - n_failed} ages, {n_failed} items failed")
+        return ORJSONResponse({
+            "predictions": results,
+            "n_predictions": len(results) - n_failed,
+            "n_failed": n_failed
+        })
+
+    except Exception as e:
+        logger.error(f"Error predicting ages: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500, detail=f"Error predicting ages: {str(e)}")
+
+
 @app.post("/predict_age/{file_id}")
-async def predict_age(file_id: str, request: AgePredictionRequest):
+async def predict_age(file_id: str, request: AgePredictionRequest, http_request: Request):
     """
     Predict biological age based on cosinor features and demographic information.
+
+    Predictions are memoized by processing result, age and gender. Responses
+    carry an ETag; a request with the current ETag in If-None-Match is answered
+    with 304 Not Modified.
     """
     try:
         logger.info(f"=== AGE PREDICTION REQUEST ===")
@@ -980,43 +1356,47 @@ async def predict_age(file_id: str, request: AgePredictionRequest):
                 status_code=404, detail="File not found or not processed")
 
         data = uploaded_data[file_id]
-        if 'handler' not in data:
+        if 'handler' not in data and 'features' not in data:
             logger.error(f"Data handler not available for file ID {file_id}")
             raise HTTPException(
                 status_code=400, detail="Data handler not available")
 
         # Log the data we're working with
-        logger.info(f"Handler type: {type(data['handler'])}")
         logger.info(f"Available data keys: {list(data.keys())}")
         if 'features' in data:
             logger.info(f"Available features: {list(data['features'].keys())}")
             if 'cosinor' in data['features']:
                 logger.info(f"Cosinor features: {data['features']['cosinor']}")
 
-        # Create record in the correct format
-        record = [{
-            # Use the stored GalaxyDataHandler object
-            'handler': data['handler'],
-            'age': request.chronological_age,
-            'gender': request.gender
-        }]
-
-        logging.info(f"Created record: {record}")
-
-        # Create CosinorAge object and predict
-        try:
-            cosinor_age = CosinorAge(record)
-            logging.info("Successfully created CosinorAge object")
-        except Exception as e:
-            logging.error(f"Error creating CosinorAge object: {str(e)}")
-            raise
-
-        try:
-            predictions = cosinor_age.get_predictions()
-            logging.info(f"Got predictions: {predictions}")
-        except Exception as e:
-            logging.error(f"Error getting predictions: {str(e)}")
-            raise
+        # The prediction only depends on the processing result, age and gender
+        etag = None if data.get('result_key') is None else result_cache.make_etag(
+            data['result_key'], request.chronological_age, request.gender)
+        headers = {} if etag is None else {"ETag": etag}
+        if etag is not None and result_cache.etag_matches(http_request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        response = age_predictions.get(etag)
+        if response is not None:
+            return ORJSONResponse(response, headers=headers)
+
+        # Use the cosinor parameters computed by /process; only files without
+        # them fit the cosinor model again (in the worker pool)
+        cosinor = (data.get('features') or {}).get('cosinor') or {}
+        prediction = bioage.predict_cosinorage_from_params(
+            cosinor.get('mesor'), cosinor.get('amplitude'), cosinor.get('acrophase'),
+            request.chronological_age, request.gender)
+        if prediction['cosinorage'] is not None:
+            predictions = [prediction]
+        elif 'handler' in data:
+            try:
+                predictions = await engine.run(
+                    processing.predict_cosinorage, data['handler'], request.chronological_age, request.gender)
+            except Exception as e:
+                logging.error(f"Error getting predictions: {str(e)}")
+                raise
+        else:
+            raise HTTPException(
+                status_code=400, detail="Cosinor parameters not available")
+        logging.info(f"Got predictions: {predictions}")
 
         if not predictions or not isinstance(predictions, list) or len(predictions) == 0:
             raise HTTPException(
@@ -1028,7 +1408,7 @@ async def predict_age(file_id: str, request: AgePredictionRequest):
             raise HTTPException(
                 status_code=500, detail="Prediction result missing CosinorAge")
 
-        return {
+        response = {
             "predicted_age": prediction['cosinorage'],
             "chronological_age": request.chronological_age,
             "gender": request.gender,
@@ -1038,7 +1418,11 @@ async def predict_age(file_id: str, request: AgePredictionRequest):
                 "acrophase": prediction.get('phi1')
             }
         }
+        age_predictions.put(etag, response)
+        return ORJSONResponse(response, headers=headers)
 
+    except HTTPException:
+        raise
     except ValueError as e:
         logging.error(f"ValueError in predict_age: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -1055,22 +1439,8 @@ async def clear_state(file_id: str):
     """
     try:
         if file_id in uploaded_data:
-            file_data = uploaded_data[file_id]
-
-            # Clean up temporary directory
-            if "temp_dir" in file_data and os.path.exists(file_data["temp_dir"]):
-                shutil.rmtree(file_data["temp_dir"])
-
-            # Clean up permanent directory
-            if "permanent_dir" in file_data and os.path.exists(file_data["permanent_dir"]):
-                shutil.rmtree(file_data["permanent_dir"])
-
-            # Remove from memory
-            del uploaded_data[file_id]
-            if file_id in temp_dirs:
-                del temp_dirs[file_id]
-            if file_id in file_upload_times:
-                del file_upload_times[file_id]
+            # The file itself is deleted once no other upload uses it
+            remove_file_state(file_id)
 
             return {"message": f"State cleared for file {file_id}"}
         else:
@@ -1089,32 +1459,22 @@ async def clear_all_state():
     try:
         logger.info("=== CLEARING ALL STATE ===")
 
-        # Clean up all temporary directories
-        for temp_dir in temp_dirs.values():
-            if os.path.exists(temp_dir):
-                try:
-                    shutil.rmtree(temp_dir)
-                    logger.info(f"Cleared temporary directory: {temp_dir}")
-                except Exception as e:
-                    logger.warning(
-                        f"Failed to clear temporary directory {temp_dir}: {str(e)}")
-
-        # Clean up all permanent directories from uploaded_data
-        for file_data in uploaded_data.values():
-            if "permanent_dir" in file_data and os.path.exists(file_data["permanent_dir"]):
-                try:
-                    shutil.rmtree(file_data["permanent_dir"])
-                    logger.info(
-                        f"Cleared permanent directory: {file_data['permanent_dir']}")
-                except Exception as e:
-                    logger.warning(
-                        f"Failed to clear permanent directory {file_data['permanent_dir']}: {str(e)}")
+        # Clean up all uploaded files with their extracted files, results and preprocessed data
+        uploaded_data.clear()
+        blob_store.clear()
+        preprocess_cache.clear()
+        process_results.clear()
+        age_predictions.clear()
+        logger.info(f"Cleared blob store: {BLOB_STORE_DIR}")
 
         # Clear extracted_files directory completely
         if os.path.exists(EXTRACTED_FILES_DIR):
             try:
                 for item in os.listdir(EXTRACTED_FILES_DIR):
                     item_path = os.path.join(EXTRACTED_FILES_DIR, item)
+                    # The state database stays in place for the other workers
+                    if item_path == ARTIFACT_DIR:
+                        continue
                     if os.path.isdir(item_path):
                         shutil.rmtree(item_path)
                     else:
@@ -1125,10 +1485,8 @@ async def clear_all_state():
                 logger.warning(
                     f"Failed to clear extracted_files directory: {str(e)}")
 
-        # Clear in-memory state
-        uploaded_data.clear()
-        temp_dirs.clear()
-        file_upload_times.clear()
+        # Abort the chunked uploads in progress
+        upload_sessions.clear()
 
         logger.info("All state cleared successfully")
         return {"message": "All uploaded data and directories cleared successfully"}
@@ -1180,30 +1538,32 @@ async def search_docs(query: str):
 
 
 @app.get("/download/sample")
-async def download_sample_data():
-    """Download sample data file."""
-    sample_file_path = os.path.join(os.path.dirname(
-        os.path.abspath(__file__)), "data", "sample", "sample_data_single.csv")
+async def download_sample_data(request: Request):
+    """Download sample data file (precompressed if the client accepts it)."""
+    sample_file_path = os.path.join(SAMPLE_DATA_DIR, "sample_data_single.csv")
     if not os.path.exists(sample_file_path):
         raise HTTPException(status_code=404, detail="Sample file not found")
 
-    return FileResponse(
-        path=sample_file_path,
+    return precompressed_file_response(
+        request,
+        sample_file_path,
+        precompressed_downloads.get("sample_data_single.csv", {}),
         filename="sample_data_single.csv",
         media_type="text/csv"
     )
 
 
 @app.get("/download/sample-multi")
-async def download_sample_multi_data():
-    """Download sample multi-individual data file."""
-    sample_file_path = os.path.join(os.path.dirname(
-        os.path.abspath(__file__)), "data", "sample", "sample_data_multi.zip")
+async def download_sample_multi_data(request: Request):
+    """Download sample multi-individual data file (precompressed if the client accepts it)."""
+    sample_file_path = os.path.join(SAMPLE_DATA_DIR, "sample_data_multi.zip")
     if not os.path.exists(sample_file_path):
         raise HTTPException(status_code=404, detail="Sample multi file not found")
 
-    return FileResponse(
-        path=sample_file_path,
+    return precompressed_file_response(
+        request,
+        sample_file_path,
+        precompressed_downloads.get("sample_data_multi.zip", {}),
         filename="sample_data_multi.zip",
         media_type="application/zip"
     )
@@ -1264,11 +1624,9 @@ async def get_columns(file_id: str) -> List[str]:
             raise HTTPException(
                 status_code=404, detail="File not found on disk")
 
-        # Read the first few lines to get column names
-        import pandas as pd
+        # Answer from the schema sniffed at upload
         try:
-            df = pd.read_csv(file_path, nrows=1)
-            return df.columns.tolist()
+            return get_file_columns(file_data)
         except Exception as e:
             logger.error(f"Error reading CSV file: {str(e)}")
             raise HTTPException(
@@ -1293,68 +1651,184 @@ async def bulk_upload_files(files: List[UploadFile] = File(...)) -> Dict[str, An
         for i, file in enumerate(files):
             logger.info(f"Processing file {i+1}: {file.filename}")
 
-            # Check file size limit if enabled
-            if ENABLE_FILE_SIZE_LIMIT:
-                # Read file content to get actual size
-                file_content = await file.read()
-                file_size = len(file_content)
-                
-                if file_size > MAX_FILE_SIZE_BYTES:
-                    max_size_mb = MAX_FILE_SIZE_BYTES / (1024 * 1024)
-                    file_size_mb = file_size / (1024 * 1024)
-                    raise HTTPException(
-                        status_code=413, 
-                        detail=f"File '{file.filename}' size ({file_size_mb:.1f}MB) exceeds the maximum allowed size of {max_size_mb}MB"
-                    )
-                
-                # Reset file position for later reading
-                await file.seek(0)
-                logger.info(f"File size check passed for {file.filename}: {file_size} bytes")
-
-            # Create a temporary directory for each file
-            temp_dir = tempfile.mkdtemp()
-            temp_dirs[str(len(uploaded_data))] = temp_dir
-
-            # Save the uploaded file
-            file_path = os.path.join(temp_dir, file.filename)
-
-            with open(file_path, "wb") as buffer:
-                if ENABLE_FILE_SIZE_LIMIT:
-                    # Use the content we already read for size checking
-                    buffer.write(file_content)
-                else:
-                    # Read file content normally
-                    contents = await file.read()
-                    buffer.write(contents)
-
-            file_id = str(len(uploaded_data))
-            
-            # Track upload time for cleanup
-            file_upload_times[file_id] = datetime.now()
-
-            # Store file info
-            uploaded_data[file_id] = {
-                "filename": file.filename,
-                "file_path": file_path,
-                "temp_dir": temp_dir,
-                "data_source": "bulk_csv"
-            }
+            # Stream the uploaded file into the blob store (enforces the file size limit if enabled)
+            blob, file_size = await store_upload_file(file)
+            logger.info(f"Saved {file.filename}: {file_size} bytes")
 
-            uploaded_files.append({
-                "file_id": file_id,
-                "filename": file.filename
-            })
+            try:
+                uploaded_files.append(register_uploaded_file(
+                    filename=file.filename,
+                    blob=blob,
+                    data_source="bulk_csv"
+                ))
+            except HTTPException:
+                blob_store.discard_if_unused(blob["content_hash"])
+                raise
 
         return {
             "message": f"Successfully uploaded {len(files)} files",
             "files": uploaded_files
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing bulk upload: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class ChunkedUploadRequest(BaseModel):
+    filename: str
+    total_size: int
+    data_source: str = "bulk_csv"
+    data_type: Optional[str] = None
+    data_unit: Optional[str] = None
+    time_format: Optional[str] = None
+    time_column: Optional[str] = None
+    data_columns: Optional[str] = None
+
+
+class ChunkedUploadFinalizeRequest(BaseModel):
+    checksum: str
+    checksum_algorithm: str = "sha256"
+
+
+@app.post("/upload/chunked")
+async def initiate_chunked_upload(request: ChunkedUploadRequest) -> Dict[str, Any]:
+    """
+    Start a resumable chunked upload
+
+    The chunks are sent with PUT /upload/chunked/{upload_id}?offset=<byte offset> (in any
+    order and in parallel) and the upload is completed with POST /upload/chunked/{upload_id}/finalize.
+    """
+    try:
+        logger.info(f"=== CHUNKED UPLOAD REQUEST ===")
+        logger.info(f"File name: {request.filename}")
+        logger.info(f"Data source: {request.data_source}")
+        logger.info(f"File size: {request.total_size}")
+
+        validate_upload_type(request.filename, request.data_source)
+
+        if ENABLE_FILE_SIZE_LIMIT and request.total_size > MAX_FILE_SIZE_BYTES:
+            max_size_mb = MAX_FILE_SIZE_BYTES / (1024 * 1024)
+            raise HTTPException(
+                status_code=413,
+                detail=f"File '{request.filename}' exceeds the maximum allowed size of {max_size_mb}MB"
+            )
+
+        session = upload_sessions.create(
+            request.filename,
+            request.total_size,
+            metadata={
+                "data_source": request.data_source,
+                "data_type": request.data_type,
+                "data_unit": request.data_unit,
+                "time_format": request.time_format,
+                "time_column": request.time_column,
+                "data_columns": request.data_columns
+            }
+        )
+
+        return {
+            "upload_id": session["upload_id"],
+            "filename": session["filename"],
+            "total_size": session["total_size"],
+            "chunk_size": DEFAULT_UPLOAD_CHUNK_SIZE_BYTES
+        }
+
+    except HTTPException:
+        raise
+    except UploadSessionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error starting chunked upload: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/upload/chunked/{upload_id}")
+async def get_chunked_upload_status(upload_id: str) -> Dict[str, Any]:
+    """
+    Get the received and missing byte ranges of a chunked upload (used to resume it)
+    """
+    status = upload_sessions.get_status(upload_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return status
+
+
+@app.put("/upload/chunked/{upload_id}")
+async def upload_chunk(upload_id: str, offset: int, request: Request) -> Dict[str, Any]:
+    """
+    Write the request body to the chunked upload at the given byte offset
+    """
+    if upload_sessions.get(upload_id) is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+    try:
+        return await upload_sessions.write_chunk(upload_id, offset, request.stream())
+
+    except KeyError:
+        # The upload was finalized or aborted meanwhile
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except UploadSessionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error writing chunk: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/upload/chunked/{upload_id}/finalize")
+async def finalize_chunked_upload(upload_id: str, request: ChunkedUploadFinalizeRequest) -> Dict[str, Any]:
+    """
+    Verify the checksum of a completed chunked upload and register the file
+    """
+    if upload_sessions.get(upload_id) is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+    try:
+        try:
+            session = await upload_sessions.finalize(
+                upload_id, request.checksum, request.checksum_algorithm)
+        except KeyError:
+            # Another request finalized or aborted the upload meanwhile
+            raise HTTPException(status_code=404, detail="Upload not found")
+        metadata = session["metadata"]
+
+        try:
+            blob, _ = blob_store.add(
+                session["file_path"], session["content_hash"], session["filename"])
+        finally:
+            shutil.rmtree(session["temp_dir"], ignore_errors=True)
+
+        try:
+            return register_uploaded_file(
+                filename=session["filename"],
+                blob=blob,
+                **metadata
+            )
+        except Exception:
+            blob_store.discard_if_unused(blob["content_hash"])
+            raise
+
+    except HTTPException:
+        raise
+    except UploadSessionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error finalizing chunked upload: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.delete("/upload/chunked/{upload_id}")
+async def abort_chunked_upload(upload_id: str) -> Dict[str, Any]:
+    """
+    Discard a chunked upload and its partially assembled file
+    """
+    if not upload_sessions.abort(upload_id):
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return {"message": f"Upload {upload_id} aborted"}
+
+
 @app.post("/validate_bulk_columns")
 async def validate_bulk_columns(file_ids: List[str]) -> Dict[str, Any]:
     """
@@ -1393,9 +1867,8 @@ async def validate_bulk_columns(file_ids: List[str]) -> Dict[str, Any]:
                 f"Reading columns from file {file_id}: {file_data['filename']} at path: {file_path}")
 
             try:
-                # Only read first row to get headers
-                df = pd.read_csv(file_path, nrows=1)
-                columns = df.columns.tolist()
+                # Answer from the schema sniffed at upload
+                columns = get_file_columns(file_data)
                 logger.info(f"Columns for file {file_id}: {columns}")
                 file_columns[file_id] = {
                     "filename": file_data["filename"],
@@ -1454,245 +1927,310 @@ async def validate_bulk_columns(file_ids: List[str]) -> Dict[str, Any]:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/bulk_process")
-async def bulk_process_data(request: BulkProcessRequest) -> Dict[str, Any]:
-    """
-    Process multiple files using BulkWearableFeatures and return distribution statistics
+async def prepare_bulk_process(request: BulkProcessRequest):
     """
-    try:
-        logger.info(f"=== BULK DATA PROCESSING REQUEST ===")
-        logger.info(f"Number of files to process: {len(request.files)}")
-        logger.info(f"Preprocessing arguments: {request.preprocess_args}")
-        logger.info(f"Features arguments: {request.features_args}")
-        logger.info(f"Cosinorage enabled: {request.enable_cosinorage}")
-        if request.enable_cosinorage:
-            logger.info(f"Number of cosinorage age inputs: {len(request.cosinor_age_inputs)}")
-            logger.info(f"Cosinorage age inputs: {request.cosinor_age_inputs}")
-        
-        # Detailed logging of all parameters passed from frontend
-        logger.info("=== DETAILED FRONTEND PARAMETERS ===")
-        logger.info(f"Full request object: {request}")
-        logger.info(f"Request model fields: {request.__fields__}")
-        logger.info(f"Request dict: {request.dict()}")
-        
-        # Log each file configuration in detail
-        for i, file_config in enumerate(request.files):
-            logger.info(f"=== FILE {i} CONFIGURATION ===")
-            logger.info(f"File {i} - Full config: {file_config}")
-            logger.info(f"File {i} - File ID: {file_config.get('file_id', 'NOT_SET')}")
-            logger.info(f"File {i} - Data type: {file_config.get('data_type', 'NOT_SET')}")
-            logger.info(f"File {i} - Data unit: {file_config.get('data_unit', 'NOT_SET')}")
-            logger.info(f"File {i} - Timestamp format: {file_config.get('timestamp_format', 'NOT_SET')}")
-            logger.info(f"File {i} - Time column: {file_config.get('time_column', 'NOT_SET')}")
-            logger.info(f"File {i} - Data columns: {file_config.get('data_columns', 'NOT_SET')}")
-            logger.info(f"File {i} - Timezone: {file_config.get('time_zone', 'NOT_SET')}")
-            logger.info(f"File {i} - Timezone type: {type(file_config.get('time_zone')) if file_config.get('time_zone') else 'None'}")
-        
-        # Log preprocessing parameters in detail
-        logger.info("=== PREPROCESSING PARAMETERS ===")
-        for key, value in request.preprocess_args.items():
-            logger.info(f"Preprocess {key}: {value} (type: {type(value)})")
-        
-        # Log feature parameters in detail
-        logger.info("=== FEATURE PARAMETERS ===")
-        for key, value in request.features_args.items():
-            logger.info(f"Feature {key}: {value} (type: {type(value)})")
-        
-        # Log cosinorage parameters if enabled
-        if request.enable_cosinorage:
-            logger.info("=== COSINORAGE PARAMETERS ===")
-            for i, cosinor_input in enumerate(request.cosinor_age_inputs):
-                logger.info(f"Cosinorage input {i}: {cosinor_input}")
-        
-        logger.info("=== END DETAILED FRONTEND PARAMETERS ===")
-        
-        # Log file configurations to debug timezone issue
-        for i, file_config in enumerate(request.files):
-            logger.info(f"File {i} config: {file_config}")
-            logger.info(f"File {i} timezone: {file_config.get('time_zone', 'NOT_SET')}")
-
-        # Validate that all files have the same column structure
-        file_ids = [file_config["file_id"] for file_config in request.files]
-        logger.info(f"Files to validate: {file_ids}")
-        logger.info(
-            f"Available files in uploaded_data: {list(uploaded_data.keys())}")
+    Validate a bulk processing request and describe the data handler of every file
 
-        # Check if all files exist
-        for file_id in file_ids:
-            if file_id not in uploaded_data:
-                logger.error(
-                    f"File {file_id} not found in uploaded_data during bulk process")
-                raise HTTPException(
-                    status_code=404, detail=f"File {file_id} not found. Files may have been cleared from server memory.")
+    Returns the list of handler specifications and the list of files that could
+    not be prepared. Raises HTTPException if files are missing or the column
+    structures do not match.
+    """
+    logger.info(f"Number of files to process: {len(request.files)}")
+    logger.info(f"Preprocessing arguments: {request.preprocess_args}")
+    logger.info(f"Features arguments: {request.features_args}")
+    logger.info(f"Cosinorage enabled: {request.enable_cosinorage}")
+    if request.enable_cosinorage:
+        logger.info(f"Number of cosinorage age inputs: {len(request.cosinor_age_inputs)}")
+        logger.info(f"Cosinorage age inputs: {request.cosinor_age_inputs}")
+
+    # Detailed logging of all parameters passed from frontend
+    logger.info("=== DETAILED FRONTEND PARAMETERS ===")
+    logger.info(f"Full request object: {request}")
+    logger.info(f"Request model fields: {request.__fields__}")
+    logger.info(f"Request dict: {request.dict()}")
+
+    # Log each file configuration in detail
+    for i, file_config in enumerate(request.files):
+        logger.info(f"=== FILE {i} CONFIGURATION ===")
+        logger.info(f"File {i} - Full config: {file_config}")
+        logger.info(f"File {i} - File ID: {file_config.get('file_id', 'NOT_SET')}")
+        logger.info(f"File {i} - Data type: {file_config.get('data_type', 'NOT_SET')}")
+        logger.info(f"File {i} - Data unit: {file_config.get('data_unit', 'NOT_SET')}")
+        logger.info(f"File {i} - Timestamp format: {file_config.get('timestamp_format', 'NOT_SET')}")
+        logger.info(f"File {i} - Time column: {file_config.get('time_column', 'NOT_SET')}")
+        logger.info(f"File {i} - Data columns: {file_config.get('data_columns', 'NOT_SET')}")
+        logger.info(f"File {i} - Timezone: {file_config.get('time_zone', 'NOT_SET')}")
+        logger.info(f"File {i} - Timezone type: {type(file_config.get('time_zone')) if file_config.get('time_zone') else 'None'}")
+
+    # Log preprocessing parameters in detail
+    logger.info("=== PREPROCESSING PARAMETERS ===")
+    for key, value in request.preprocess_args.items():
+        logger.info(f"Preprocess {key}: {value} (type: {type(value)})")
+
+    # Log feature parameters in detail
+    logger.info("=== FEATURE PARAMETERS ===")
+    for key, value in request.features_args.items():
+        logger.info(f"Feature {key}: {value} (type: {type(value)})")
+
+    # Log cosinorage parameters if enabled
+    if request.enable_cosinorage:
+        logger.info("=== COSINORAGE PARAMETERS ===")
+        for i, cosinor_input in enumerate(request.cosinor_age_inputs):
+            logger.info(f"Cosinorage input {i}: {cosinor_input}")
+
+    logger.info("=== END DETAILED FRONTEND PARAMETERS ===")
+
+    # Log file configurations to debug timezone issue
+    for i, file_config in enumerate(request.files):
+        logger.info(f"File {i} config: {file_config}")
+        logger.info(f"File {i} timezone: {file_config.get('time_zone', 'NOT_SET')}")
+
+    # Validate that all files have the same column structure
+    file_ids = [file_config["file_id"] for file_config in request.files]
+    logger.info(f"Files to validate: {file_ids}")
+    logger.info(
+        f"Available files in uploaded_data: {list(uploaded_data.keys())}")
+
+    # Check if all files exist
+    for file_id in file_ids:
+        if file_id not in uploaded_data:
+            logger.error(
+                f"File {file_id} not found in uploaded_data during bulk process")
+            raise HTTPException(
+                status_code=404, detail=f"File {file_id} not found. Files may have been cleared from server memory.")
 
-        validation_result = await validate_bulk_columns(file_ids)
+    validation_result = await validate_bulk_columns(file_ids)
 
-        if not validation_result["valid"]:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Column validation failed: {validation_result['message']}. Files must have identical column structures."
-            )
+    if not validation_result["valid"]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Column validation failed: {validation_result['message']}. Files must have identical column structures."
+        )
 
-        handlers = []
-        failed_files = []
+    handler_specs = []
+    failed_files = []
 
-        for file_config in request.files:
-            file_id = file_config["file_id"]
+    for file_index, file_config in enumerate(request.files):
+        file_id = file_config["file_id"]
 
-            if file_id not in uploaded_data:
-                failed_files.append({
-                    "file_id": file_id,
-                    "filename": "Unknown",
-                    "error": f"File {file_id} not found in uploaded data"
-                })
-                logger.warning(
-                    f"File {file_id} not found in uploaded_data, skipping")
-                continue
+        if file_id not in uploaded_data:
+            failed_files.append({
+                "file_id": file_id,
+                "filename": "Unknown",
+                "error": f"File {file_id} not found in uploaded data"
+            })
+            logger.warning(
+                f"File {file_id} not found in uploaded_data, skipping")
+            continue
 
-            file_data = uploaded_data[file_id]
+        file_data = uploaded_data[file_id]
 
-            # Create data type string
-            if file_config["data_type"] and '-' in file_config["data_type"]:
-                data_type = file_config["data_type"]
-            elif file_config["data_type"] and file_config.get("data_unit"):
-                data_type = file_config["data_type"] + \
-                    '-' + file_config["data_unit"]
-            else:
-                data_type = file_config["data_type"] or "unknown"
-
-            # Set default values for column names if not provided
-            time_column = file_config.get("time_column")
-            data_columns = file_config.get("data_columns", [])
-
-            # If time_column is not provided, try to infer it
-            if not time_column:
-                # Try common time column names
-                common_time_columns = ['timestamp',
-                                       'time', 'datetime', 'date', 't']
-                available_columns = validation_result.get("columns", [])
-                for col in common_time_columns:
-                    if col in available_columns:
-                        time_column = col
-                        break
-                if not time_column and available_columns:
-                    # Use the first column as fallback
-                    time_column = available_columns[0]
-                    logger.warning(
-                        f"No time column specified for file {file_id}, using first column: {time_column}")
-
-            # Ensure time_column is not None
-            if not time_column:
-                failed_files.append({
-                    "file_id": file_id,
-                    "filename": file_data.get("filename", "Unknown"),
-                    "error": f"Could not determine time column for file {file_id}. Please specify a time column."
-                })
+        # Create data type string
+        if file_config["data_type"] and '-' in file_config["data_type"]:
+            data_type = file_config["data_type"]
+        elif file_config["data_type"] and file_config.get("data_unit"):
+            data_type = file_config["data_type"] + \
+                '-' + file_config["data_unit"]
+        else:
+            data_type = file_config["data_type"] or "unknown"
+
+        # Set default values for column names if not provided
+        time_column = file_config.get("time_column")
+        data_columns = file_config.get("data_columns", [])
+
+        # Columns shared by all files (or the file's own columns for a single file)
+        available_columns = validation_result.get("columns") or get_file_columns(file_data)
+        schema = file_data.get("schema") or {}
+
+        # If time_column is not provided, try to infer it
+        if not time_column:
+            # Use the time column candidate sniffed at upload (common time column names)
+            time_column = schema.get("time_column") or csv_schema.infer_time_column(available_columns)
+            if not time_column and available_columns:
+                # Use the first column as fallback
+                time_column = available_columns[0]
                 logger.warning(
-                    f"Could not determine time column for file {file_id}, skipping")
-                continue
+                    f"No time column specified for file {file_id}, using first column: {time_column}")
 
-            # If data_columns is not provided, try to infer them based on data type
-            if not data_columns:
-                available_columns = validation_result.get("columns", [])
-                if data_type.startswith("accelerometer"):
-                    # For accelerometer data, look for X, Y, Z columns
-                    accel_columns = []
-                    for axis in ['x', 'y', 'z']:
-                        for col in available_columns:
-                            if axis in col.lower() and col != time_column:
-                                accel_columns.append(col)
-                                break
-                    if len(accel_columns) == 3:
-                        data_columns = accel_columns
-                    # Assuming first 3 non-time columns are X, Y, Z
-                    elif len(available_columns) >= 4:
-                        data_columns = [
-                            col for col in available_columns if col != time_column][:3]
-                elif data_type.startswith("enmo"):
-                    # For ENMO data, look for ENMO column
+        # Ensure time_column is not None
+        if not time_column:
+            failed_files.append({
+                "file_id": file_id,
+                "filename": file_data.get("filename", "Unknown"),
+                "error": f"Could not determine time column for file {file_id}. Please specify a time column."
+            })
+            logger.warning(
+                f"Could not determine time column for file {file_id}, skipping")
+            continue
+
+        # If data_columns is not provided, try to infer them based on data type
+        if not data_columns:
+            if data_type.startswith("accelerometer"):
+                # For accelerometer data, look for X, Y, Z columns
+                accel_columns = []
+                for axis in ['x', 'y', 'z']:
                     for col in available_columns:
-                        if 'enmo' in col.lower() and col != time_column:
-                            data_columns = [col]
+                        if axis in col.lower() and col != time_column:
+                            accel_columns.append(col)
                             break
-                    if not data_columns and len(available_columns) >= 2:
-                        data_columns = [
-                            col for col in available_columns if col != time_column][:1]
-                else:
-                    # For other data types, use all non-time columns
+                if len(accel_columns) == 3:
+                    data_columns = accel_columns
+                # Assuming first 3 non-time columns are X, Y, Z
+                elif len(available_columns) >= 4:
                     data_columns = [
-                        col for col in available_columns if col != time_column]
-
-                if not data_columns:
-                    logger.warning(
-                        f"No data columns found for file {file_id}, using all columns except time column")
+                        col for col in available_columns if col != time_column][:3]
+            elif data_type.startswith("enmo"):
+                # For ENMO data, look for ENMO column
+                for col in available_columns:
+                    if 'enmo' in col.lower() and col != time_column:
+                        data_columns = [col]
+                        break
+                if not data_columns and len(available_columns) >= 2:
                     data_columns = [
-                        col for col in available_columns if col != time_column]
+                        col for col in available_columns if col != time_column][:1]
+            else:
+                # For other data types, use all non-time columns
+                data_columns = [
+                    col for col in available_columns if col != time_column]
 
-            # Set default timestamp format if not provided
-            timestamp_format = file_config.get("timestamp_format", "datetime")
+            if not data_columns:
+                logger.warning(
+                    f"No data columns found for file {file_id}, using all columns except time column")
+                data_columns = [
+                    col for col in available_columns if col != time_column]
 
-            logger.info(
-                f"Using inferred columns for file {file_id}: time_column={time_column}, data_columns={data_columns}, timestamp_format={timestamp_format}")
+        # Set default timestamp format if not provided
+        timestamp_format = file_config.get("timestamp_format", "datetime")
 
-            try:
-                # Get timezone from stored file data first, then from file config, default to UTC
-                stored_time_zone = file_data.get("time_zone")
-                config_time_zone = file_config.get("time_zone")
-                time_zone = stored_time_zone or config_time_zone or "UTC"
-                logger.info(f"Using timezone for file {file_id}: {time_zone}")
-                logger.info(f"Stored timezone: {stored_time_zone}")
-                logger.info(f"Config timezone: {config_time_zone}")
-                logger.info(f"File data keys: {list(file_data.keys())}")
-                logger.info(f"File config keys: {list(file_config.keys())}")
-                logger.info(f"File data time_zone field: {file_data.get('time_zone', 'NOT_SET')}")
-                logger.info(f"File config time_zone field: {file_config.get('time_zone', 'NOT_SET')}")
-                
-                # Handle timezone-aware data issue by using None for timezone if data might be timezone-aware
-                # This prevents the cosinorage library from trying to localize already timezone-aware data
-                if timestamp_format in ['datetime', 'iso']:
-                    logger.info(f"Using timezone=None for {timestamp_format} format to avoid timezone-aware data conflicts")
-                    time_zone = None
-                
-                # Log all parameters being passed to GenericDataHandler
-                logger.info(f"=== GENERIC DATA HANDLER PARAMETERS FOR FILE {file_id} ===")
-                logger.info(f"File path: {file_data['file_path']}")
-                logger.info(f"Data format: csv")
-                logger.info(f"Data type: {data_type}")
-                logger.info(f"Time format: {timestamp_format}")
-                logger.info(f"Time column: {time_column}")
-                logger.info(f"Time zone: {time_zone} (type: {type(time_zone)})")
-                logger.info(f"Data columns: {data_columns}")
-                logger.info(f"Preprocess args: {request.preprocess_args}")
-                logger.info(f"Verbose: True")
-                
-                # Create GenericDataHandler for each file
-                handler = GenericDataHandler(
-                    file_path=file_data["file_path"],
-                    data_format="csv",
-                    data_type=data_type,
-                    time_format=timestamp_format,
-                    time_column=time_column,
-                    time_zone=time_zone,
-                    data_columns=data_columns,
-                    preprocess_args=request.preprocess_args,
-                    verbose=True
-                )
-                handlers.append(handler)
-                logger.info(
-                    f"Successfully created handler for file {file_id}: {file_data.get('filename', 'Unknown')}")
-            except Exception as e:
-                error_msg = str(e)
-                logger.warning(
-                    f"Error creating GenericDataHandler for file {file_id}: {error_msg}")
-                failed_files.append({
-                    "file_id": file_id,
-                    "filename": file_data.get("filename", "Unknown"),
-                    "error": error_msg
-                })
-                continue
+        logger.info(
+            f"Using inferred columns for file {file_id}: time_column={time_column}, data_columns={data_columns}, timestamp_format={timestamp_format}")
+
+        try:
+            # Get timezone from stored file data first, then from file config, default to UTC
+            stored_time_zone = file_data.get("time_zone")
+            config_time_zone = file_config.get("time_zone")
+            time_zone = stored_time_zone or config_time_zone or "UTC"
+            logger.info(f"Using timezone for file {file_id}: {time_zone}")
+            logger.info(f"Stored timezone: {stored_time_zone}")
+            logger.info(f"Config timezone: {config_time_zone}")
+            logger.info(f"File data keys: {list(file_data.keys())}")
+            logger.info(f"File config keys: {list(file_config.keys())}")
+            logger.info(f"File data time_zone field: {file_data.get('time_zone', 'NOT_SET')}")
+            logger.info(f"File config time_zone field: {file_config.get('time_zone', 'NOT_SET')}")
+
+            # Handle timezone-aware data issue by using None for timezone if data might be timezone-aware
+            # This prevents the cosinorage library from trying to localize already timezone-aware data
+            if timestamp_format in ['datetime', 'iso']:
+                logger.info(f"Using timezone=None for {timestamp_format} format to avoid timezone-aware data conflicts")
+                time_zone = None
+
+            # Log all parameters being passed to GenericDataHandler
+            logger.info(f"=== GENERIC DATA HANDLER PARAMETERS FOR FILE {file_id} ===")
+            logger.info(f"File path: {file_data['file_path']}")
+            logger.info(f"Data format: csv")
+            logger.info(f"Data type: {data_type}")
+            logger.info(f"Time format: {timestamp_format}")
+            logger.info(f"Time column: {time_column}")
+            logger.info(f"Time zone: {time_zone} (type: {type(time_zone)})")
+            logger.info(f"Data columns: {data_columns}")
+            logger.info(f"Preprocess args: {request.preprocess_args}")
+            logger.info(f"Verbose: True")
+
+            # Describe the GenericDataHandler for each file; handlers are created in the worker pool
+            # Age and gender inputs are given in the same order as the files
+            age_input = None
+            if request.enable_cosinorage and file_index < len(request.cosinor_age_inputs):
+                age_input = request.cosinor_age_inputs[file_index]
+            elif request.enable_cosinorage:
+                logger.warning(f"No cosinorage input available for file {file_id}")
+
+            handler_specs.append({
+                "file_id": file_id,
+                "filename": file_data.get("filename", "Unknown"),
+                "age_input": age_input,
+                "content_hash": file_data.get("content_hash"),
+                "handler": "generic",
+                "kwargs": {
+                    "file_path": file_data["file_path"],
+                    "data_format": "csv",
+                    "data_type": data_type,
+                    "time_format": timestamp_format,
+                    "time_column": time_column,
+                    "time_zone": time_zone,
+                    "data_columns": data_columns,
+                    "verbose": True
+                }
+            })
+        except Exception as e:
+            error_msg = str(e)
+            logger.warning(
+                f"Error preparing GenericDataHandler for file {file_id}: {error_msg}")
+            failed_files.append({
+                "file_id": file_id,
+                "filename": file_data.get("filename", "Unknown"),
+                "error": error_msg
+            })
+            continue
+
+    return handler_specs, failed_files
+
+
+async def run_bulk_process(handler_specs: List[dict], preprocess_args: dict, features_args: dict,
+                           enable_cosinorage: bool = False, failed_files: List[dict] = None,
+                           total_files: int = None, output_format: str = RECORDS_FORMAT,
+                           points: Optional[int] = None, resolution: Optional[str] = None,
+                           include_tables: bool = False, progress_key: str = None) -> Dict[str, Any]:
+    """
+    Process the subjects of a bulk request in the worker pool and combine their results
+
+    Every subject is a separate task of the execution engine, so bulk requests
+    share the PROCESS_POOL_WORKERS processes with all other work. Progress is
+    recorded under progress_key after each finished subject.
+    """
+    args_list = [
+        (spec, preprocess_args, features_args,
+         spec.get("age_input") if enable_cosinorage else None, output_format,
+         points, resolution)
+        for spec in handler_specs
+    ]
+    subject_results = await engine.map(
+        processing.process_subject, args_list,
+        progress_key=progress_key, stage="processing subjects")
+
+    result = await engine.run(
+        processing.summarize_bulk_results,
+        handler_specs,
+        subject_results,
+        enable_cosinorage=enable_cosinorage,
+        failed_files=failed_files,
+        total_files=total_files,
+        output_format=output_format,
+        include_tables=include_tables
+    )
+    engine.set_progress(progress_key, len(handler_specs), len(handler_specs), "completed")
+    return result
+
+
+@app.post("/bulk_process")
+async def bulk_process_data(request: BulkProcessRequest,
+                            response_format: str = Query(RECORDS_FORMAT, alias="format"),
+                            points: Optional[int] = None,
+                            resolution: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Process multiple files using BulkWearableFeatures and return distribution statistics
+
+    With format=columnar, individual_results and their ENMO timeseries are returned
+    as one array per field. points and resolution select the downsampling of the
+    ENMO timeseries (see /process).
+    """
+    validate_response_format(response_format)
+    validate_downsampling(points, resolution)
+    try:
+        logger.info(f"=== BULK DATA PROCESSING REQUEST ===")
+        handler_specs, failed_files = await prepare_bulk_process(request)
 
         # Check if we have any valid handlers to process
-        if not handlers:
+        if not handler_specs:
             logger.warning(
                 "No valid handlers created, all files failed processing")
             return {
@@ -1706,294 +2244,134 @@ async def bulk_process_data(request: BulkProcessRequest) -> Dict[str, Any]:
                 "correlation_matrix": {}
             }
 
-        logger.info(
-            f"Successfully created {len(handlers)} handlers out of {len(request.files)} files. {len(failed_files)} files failed.")
-
         # Accept any valid numeric value for all preprocess_args
-        default_preprocess = {
-            'required_daily_coverage': 0.5,
-            'autocalib_sd_criter': 0.00013,
-            'autocalib_sphere_crit': 0.02,
-            'filter_type': 'lowpass',
-            'filter_cutoff': 2,
-            'wear_sd_crit': 0.00013,
-            'wear_range_crit': 0.00067,
-            'wear_window_length': 45,
-            'wear_window_skip': 7,
-        }
-        for k, v in request.preprocess_args.items():
-            if isinstance(v, (int, float)):
-                continue
-            try:
-                request.preprocess_args[k] = float(v)
-            except (ValueError, TypeError):
-                logger.warning(
-                    f"Invalid value for {k}: {v}, setting to default {default_preprocess.get(k)}")
-                request.preprocess_args[k] = default_preprocess.get(k)
+        processing.normalize_preprocess_args(request.preprocess_args)
 
         logger.info(f"Using preprocessing args: {request.preprocess_args}")
         logger.info(f"Using features args: {request.features_args}")
 
-        # Update handlers with validated parameters
-        for handler in handlers:
-            handler.preprocess_args = request.preprocess_args
-
-        # Prepare cosinorage inputs for successful handlers only
-        cosinor_age_inputs = []
-        if request.enable_cosinorage and request.cosinor_age_inputs:
-            # Only include age inputs for successfully processed handlers
-            # The order should match the successful handlers
-            for i, handler in enumerate(handlers):
-                if i < len(request.cosinor_age_inputs):
-                    cosinor_age_inputs.append(request.cosinor_age_inputs[i])
-                else:
-                    logger.warning(f"No cosinorage input available for handler {i}")
-            
-            logger.info(f"Prepared {len(cosinor_age_inputs)} cosinorage inputs for {len(handlers)} handlers")
-
-        # Log BulkWearableFeatures parameters
-        logger.info("=== BULK WEARABLE FEATURES PARAMETERS ===")
-        logger.info(f"Number of handlers: {len(handlers)}")
-        logger.info(f"Features args: {request.features_args}")
-        logger.info(f"Cosinorage enabled: {request.enable_cosinorage}")
-        if request.enable_cosinorage:
-            logger.info(f"Cosinorage age inputs: {cosinor_age_inputs}")
-        
-        if request.enable_cosinorage:
-            bulk_features = BulkWearableFeatures(
-                handlers=handlers,
-                features_args=request.features_args,
-                cosinor_age_inputs=cosinor_age_inputs
-            )
-        else:
-            bulk_features = BulkWearableFeatures(
-                handlers=handlers,
-                features_args=request.features_args
-            )
+        # Handler creation, feature extraction and CosinorAge run in the worker pool
+        result = await run_bulk_process(
+            handler_specs,
+            request.preprocess_args,
+            request.features_args,
+            enable_cosinorage=request.enable_cosinorage,
+            failed_files=failed_files,
+            total_files=len(request.files),
+            output_format=response_format,
+            points=points,
+            resolution=resolution
+        )
+        return ORJSONResponse(result)
 
-        # Get distribution statistics
-        distribution_stats = bulk_features.get_distribution_stats()
+    except Exception as e:
+        logger.error(f"Error processing bulk data: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500, detail=f"Error processing bulk data: {str(e)}")
 
-        # Get individual features
-        individual_features = bulk_features.get_individual_features()
-        
-        # Log individual features, especially M10 values
-        logger.info("=== INDIVIDUAL FEATURES ANALYSIS ===")
-        logger.info(f"Number of individual features: {len(individual_features) if individual_features else 0}")
-        for i, features in enumerate(individual_features):
-            logger.info(f"=== FEATURES FOR HANDLER {i} ===")
-            if features and 'nonparam' in features:
-                nonparam = features['nonparam']
-                logger.info(f"Handler {i} - Non-parametric features: {nonparam}")
-                if 'M10' in nonparam:
-                    m10_value = nonparam['M10']
-                    logger.info(f"Handler {i} - M10 value: {m10_value} (type: {type(m10_value)})")
-                    if isinstance(m10_value, list):
-                        logger.info(f"Handler {i} - M10 list length: {len(m10_value)}")
-                        logger.info(f"Handler {i} - M10 list values: {m10_value}")
-                    elif isinstance(m10_value, (int, float)):
-                        logger.info(f"Handler {i} - M10 scalar value: {m10_value}")
-                else:
-                    logger.info(f"Handler {i} - M10 not found in non-parametric features")
-            else:
-                logger.info(f"Handler {i} - No non-parametric features found")
 
-        # Get failed handlers
-        failed_handlers = bulk_features.get_failed_handlers()
+@app.post("/jobs/bulk_process")
+async def submit_bulk_process_job(request: BulkProcessRequest,
+                                  response_format: str = Query(RECORDS_FORMAT, alias="format"),
+                                  points: Optional[int] = None,
+                                  resolution: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Queue bulk processing as a background job and return its job ID immediately
 
-        # Get summary dataframe
-        summary_df = bulk_features.get_summary_dataframe()
+    format, points and resolution select the output of the job result (see /bulk_process).
+    """
+    validate_response_format(response_format)
+    validate_downsampling(points, resolution)
+    try:
+        logger.info(f"=== BULK PROCESSING JOB REQUEST ===")
+        handler_specs, failed_files = await prepare_bulk_process(request)
 
-        # Get correlation matrix
-        correlation_matrix = bulk_features.get_feature_correlation_matrix()
+        # Accept any valid numeric value for all preprocess_args
+        processing.normalize_preprocess_args(request.preprocess_args)
+
+        job_id = job_manager.submit(
+            "bulk_process",
+            run_bulk_process,
+            handler_specs,
+            request.preprocess_args,
+            request.features_args,
+            enable_cosinorage=request.enable_cosinorage,
+            failed_files=failed_files,
+            total_files=len(request.files),
+            output_format=response_format,
+            points=points,
+            resolution=resolution,
+            include_tables=True
+        )
+
+        return job_manager.get_status(job_id)
 
-        # log the correlation matrix
-        logger.info("=== CORRELATION MATRIX ===")
-        logger.info(correlation_matrix)
-        logger.info("=== END CORRELATION MATRIX ===")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error submitting bulk processing job: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Note: cosinorage predictions, summary statistics, and correlations are all handled
-        # by the BulkWearableFeatures class when cosinorage is enabled
-        if request.enable_cosinorage:
-            logger.info("Cosinorage is enabled - all cosinorage processing is handled by BulkWearableFeatures class")
 
-        # Extract ENMO data from each handler before processing
-        # This is similar to how single individual processing works
-        handler_enmo_data = []
-        for i, handler in enumerate(handlers):
-            try:
-                # Create a WearableFeatures instance for this handler to get the processed data
-                wf = WearableFeatures(
-                    handler, features_args=request.features_args)
-                df = wf.get_ml_data()
-                df = df.reset_index()
-                if 'timestamp' not in df.columns and 'index' in df.columns:
-                    df = df.rename(columns={'index': 'timestamp'})
-                df = df.rename(
-                    columns={'timestamp': 'TIMESTAMP', 'enmo': 'ENMO'})
-
-                # Resample to hourly data for better performance
-                df['TIMESTAMP'] = pd.to_datetime(df['TIMESTAMP'])
-                df.set_index('TIMESTAMP', inplace=True)
-
-                # Resample to hourly and take the mean
-                hourly_df = df.resample('1H').mean()
-
-                # Create data structure with timestamp and ENMO values
-                enmo_data = []
-                for timestamp, row in hourly_df.iterrows():
-                    if pd.notna(row['ENMO']):
-                        enmo_data.append({
-                            'timestamp': timestamp.isoformat(),
-                            'enmo': float(row['ENMO'])
-                        })
-
-                handler_enmo_data.append(enmo_data)
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str) -> Dict[str, Any]:
+    """
+    Get status and progress of a background job
+    """
+    status = job_manager.get_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return status
 
-                logger.info(
-                    f"Handler {i}: extracted {len(enmo_data)} hourly ENMO values (from {len(df)} original points)")
-            except Exception as e:
-                logger.warning(
-                    f"Error extracting ENMO data from handler {i}: {e}")
-                handler_enmo_data.append([])
 
-        logger.info(
-            f"Extracted ENMO data from {len(handler_enmo_data)} handlers")
-
-        # Clean the data to handle NaN and infinity values for JSON serialization
-        def clean_for_json(obj):
-            if isinstance(obj, dict):
-                return {k: clean_for_json(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [clean_for_json(v) for v in obj]
-            elif isinstance(obj, float):
-                if pd.isna(obj) or np.isinf(obj):
-                    return None
-                return obj
-            elif isinstance(obj, (int, str, bool)) or obj is None:
-                return obj
-            else:
-                return str(obj)
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str) -> Dict[str, Any]:
+    """
+    Get the result of a finished background job
+    """
+    job = job_manager.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == JOB_FAILED:
+        raise HTTPException(
+            status_code=500, detail=f"Job failed: {job['error']}")
+    if job["status"] != JOB_COMPLETED:
+        raise HTTPException(
+            status_code=409, detail=f"Job is not finished yet (status: {job['status']})")
+    # The DataFrames kept for binary table output are served by /jobs/{job_id}/result/{table}
+    return ORJSONResponse(await job_manager.get_result(job_id))
 
-        def safe_isinf(value):
-            """Safely check if a value is infinite, handling non-numeric types"""
-            try:
-                if isinstance(value, (int, float, np.number)):
-                    return np.isinf(value)
-                return False
-            except:
-                return False
-
-        # Clean the distribution stats
-        cleaned_distribution_stats = clean_for_json(distribution_stats)
-
-        # Clean the individual results
-        cleaned_individual_results = []
-        for i, features in enumerate(individual_features):
-            if features is not None:
-                # Use the pre-extracted ENMO data
-                enmo_data = handler_enmo_data[i] if i < len(
-                    handler_enmo_data) else None
-
-                # Add cosinorage prediction and advance if enabled and available
-                cosinorage_prediction = None
-                cosinorage_advance_calculated = None
-                if request.enable_cosinorage and i < len(cosinor_age_inputs):
-                    try:
-                        # Create individual CosinorAge object for this handler
-                        age_input = cosinor_age_inputs[i]
-                        record = [{
-                            'handler': handlers[i],
-                            'age': age_input['age'],
-                            'gender': age_input['gender']
-                        }]
-                        
-                        cosinor_age = CosinorAge(record)
-                        predictions = cosinor_age.get_predictions()
-                        
-                        if predictions and len(predictions) > 0:
-                            prediction = predictions[0]
-                            if 'cosinorage' in prediction:
-                                cosinorage_prediction = prediction['cosinorage']
-                                chronological_age = age_input['age']
-                                cosinorage_advance_calculated = cosinorage_prediction - chronological_age
-                                
-                                logger.info(f"Got cosinorage prediction for handler {i}: {cosinorage_prediction}")
-                                logger.info(f"Calculated cosinorage advance for handler {i}: {cosinorage_advance_calculated}")
-                            else:
-                                logger.warning(f"Prediction result missing cosinorage for handler {i}")
-                        else:
-                            logger.warning(f"No predictions returned for handler {i}")
-                    except Exception as e:
-                        logger.warning(f"Error getting cosinorage prediction for handler {i}: {e}")
-
-                # Add cosinorage and advance to features if available
-                if cosinorage_prediction is not None:
-                    if features is None:
-                        features = {}
-                    if 'cosinorage' not in features:
-                        features['cosinorage'] = {}
-                    features['cosinorage']['cosinorage'] = cosinorage_prediction
-                    
-                    # Add cosinorage advance
-                    if cosinorage_advance_calculated is not None:
-                        features['cosinorage']['cosinorage_advance'] = cosinorage_advance_calculated
-                    
-                    logger.info(f"Added cosinorage and advance to features for handler {i}: cosinorage={cosinorage_prediction}, advance={cosinorage_advance_calculated}")
-
-                result_item = {
-                    "file_id": request.files[i]["file_id"],
-                    "filename": uploaded_data[request.files[i]["file_id"]]["filename"],
-                    "features": clean_for_json(features),
-                    "enmo_timeseries": enmo_data
-                }
-                
-                # Add cosinorage prediction if available
-                if cosinorage_prediction:
-                    result_item["cosinorage"] = cosinorage_prediction
-                
-                cleaned_individual_results.append(result_item)
-
-        # Clean the summary dataframe
-        cleaned_summary_df = []
-        if not summary_df.empty:
-            for _, row in summary_df.iterrows():
-                cleaned_row = {}
-                for col, value in row.items():
-                    if pd.isna(value) or safe_isinf(value):
-                        cleaned_row[col] = None
-                    else:
-                        cleaned_row[col] = value
-                cleaned_summary_df.append(cleaned_row)
-
-        # Clean the correlation matrix
-        cleaned_correlation_matrix = {}
-        if not correlation_matrix.empty:
-            for col in correlation_matrix.columns:
-                cleaned_correlation_matrix[col] = {}
-                for idx in correlation_matrix.index:
-                    value = correlation_matrix.loc[idx, col]
-                    if pd.isna(value) or safe_isinf(value):
-                        cleaned_correlation_matrix[col][idx] = None
-                    else:
-                        cleaned_correlation_matrix[col][idx] = value
 
-        return {
-            "message": f"Successfully processed {len(handlers)} files out of {len(request.files)} total files",
-            "successful_files": len(handlers),
-            "total_files": len(request.files),
-            "failed_files": failed_files,
-            "distribution_stats": cleaned_distribution_stats,
-            "individual_results": cleaned_individual_results,
-            "failed_handlers": failed_handlers,
-            "summary_dataframe": cleaned_summary_df,
-            "correlation_matrix": cleaned_correlation_matrix
-        }
+@app.get("/jobs/{job_id}/result/{table}")
+async def get_job_result_table(job_id: str, table: str, request: Request,
+                               response_format: str = Query(RECORDS_FORMAT, alias="format")):
+    """
+    Get a table (summary_dataframe or correlation_matrix) of a finished bulk processing job
 
-    except Exception as e:
-        logger.error(f"Error processing bulk data: {str(e)}", exc_info=True)
+    The table is returned as JSON, as Arrow IPC stream ("Accept:
+    application/vnd.apache.arrow.stream") or as Parquet file (format=parquet).
+    """
+    validate_response_format(response_format, TABLE_FORMATS)
+    job = job_manager.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != JOB_COMPLETED:
         raise HTTPException(
-            status_code=500, detail=f"Error processing bulk data: {str(e)}")
+            status_code=409, detail=f"Job is not finished yet (status: {job['status']})")
+    tables = job_manager.get_result_tables(job_id)
+    if table not in tables:
+        raise HTTPException(
+            status_code=404, detail=f"Table '{table}' not found. Available tables: {', '.join(tables)}")
+
+    df = await job_manager.get_result_table(job_id, table)
+    binary_response = await binary_table_response(
+        df, request, response_format, f"{table}_{job_id}")
+    if binary_response is not None:
+        return binary_response
+    if response_format == COLUMNAR_FORMAT:
+        return ORJSONResponse(dataframe_to_format(
+            df.reset_index() if df.index.name else df, response_format))
+    return ORJSONResponse((await job_manager.get_result(job_id))[table])
 
 
 class CleanupConfig(BaseModel):
@@ -2009,8 +2387,13 @@ async def get_cleanup_config():
     return {
         "cleanup_interval_minutes": CLEANUP_INTERVAL_MINUTES,
         "file_age_limit_minutes": FILE_AGE_LIMIT_MINUTES,
-        "files_tracked": len(file_upload_times),
-        "temp_dirs_tracked": len(temp_dirs),
+        "files_tracked": len(uploaded_data),
+        "execution_engine": engine.get_stats(),
+        "jobs": job_manager.get_stats(),
+        "blob_store": blob_store.stats(),
+        "preprocess_cache": preprocess_cache.stats(),
+        "result_cache": process_results.stats(),
+        "result_store": uploaded_data.stats(),
         "next_cleanup_in_minutes": CLEANUP_INTERVAL_MINUTES if not CLEANUP_TASK_RUNNING else 0
     }
 
@@ -2053,48 +2436,22 @@ async def trigger_cleanup():
         cutoff_time = datetime.now() - timedelta(minutes=FILE_AGE_LIMIT_MINUTES)
         
         # Clean up old files from uploaded_data
-        files_to_remove = []
-        for file_id, upload_time in file_upload_times.items():
-            if upload_time < cutoff_time:
-                files_to_remove.append(file_id)
+        files_to_remove = uploaded_data.uploaded_before(cutoff_time.timestamp())
         
         for file_id in files_to_remove:
             try:
-                if file_id in uploaded_data:
-                    file_data = uploaded_data[file_id]
-                    
-                    # Clean up temporary directory
-                    if "temp_dir" in file_data and os.path.exists(file_data["temp_dir"]):
-                        shutil.rmtree(file_data["temp_dir"])
-                    
-                    # Clean up permanent directory
-                    if "permanent_dir" in file_data and os.path.exists(file_data["permanent_dir"]):
-                        shutil.rmtree(file_data["permanent_dir"])
-                    
-                    # Remove from memory
-                    del uploaded_data[file_id]
-                    if file_id in temp_dirs:
-                        del temp_dirs[file_id]
-                    del file_upload_times[file_id]
-                    
+                # Blobs are deleted once no file uses them anymore
+                remove_file_state(file_id)
             except Exception as e:
                 logger.warning(f"Failed to clean up file {file_id}: {str(e)}")
         
-        # Clean up old temporary directories
-        for temp_dir in list(temp_dirs.values()):
-            try:
-                if os.path.exists(temp_dir):
-                    dir_time = datetime.fromtimestamp(os.path.getctime(temp_dir))
-                    if dir_time < cutoff_time:
-                        shutil.rmtree(temp_dir)
-            except Exception as e:
-                logger.warning(f"Failed to clean up temp directory {temp_dir}: {str(e)}")
-        
         # Clean up old files in extracted_files directory
         if os.path.exists(EXTRACTED_FILES_DIR):
             try:
                 for item in os.listdir(EXTRACTED_FILES_DIR):
                     item_path = os.path.join(EXTRACTED_FILES_DIR, item)
+                    if item_path == ARTIFACT_DIR:
+                        continue
                     if os.path.exists(item_path):
                         item_time = datetime.fromtimestamp(os.path.getctime(item_path))
                         if item_time < cutoff_time:
@@ -2105,9 +2462,17 @@ async def trigger_cleanup():
             except Exception as e:
                 logger.warning(f"Failed to clean up extracted files directory: {str(e)}")
         
+        # Fail jobs of stopped workers, forget finished jobs and abandoned chunked uploads
+        job_manager.fail_interrupted_jobs()
+        jobs_removed = job_manager.cleanup(cutoff_time)
+        uploads_removed = upload_sessions.cleanup(cutoff_time)
+
         return {
             "message": f"Manual cleanup completed. Removed {len(files_to_remove)} old files.",
-            "files_removed": len(files_to_remove)
+            "files_removed": len(files_to_remove),
+            "jobs_removed": jobs_removed,
+            "uploads_removed": uploads_removed,
+            "blob_store": blob_store.stats()
         }
         
     except Exception as e:
@@ -0,0 +1,229 @@
+"""
+Disk cache of preprocessed minute-level data.
+
+Creating a data handler (reading, calibration, filtering, wear detection and
+ENMO) is the expensive part of processing a file, and its result only depends
+on the file content, the data source configuration and the preprocess_args.
+The minute-level data and metadata of a handler are therefore stored as a
+Parquet file keyed by these three. Requests that only change the
+features_args are answered from the cache without preprocessing the file
+again.
+
+The cache lives on disk so that it is shared by all worker processes. The
+least recently used entries are evicted once the cache exceeds
+PREPROCESS_CACHE_MAX_BYTES. Without pyarrow nothing is cached.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import uuid
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+try:
+    from serialization import dumps_tagged, loads_tagged
+except ImportError:
+    from backend.serialization import dumps_tagged, loads_tagged
+
+logger = logging.getLogger(__name__)
+
+# Directory of the cache (set via the PREPROCESS_CACHE_DIR environment variable)
+PREPROCESS_CACHE_DIR = os.environ.get(
+    "PREPROCESS_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "preprocess_cache"))
+
+# Size above which the least recently used entries are evicted (set via the PREPROCESS_CACHE_MAX_BYTES environment variable)
+PREPROCESS_CACHE_MAX_BYTES = int(os.environ.get(
+    "PREPROCESS_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+
+# Handler arguments that do not affect the preprocessed data (file paths are
+# replaced by the content hash of the file)
+IGNORED_HANDLER_KWARGS = ("file_path", "galaxy_file_path", "verbose")
+
+# Parquet schema metadata key holding the handler metadata
+META_DATA_KEY = b"cosinorage_meta_data"
+
+CACHE_SUFFIX = ".parquet"
+
+
+class CachedDataHandler:
+    """
+    Data handler restored from the cache (or slimmed down after processing)
+
+    Provides the minute-level data and metadata of the original handler, which
+    is all WearableFeatures and CosinorAge use.
+    """
+
+    def __init__(self, ml_data: pd.DataFrame, meta_data: Dict[str, Any]):
+        self.ml_data = ml_data
+        self.meta_dict = meta_data
+
+    def get_ml_data(self) -> pd.DataFrame:
+        return self.ml_data
+
+    def get_meta_data(self) -> Dict[str, Any]:
+        return self.meta_dict
+
+
+def cache_available() -> bool:
+    """
+    Return True if preprocessed data can be cached (pyarrow is installed)
+    """
+    return pa is not None
+
+
+def _normalize_value(value):
+    # 2, 2.0 and "2" are the same preprocessing argument
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def preprocess_cache_key(handler_spec: dict, preprocess_args: dict) -> Optional[str]:
+    """
+    Return the cache key of a handler, or None if the handler cannot be cached
+
+    The key is derived from the 'content_hash' of the handler_spec, the
+    handler type and arguments (without file paths) and the normalized
+    preprocess_args. Handler specs without content hash are not cached.
+    """
+    content_hash = handler_spec.get("content_hash")
+    if not content_hash:
+        return None
+
+    kwargs = {key: value for key, value in handler_spec["kwargs"].items()
+              if key not in IGNORED_HANDLER_KWARGS}
+    key_data = {
+        "content_hash": content_hash,
+        "handler": handler_spec["handler"],
+        "kwargs": kwargs,
+        "preprocess_args": {key: _normalize_value(value)
+                            for key, value in (preprocess_args or {}).items()}
+    }
+    encoded = json.dumps(key_data, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _cache_path(key: str, cache_dir: str) -> str:
+    return os.path.join(cache_dir, key + CACHE_SUFFIX)
+
+
+def load_handler(key: str, cache_dir: str = PREPROCESS_CACHE_DIR) -> Optional[CachedDataHandler]:
+    """
+    Return the cached handler for key, or None on a cache miss
+
+    A hit marks the entry as recently used.
+    """
+    if pa is None:
+        return None
+    path = _cache_path(key, cache_dir)
+    try:
+        table = pq.read_table(path)
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Could not read preprocess cache entry {path}: {str(e)}")
+        return None
+
+    meta_data = loads_tagged(table.schema.metadata[META_DATA_KEY])
+    return CachedDataHandler(table.to_pandas(), meta_data)
+
+
+def store_handler(key: str, handler, cache_dir: str = PREPROCESS_CACHE_DIR,
+                  max_bytes: int = PREPROCESS_CACHE_MAX_BYTES):
+    """
+    Write the minute-level data and metadata of a handler to the cache
+
+    The entry is written to a temporary file and moved into place, so readers
+    never see a partial entry. Evicts the least recently used entries afterwards.
+    """
+    if pa is None:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+
+    table = pa.Table.from_pandas(handler.get_ml_data())
+    meta_data = dumps_tagged(handler.get_meta_data())
+    table = table.replace_schema_metadata(
+        {**(table.schema.metadata or {}), META_DATA_KEY: meta_data.encode("utf-8")})
+
+    path = _cache_path(key, cache_dir)
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    pq.write_table(table, temp_path)
+    os.replace(temp_path, path)
+
+    evict(cache_dir, max_bytes)
+
+
+def _entries(cache_dir: str):
+    entries = []
+    if not os.path.isdir(cache_dir):
+        return entries
+    for name in os.listdir(cache_dir):
+        if not name.endswith(CACHE_SUFFIX):
+            continue
+        try:
+            stat = os.stat(os.path.join(cache_dir, name))
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, name))
+    return entries
+
+
+def evict(cache_dir: str = PREPROCESS_CACHE_DIR,
+          max_bytes: int = PREPROCESS_CACHE_MAX_BYTES) -> int:
+    """
+    Remove least recently used entries until the cache fits in max_bytes
+
+    Returns the number of removed entries.
+    """
+    entries = sorted(_entries(cache_dir))
+    total_bytes = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, name in entries:
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, name))
+            removed += 1
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
+    if removed:
+        logger.info(f"Evicted {removed} preprocess cache entries")
+    return removed
+
+
+def clear(cache_dir: str = PREPROCESS_CACHE_DIR):
+    """
+    Remove all cache entries
+    """
+    for _, _, name in _entries(cache_dir):
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except FileNotFoundError:
+            pass
+
+
+def stats(cache_dir: str = PREPROCESS_CACHE_DIR) -> Dict[str, Any]:
+    """
+    Return the number and total size of the cache entries
+    """
+    entries = _entries(cache_dir)
+    return {
+        "entries": len(entries),
+        "bytes": sum(size for _, size, _ in entries),
+        "max_bytes": PREPROCESS_CACHE_MAX_BYTES,
+        "enabled": cache_available()
+    }
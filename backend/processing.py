@@ -0,0 +1,490 @@
+"""
+CPU-bound processing pipeline.
+
+The functions in this module are executed in worker processes of the execution
+engine. They only receive and return picklable objects and never touch the
+in-memory state of the API process.
+"""
+
+import logging
+import math
+from datetime import date, datetime
+from typing import List
+
+import numpy as np
+import pandas as pd
+from cosinorage.bioages.cosinorage import CosinorAge
+from cosinorage.datahandlers import GalaxyDataHandler
+from cosinorage.datahandlers.genericdatahandler import GenericDataHandler
+from cosinorage.features.features import WearableFeatures
+try:
+    from bioage import predict_cosinorage_from_params
+    from bulk_features import ParallelBulkWearableFeatures
+    from galaxy_binary import use_fast_binary_reader
+    from columnar import use_columnar_readers
+    from timeseries import to_time_indexed
+    from pyramid import build_enmo_pyramid, downsample_enmo_pyramid
+    import preprocess_cache
+    from serialization import (COLUMNAR_FORMAT, RECORDS_FORMAT, dataframe_to_dict, dataframe_to_format,
+                               dataframe_to_records, records_to_columns)
+except ImportError:
+    from backend.bioage import predict_cosinorage_from_params
+    from backend.bulk_features import ParallelBulkWearableFeatures
+    from backend.galaxy_binary import use_fast_binary_reader
+    from backend.columnar import use_columnar_readers
+    from backend.timeseries import to_time_indexed
+    from backend.pyramid import build_enmo_pyramid, downsample_enmo_pyramid
+    from backend import preprocess_cache
+    from backend.serialization import (COLUMNAR_FORMAT, RECORDS_FORMAT, dataframe_to_dict, dataframe_to_format,
+                                       dataframe_to_records, records_to_columns)
+
+logger = logging.getLogger(__name__)
+
+# Decode Galaxy Watch binary files with the columnar reader and read uploaded
+# CSV files through their columnar copies
+use_fast_binary_reader()
+use_columnar_readers()
+
+DEFAULT_PREPROCESS_ARGS = {
+    'required_daily_coverage': 0.5,
+    'autocalib_sd_criter': 0.00013,
+    'autocalib_sphere_crit': 0.02,
+    'filter_type': 'lowpass',
+    'filter_cutoff': 2,
+    'wear_sd_crit': 0.00013,
+    'wear_range_crit': 0.00067,
+    'wear_window_length': 45,
+    'wear_window_skip': 7,
+}
+
+# Names of the downsampled ENMO columns in responses
+ENMO_TIMESERIES_COLUMNS = {
+    'value': 'enmo', 'mean': 'enmo_mean', 'min': 'enmo_min', 'max': 'enmo_max',
+    'wear': 'wear_fraction'
+}
+
+
+def normalize_preprocess_args(preprocess_args: dict) -> dict:
+    """
+    Accept any valid numeric value for all preprocess_args, falling back to defaults
+    """
+    for k, v in preprocess_args.items():
+        if isinstance(v, (int, float)):
+            continue
+        try:
+            preprocess_args[k] = float(v)
+        except (ValueError, TypeError):
+            logger.warning(
+                f"Invalid value for {k}: {v}, setting to default {DEFAULT_PREPROCESS_ARGS.get(k)}")
+            preprocess_args[k] = DEFAULT_PREPROCESS_ARGS.get(k)
+    return preprocess_args
+
+
+def clean_for_json(obj):
+    """
+    Clean the data to handle NaN and infinity values for JSON serialization
+
+    numpy scalars are converted to Python numbers and timestamps are kept, so
+    that the response encoder writes them natively (ISO 8601).
+    """
+    if isinstance(obj, dict):
+        return {k: clean_for_json(v) for k, v in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        return [clean_for_json(v) for v in obj]
+    elif isinstance(obj, np.generic):
+        return clean_for_json(obj.item())
+    elif isinstance(obj, float):
+        if not math.isfinite(obj):
+            return None
+        return obj
+    elif obj is pd.NaT:
+        return None
+    elif isinstance(obj, (int, str, bool, datetime, date)) or obj is None:
+        return obj
+    else:
+        return str(obj)
+
+
+def build_handler(handler_spec: dict, preprocess_args: dict):
+    """
+    Create the data handler described by handler_spec
+
+    handler_spec is a dictionary with a 'handler' key ('galaxy' or 'generic') and
+    a 'kwargs' key holding the constructor arguments (without preprocess_args).
+    """
+    handler_type = handler_spec["handler"]
+    kwargs = dict(handler_spec["kwargs"])
+
+    if handler_type == "galaxy":
+        return GalaxyDataHandler(preprocess_args=preprocess_args, **kwargs)
+    elif handler_type == "generic":
+        return GenericDataHandler(preprocess_args=preprocess_args, **kwargs)
+    else:
+        raise ValueError(f"Unknown handler type: {handler_type}")
+
+
+def load_handler(handler_spec: dict, preprocess_args: dict):
+    """
+    Return the handler described by handler_spec, from the preprocess cache if possible
+
+    Handlers of files with a 'content_hash' in handler_spec are restored from
+    the cache if the same file was preprocessed with the same arguments before,
+    and written to the cache otherwise. Other handlers are always created.
+    """
+    key = preprocess_cache.preprocess_cache_key(handler_spec, preprocess_args)
+    if key is not None:
+        handler = preprocess_cache.load_handler(key)
+        if handler is not None:
+            logger.info(f"Using cached preprocessed data {key[:12]}")
+            return handler
+
+    handler = build_handler(handler_spec, preprocess_args)
+    if key is not None:
+        try:
+            preprocess_cache.store_handler(key, handler)
+        except Exception as e:
+            logger.warning(f"Could not cache preprocessed data: {e}")
+    return handler
+
+
+def slim_handler(handler) -> preprocess_cache.CachedDataHandler:
+    """
+    Return a compact copy of a handler with only its minute-level data and metadata
+
+    Float columns of the minute-level data are stored as float32. CosinorAge
+    only uses get_ml_data(), so the copy replaces the handler once the features
+    are computed and the raw data is released together with the original handler.
+    """
+    ml_data = handler.get_ml_data()
+    float_columns = ml_data.select_dtypes(include=[np.floating]).columns
+    ml_data = ml_data.astype({column: np.float32 for column in float_columns})
+    return preprocess_cache.CachedDataHandler(ml_data, dict(handler.get_meta_data()))
+
+
+def downsample_enmo(frame: pd.DataFrame, pyramid: dict = None, output_format: str = RECORDS_FORMAT,
+                    points: int = None, resolution: str = None, start=None, end=None):
+    """
+    Downsample the ENMO of time-indexed minute-level data for charts
+
+    With points, LTTB selects the given number of points; otherwise ENMO is
+    averaged over buckets of the given resolution (hourly by default). The data
+    is taken from the best level of the ENMO pyramid if one is given. Returns a
+    list of {'timestamp', 'enmo', 'enmo_min', 'enmo_max', 'wear_fraction'}
+    dictionaries (plus 'enmo_mean' of each LTTB bucket), or one array per key
+    (epoch-ms timestamps) for the columnar output format.
+    """
+    _, enmo_timeseries = downsample_enmo_pyramid(
+        pyramid, frame, start=start, end=end, points=points, resolution=resolution)
+    return format_enmo_timeseries(enmo_timeseries, output_format)
+
+
+def format_enmo_timeseries(enmo_timeseries: pd.DataFrame, output_format: str = RECORDS_FORMAT):
+    """
+    Convert a downsampled ENMO frame to the JSON-ready ENMO timeseries
+    """
+    enmo_timeseries = enmo_timeseries.rename(columns=ENMO_TIMESERIES_COLUMNS)
+    return dataframe_to_format(enmo_timeseries, output_format)
+
+
+def empty_enmo_timeseries(output_format: str = RECORDS_FORMAT):
+    """
+    Return the ENMO timeseries used when it could not be extracted
+    """
+    if output_format == COLUMNAR_FORMAT:
+        return {'timestamp': [], 'enmo': []}
+    return []
+
+
+def format_processed_data(frame: pd.DataFrame, enmo_pyramid: dict = None,
+                          output_format: str = RECORDS_FORMAT, include_data: bool = True,
+                          points: int = None, resolution: str = None) -> tuple:
+    """
+    Return the JSON-ready minute-level data and downsampled ENMO timeseries of a processed file
+
+    frame is the time-indexed minute-level data. The data is None if
+    include_data is False.
+    """
+    data = dataframe_to_format(frame.reset_index(), output_format) if include_data else None
+    try:
+        enmo_timeseries = downsample_enmo(
+            frame, enmo_pyramid, output_format, points=points, resolution=resolution)
+        logger.info(
+            f"Extracted downsampled ENMO timeseries (from {len(frame)} original points)")
+    except Exception as e:
+        logger.warning(f"Error extracting ENMO timeseries data: {e}")
+        enmo_timeseries = empty_enmo_timeseries(output_format)
+    return data, enmo_timeseries
+
+
+def process_file(handler_spec: dict, preprocess_args: dict, features_args: dict,
+                 output_format: str = RECORDS_FORMAT, include_data: bool = True,
+                 points: int = None, resolution: str = None) -> dict:
+    """
+    Run preprocessing and feature extraction for a single file
+
+    Returns a slim copy of the handler (see slim_handler) together with the
+    JSON-ready data, features, metadata and downsampled ENMO timeseries (see
+    downsample_enmo). The data and timeseries
+    are given as records or as columns depending on output_format. The
+    minute-level data is also returned as a time-indexed frame ('frame') and as
+    ENMO pyramid ('enmo_pyramid') for later queries; the JSON-ready data is None
+    if include_data is False. Preprocessing is skipped if its result is cached
+    (see load_handler).
+    """
+    handler = load_handler(handler_spec, preprocess_args)
+
+    # Get metadata
+    metadata = handler.get_meta_data()
+
+    # Extract features using WearableFeatures with provided parameters
+    wf = WearableFeatures(handler, features_args=features_args)
+    features = wf.get_features()
+    df = wf.get_ml_data()
+
+    # Release the raw data; only the minute-level data is kept for CosinorAge
+    handler = slim_handler(handler)
+    del wf
+
+    df = df.reset_index()
+    df = df.rename(columns={'timestamp': 'TIMESTAMP', 'enmo': 'ENMO'})
+    logger.info(f"ML data: {df.head()}")
+
+    # Keep all columns as they are, just ensure TIMESTAMP is the index name
+    df = df.rename(columns={'index': 'TIMESTAMP'})
+    frame = to_time_indexed(df)
+
+    # Extract ENMO timeseries data (similar to bulk processing)
+    try:
+        enmo_pyramid = build_enmo_pyramid(frame)
+    except Exception as e:
+        logger.warning(f"Error building ENMO pyramid: {e}")
+        enmo_pyramid = None
+
+    # Clean the DataFrame before converting to JSON
+    cleaned_df, enmo_timeseries = format_processed_data(
+        frame, enmo_pyramid, output_format, include_data, points=points, resolution=resolution)
+
+    return {
+        'handler': handler,
+        'data': cleaned_df,
+        'frame': frame,
+        'enmo_pyramid': enmo_pyramid,
+        'features': {
+            'cosinor': clean_for_json(features['cosinor']),
+            'nonparam': clean_for_json(features['nonparam']),
+            'physical_activity': clean_for_json(features['physical_activity']),
+            'sleep': clean_for_json(features['sleep'])
+        },
+        'metadata': {
+            'raw_data_frequency': metadata.get('raw_data_frequency'),
+            'raw_start_datetime': metadata.get('raw_start_datetime'),
+            'raw_end_datetime': metadata.get('raw_end_datetime'),
+            'raw_data_type': metadata.get('raw_data_type'),
+            'raw_data_unit': metadata.get('raw_data_unit'),
+            'raw_n_datapoints': metadata.get('raw_n_datapoints')
+        },
+        'enmo_timeseries': enmo_timeseries
+    }
+
+
+def predict_cosinorage(handler, chronological_age: float, gender: str) -> list:
+    """
+    Compute the CosinorAge prediction for a single processed handler
+    """
+    record = [{
+        'handler': handler,
+        'age': chronological_age,
+        'gender': gender
+    }]
+    return CosinorAge(record).get_predictions()
+
+
+def process_subject(handler_spec: dict, preprocess_args: dict, features_args: dict,
+                    age_input: dict = None, output_format: str = RECORDS_FORMAT,
+                    points: int = None, resolution: str = None) -> dict:
+    """
+    Single-pass pipeline stage for one subject of a bulk request
+
+    Creates the handler once and derives the features, the hourly ENMO timeseries
+    and (if age_input is given) the CosinorAge prediction from the same
+    minute-level data. CosinorAge uses the cosinor parameters computed by
+    WearableFeatures instead of refitting the model.
+
+    Returns a dictionary with 'features' and 'enmo_timeseries', or with
+    'handler_error' / 'features_error' if the respective step failed.
+    """
+    try:
+        handler = load_handler(handler_spec, preprocess_args)
+    except Exception as e:
+        logger.warning(
+            f"Error creating {handler_spec.get('handler')} data handler for file {handler_spec.get('file_id')}: {str(e)}")
+        return {"handler_error": str(e)}
+
+    try:
+        wf = WearableFeatures(handler, features_args=features_args)
+        features = wf.get_features()
+    except Exception as e:
+        logger.warning(
+            f"Failed to compute features for file {handler_spec.get('file_id')}: {str(e)}")
+        return {"features_error": str(e)}
+
+    try:
+        df = wf.get_ml_data().reset_index()
+        if 'timestamp' not in df.columns and 'index' in df.columns:
+            df = df.rename(columns={'index': 'timestamp'})
+        df = df.rename(columns={'timestamp': 'TIMESTAMP', 'enmo': 'ENMO'})
+        frame = to_time_indexed(df)
+        enmo_timeseries = downsample_enmo(
+            frame, build_enmo_pyramid(frame), output_format, points=points, resolution=resolution)
+        logger.info(
+            f"File {handler_spec.get('file_id')}: extracted downsampled ENMO timeseries (from {len(df)} original points)")
+    except Exception as e:
+        logger.warning(
+            f"Error extracting ENMO data for file {handler_spec.get('file_id')}: {e}")
+        enmo_timeseries = empty_enmo_timeseries(output_format)
+
+    if age_input is not None:
+        cosinor = features.get('cosinor') or {}
+        try:
+            prediction = predict_cosinorage_from_params(
+                cosinor.get('mesor'), cosinor.get('amplitude'), cosinor.get('acrophase'),
+                age_input['age'], age_input.get('gender', 'unknown'))
+        except Exception as e:
+            logger.warning(
+                f"Error getting cosinorage prediction for file {handler_spec.get('file_id')}: {e}")
+            prediction = {"cosinorage": None, "cosinorage_advance": None}
+        features['cosinorage'] = {
+            "cosinorage": prediction["cosinorage"],
+            "cosinorage_advance": prediction["cosinorage_advance"]
+        }
+
+    return {"features": features, "enmo_timeseries": enmo_timeseries}
+
+
+def summarize_bulk_results(handler_specs: List[dict], subject_results: List[tuple],
+                           enable_cosinorage: bool = False, failed_files: List[dict] = None,
+                           total_files: int = None, output_format: str = RECORDS_FORMAT,
+                           include_tables: bool = False) -> dict:
+    """
+    Combine the results of the subjects of a bulk request into distribution statistics
+
+    subject_results holds a (result, error) tuple of process_subject per entry of
+    handler_specs, in the same order. Each entry of handler_specs holds the
+    'file_id', 'filename' and optional 'age_input' of the file. failed_files may
+    contain files that were already rejected before submission. With the columnar
+    output_format, individual_results and their ENMO timeseries are returned as
+    {key: [values]} arrays instead of lists of dictionaries. With include_tables,
+    the summary dataframe and the correlation matrix are also returned as
+    DataFrames under 'tables' (for binary table output).
+    """
+    failed_files = list(failed_files or [])
+    if total_files is None:
+        total_files = len(handler_specs)
+
+    # Keep the handler order and failure semantics of BulkWearableFeatures
+    individual_features = []
+    failed_handlers = []
+    processed_specs = []
+    handler_enmo_data = []
+    for spec, (result, error) in zip(handler_specs, subject_results):
+        if error is None and "handler_error" in result:
+            error = result["handler_error"]
+        if error is not None:
+            failed_files.append({
+                "file_id": spec["file_id"],
+                "filename": spec["filename"],
+                "error": error
+            })
+            continue
+
+        handler_index = len(processed_specs)
+        processed_specs.append(spec)
+        if "features_error" in result:
+            failed_handlers.append((handler_index, result["features_error"]))
+            individual_features.append(None)
+            handler_enmo_data.append(empty_enmo_timeseries(output_format))
+        else:
+            individual_features.append(result["features"])
+            handler_enmo_data.append(result["enmo_timeseries"])
+
+    # Check if we have any valid handlers to process
+    if not processed_specs:
+        logger.warning(
+            "No valid handlers created, all files failed processing")
+        return {
+            "message": "No files could be processed successfully",
+            "successful_files": 0,
+            "failed_files": failed_files,
+            "distribution_stats": {},
+            "individual_results": [],
+            "failed_handlers": [],
+            "summary_dataframe": [],
+            "correlation_matrix": {}
+        }
+
+    logger.info(
+        f"Successfully created {len(processed_specs)} handlers out of {total_files} files. {len(failed_files)} files failed.")
+
+    # Add the prediction error if every subject has a ground truth cosinor age
+    if enable_cosinorage:
+        age_inputs = [spec.get("age_input") for spec in processed_specs]
+        if age_inputs and all(age_input is not None and age_input.get("gt_cosinor_age") is not None
+                              for age_input in age_inputs):
+            for features, age_input in zip(individual_features, age_inputs):
+                if features is not None and "cosinorage" in features:
+                    cosinorage = features["cosinorage"]["cosinorage"]
+                    features["cosinorage"]["cosinor_age_prediction_error"] = (
+                        cosinorage - age_input["gt_cosinor_age"] if cosinorage is not None else None
+                    )
+
+    bulk_features = ParallelBulkWearableFeatures.from_individual_features(
+        individual_features, failed_handlers)
+
+    distribution_stats = bulk_features.get_distribution_stats()
+    summary_df = bulk_features.get_summary_dataframe()
+    correlation_matrix = bulk_features.get_feature_correlation_matrix()
+
+    # Clean the individual results
+    cleaned_individual_results = []
+    for i, features in enumerate(individual_features):
+        if features is not None:
+            result_item = {
+                "file_id": processed_specs[i]["file_id"],
+                "filename": processed_specs[i]["filename"],
+                "features": clean_for_json(features),
+                "enmo_timeseries": handler_enmo_data[i]
+            }
+
+            # Add cosinorage prediction if available
+            cosinorage_prediction = (features.get("cosinorage") or {}).get("cosinorage")
+            if cosinorage_prediction:
+                result_item["cosinorage"] = cosinorage_prediction
+
+            cleaned_individual_results.append(result_item)
+
+    if output_format == COLUMNAR_FORMAT:
+        cleaned_individual_results = records_to_columns(
+            cleaned_individual_results,
+            ["file_id", "filename", "features", "enmo_timeseries", "cosinorage"])
+
+    # Clean the summary dataframe and the correlation matrix
+    cleaned_summary_df = dataframe_to_records(summary_df)
+    cleaned_correlation_matrix = dataframe_to_dict(correlation_matrix)
+
+    result = {
+        "message": f"Successfully processed {len(processed_specs)} files out of {total_files} total files",
+        "successful_files": len(processed_specs),
+        "total_files": total_files,
+        "failed_files": failed_files,
+        "distribution_stats": clean_for_json(distribution_stats),
+        "individual_results": cleaned_individual_results,
+        "failed_handlers": failed_handlers,
+        "summary_dataframe": cleaned_summary_df,
+        "correlation_matrix": cleaned_correlation_matrix
+    }
+    if include_tables:
+        result["tables"] = {
+            "summary_dataframe": summary_df,
+            "correlation_matrix": correlation_matrix.rename_axis("feature")
+        }
+    return result
@@ -0,0 +1,101 @@
+"""
+Multi-resolution ENMO pyramid.
+
+When a file has been processed, its minute-level ENMO is aggregated once to
+fixed levels (1 min, 5 min, 15 min, 1 h, 1 day), each level from the one
+below. Every level is a level frame (see downsampling.series_to_level) with the
+mean/min/max of ENMO, the number of minutes and the wear fraction per bucket
+(minutes without wear detection are left out of the wear fraction).
+Timeseries requests are then answered from the coarsest level that fits
+instead of resampling the minute-level data on every request.
+"""
+
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+try:
+    from downsampling import (DEFAULT_RESOLUTION, downsample_level, parse_resolution,
+                              resample_level, series_to_level)
+except ImportError:
+    from backend.downsampling import (DEFAULT_RESOLUTION, downsample_level, parse_resolution,
+                                      resample_level, series_to_level)
+
+# Resolutions of the pyramid levels, from finest to coarsest (each divides the next)
+PYRAMID_LEVELS = ["1min", "5min", "15min", "1h", "1D"]
+
+# Minimum number of level buckets per requested point for LTTB on a pyramid level
+LTTB_OVERSAMPLING = 4
+
+# Level name used for the unaggregated minute-level data
+RAW_LEVEL = "raw"
+
+
+def build_enmo_pyramid(frame: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """
+    Build the ENMO pyramid of processed minute-level data with a sorted time index
+
+    Uses the 'wear' column for the wear fraction if present.
+    """
+    level = series_to_level(frame["ENMO"], frame.get("wear"))
+    pyramid = {}
+    for name in PYRAMID_LEVELS:
+        level = resample_level(level, name)
+        pyramid[name] = level
+    return pyramid
+
+
+def _slice_level(level: pd.DataFrame, start: Optional[pd.Timestamp],
+                 end: Optional[pd.Timestamp]) -> pd.DataFrame:
+    lower = 0 if start is None else level.index.searchsorted(start, side="left")
+    upper = len(level) if end is None else level.index.searchsorted(end, side="right")
+    return level.iloc[lower:upper]
+
+
+def select_level(pyramid: Optional[Dict[str, pd.DataFrame]], frame: pd.DataFrame,
+                 start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None,
+                 points: Optional[int] = None,
+                 resolution: Optional[str] = None) -> Tuple[str, pd.DataFrame]:
+    """
+    Select the level answering a points/resolution request between start and end
+
+    For a resolution, the coarsest level whose resolution divides it is used
+    (the level itself if it matches). For points, the coarsest level holding at
+    least LTTB_OVERSAMPLING buckets per point in the range is used. Otherwise
+    (or without pyramid) the minute-level frame is used. start and end are
+    applied to the bucket start times of the level. Returns the level name and
+    the sliced level frame.
+    """
+    if pyramid:
+        if points is None:
+            step = parse_resolution(resolution or DEFAULT_RESOLUTION)
+            for name in reversed(PYRAMID_LEVELS):
+                if step % parse_resolution(name) == pd.Timedelta(0):
+                    return name, _slice_level(pyramid[name], start, end)
+        else:
+            for name in reversed(PYRAMID_LEVELS):
+                level = _slice_level(pyramid[name], start, end)
+                if len(level) >= points * LTTB_OVERSAMPLING:
+                    return name, level
+
+    frame = _slice_level(frame, start, end)
+    return RAW_LEVEL, series_to_level(frame["ENMO"], frame.get("wear"))
+
+
+def downsample_enmo_pyramid(pyramid: Optional[Dict[str, pd.DataFrame]], frame: pd.DataFrame,
+                            start: Optional[pd.Timestamp] = None,
+                            end: Optional[pd.Timestamp] = None,
+                            points: Optional[int] = None,
+                            resolution: Optional[str] = None) -> Tuple[str, pd.DataFrame]:
+    """
+    Downsample ENMO between start and end from the best pyramid level
+
+    Returns the name of the level used and the downsampled frame (see
+    downsampling.downsample_level).
+    """
+    name, level = select_level(pyramid, frame, start, end, points, resolution)
+    # A level matching the requested resolution is returned as is
+    exact_level = name != RAW_LEVEL and \
+        parse_resolution(name) == parse_resolution(resolution or DEFAULT_RESOLUTION)
+    return name, downsample_level(level, points=points, resolution=resolution,
+                                  resample=not exact_level)
@@ -0,0 +1,136 @@
+"""
+Memoization of processing results.
+
+The features and metadata of a processed file only depend on the file
+content, the data source settings (including the time zone), the
+preprocess_args and the features_args. Results are memoized under a key
+derived from these, so that processing a file again with the same settings (or
+reloading the results page) is a dictionary lookup.
+
+Responses built from memoized results carry an ETag derived from the key and
+the response options. A request whose If-None-Match header holds the current
+ETag is answered with 304 Not Modified.
+"""
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+try:
+    from preprocess_cache import preprocess_cache_key
+    from result_store import estimate_size
+except ImportError:
+    from backend.preprocess_cache import preprocess_cache_key
+    from backend.result_store import estimate_size
+
+# Number of memoized processing results (set via the RESULT_CACHE_MAX_ENTRIES environment variable)
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", 32))
+
+# Memory budget of the memoized results (set via the RESULT_CACHE_MAX_BYTES environment variable)
+RESULT_CACHE_MAX_BYTES = int(os.environ.get(
+    "RESULT_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+
+class ResultCache:
+    """
+    Least recently used cache bounded by number of entries and approximate memory size
+
+    The most recently stored entry is always kept.
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+                 max_bytes: int = RESULT_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, Any]" = OrderedDict()
+        self.sizes: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Optional[str]) -> Optional[Any]:
+        """
+        Return the entry for key (marking it as recently used), or None
+        """
+        if key is None or key not in self.entries:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return self.entries[key]
+
+    def put(self, key: Optional[str], value: Any):
+        """
+        Store an entry and evict the least recently used ones above max_entries or max_bytes
+        """
+        if key is None:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        self.sizes[key] = estimate_size(value)
+        while len(self.entries) > 1 and (len(self.entries) > self.max_entries or
+                                         sum(self.sizes.values()) > self.max_bytes):
+            evicted_key, _ = self.entries.popitem(last=False)
+            del self.sizes[evicted_key]
+
+    def clear(self):
+        """
+        Remove all entries
+        """
+        self.entries.clear()
+        self.sizes.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return the number and approximate size of the entries, hits and misses
+        """
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "memory_bytes": sum(self.sizes.values()),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+def result_key(handler_spec: dict, preprocess_args: dict, features_args: dict) -> Optional[str]:
+    """
+    Return the key of the processing result of a handler, or None if it cannot be memoized
+
+    Extends the preprocess cache key (content hash, data source settings and
+    preprocess_args) with the features_args.
+    """
+    preprocess_key = preprocess_cache_key(handler_spec, preprocess_args)
+    if preprocess_key is None:
+        return None
+    encoded = json.dumps([preprocess_key, features_args or {}], sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def make_etag(*parts) -> str:
+    """
+    Return a strong ETag for a response determined by parts
+    """
+    encoded = json.dumps(parts, sort_keys=True, default=str)
+    return '"' + hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Return True if an If-None-Match header matches etag
+
+    Weak comparison is used, as required for If-None-Match.
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
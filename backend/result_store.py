@@ -0,0 +1,464 @@
+"""
+Shared, memory-bounded store of the state of uploaded files.
+
+Every uploaded file has a record (a dictionary) holding its upload settings
+and, once processed, its data handler, minute-level data and ENMO pyramid. The
+settings are stored in the shared state database and the latter (which are
+large) are pickled to an artifact in the shared artifact directory, so that
+all worker processes see the same files and the state survives restarts.
+
+Artifacts are written by a background thread when an event loop is running, so
+pickling large results does not block it. Each process keeps the results it
+used in memory and tracks their approximate size. When the total exceeds the
+budget, the results of the least recently used records are dropped from memory (spilled) and reloaded transparently from
+their artifact the next time one of them is read.
+
+The store behaves like a dictionary of records, so it can be used in place of
+a plain dict.
+"""
+
+import asyncio
+import logging
+import os
+import pickle
+import shutil
+import sys
+import uuid
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    from state_store import StateDatabase
+except ImportError:
+    from backend.state_store import StateDatabase
+
+logger = logging.getLogger(__name__)
+
+# Memory budget of the processed results (set via the RESULT_STORE_MAX_BYTES environment variable)
+RESULT_STORE_MAX_BYTES = int(os.environ.get(
+    "RESULT_STORE_MAX_BYTES", 1024 * 1024 * 1024))
+
+# Record keys whose values are accounted and spilled to disk
+SPILLABLE_KEYS = ("handler", "processed_data", "enmo_pyramid")
+
+
+def estimate_size(value: Any, _seen: set = None) -> int:
+    """
+    Return the approximate memory size of a value in bytes
+
+    DataFrames, Series and arrays are measured exactly (including object
+    columns); containers and objects (such as data handlers) are measured by
+    their contents.
+    """
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_size(item, _seen) for item in value.values())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(estimate_size(item, _seen) for item in value)
+    if hasattr(value, "__dict__") and not isinstance(value, type):
+        return sys.getsizeof(value) + estimate_size(vars(value), _seen)
+    return sys.getsizeof(value)
+
+
+class FileRecord(dict):
+    """
+    State of an uploaded file
+
+    Changes are written to the state database. Spilled values are still
+    reported as present and are reloaded from disk when they are read, or when
+    other results of the record change (results are stored together).
+    """
+
+    def __init__(self, store: "ResultStore", file_id: str, data: Dict[str, Any],
+                 spilled_keys: Iterable[str] = ()):
+        super().__init__(data)
+        self._store = store
+        self._file_id = file_id
+        self._spilled_keys = frozenset(spilled_keys)
+
+    def _load(self, *keys):
+        if self._spilled_keys.intersection(keys):
+            self._store._reload(self._file_id)
+
+    def _before_change(self, keys):
+        if set(SPILLABLE_KEYS).isdisjoint(keys):
+            self._load(*keys)
+            return
+        # Results are stored together, so the results that are kept are needed
+        # to store them again; spilled results that are replaced are not read
+        self._spilled_keys = self._spilled_keys.difference(keys)
+        self._load(*SPILLABLE_KEYS)
+
+    def __getitem__(self, key):
+        self._load(key)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self._load(key)
+        return super().get(key, default)
+
+    def __contains__(self, key):
+        return super().__contains__(key) or key in self._spilled_keys
+
+    def __setitem__(self, key, value):
+        self._before_change((key,))
+        super().__setitem__(key, value)
+        self._store._changed(self._file_id, (key,))
+
+    def update(self, *args, **kwargs):
+        values = dict(*args, **kwargs)
+        self._before_change(values)
+        super().update(values)
+        self._store._changed(self._file_id, values)
+
+    def pop(self, key, *default):
+        self._load(key)
+        self._before_change((key,))
+        value = super().pop(key, *default)
+        self._store._changed(self._file_id, (key,))
+        return value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._before_change((key,))
+        super().pop(key, None)
+        self._store._changed(self._file_id, (key,))
+
+
+class ResultStore(MutableMapping):
+    """
+    Dictionary of FileRecords by file_id backed by the shared state database
+
+    The record of a file is stored as JSON in the database; its processed
+    results are pickled once to an artifact in artifact_dir, named after the
+    result key so that identical results share one artifact. Each process keeps
+    the records it used in memory and reloads a record when another process
+    changed it. The most recently used record is never spilled, so values read
+    from it stay in memory until another record is used.
+    """
+
+    def __init__(self, db: StateDatabase, artifact_dir: str, max_bytes: int = RESULT_STORE_MAX_BYTES):
+        self.db = db
+        self.artifact_dir = artifact_dir
+        self.max_bytes = max_bytes
+        self._records: "OrderedDict[str, FileRecord]" = OrderedDict()
+        self._versions: Dict[str, int] = {}  # Database version of the records in memory
+        self._artifacts: Dict[str, Optional[str]] = {}  # Artifact of the records in memory
+        self._sizes: Dict[str, int] = {}  # Bytes in memory per record
+        self._pending: Dict[str, Tuple[object, str]] = {}  # Artifact writes in progress ({file_id: (token, artifact)})
+        self._writer = ThreadPoolExecutor(max_workers=1)  # Writes artifacts in order
+        self.spills = 0
+        self.reloads = 0
+
+    def __getitem__(self, file_id: str) -> FileRecord:
+        version = self.db.get_file_version(file_id)
+        if version is None:
+            self._forget(file_id)
+            raise KeyError(file_id)
+        if file_id not in self._records or self._versions[file_id] != version:
+            self._load_record(file_id)
+        self._records.move_to_end(file_id)
+        return self._records[file_id]
+
+    def __setitem__(self, file_id: str, data: Dict[str, Any]):
+        if file_id in self:
+            del self[file_id]
+        record = FileRecord(self, file_id, data)
+        self._records[file_id] = record
+        self._versions[file_id] = self.db.insert_file(file_id, self._light_values(record))
+        self._artifacts[file_id] = None
+        self._changed(file_id, set(data).intersection(SPILLABLE_KEYS))
+
+    def __delitem__(self, file_id: str):
+        if file_id not in self:
+            self._forget(file_id)
+            raise KeyError(file_id)
+        artifact = self.db.delete_file(file_id)
+        self._forget(file_id)
+        self._discard_artifact(artifact)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.db.list_files())
+
+    def __len__(self) -> int:
+        return self.db.count_files()
+
+    def __contains__(self, file_id) -> bool:
+        return self.db.get_file_version(file_id) is not None
+
+    def pop(self, file_id: str, *default):
+        """
+        Remove a record and return it (with its spilled values dropped)
+        """
+        try:
+            record = self[file_id]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        del self[file_id]
+        record._spilled_keys = frozenset()
+        return record
+
+    def uploaded_before(self, timestamp: float) -> List[str]:
+        """
+        Return the file_ids uploaded before a POSIX timestamp
+        """
+        return self.db.files_uploaded_before(timestamp)
+
+    def clear(self):
+        """
+        Remove all records and stored results
+        """
+        self.db.clear_files()
+        self._records.clear()
+        self._versions.clear()
+        self._artifacts.clear()
+        self._sizes.clear()
+        shutil.rmtree(self.artifact_dir, ignore_errors=True)
+
+    @staticmethod
+    def _light_values(record: FileRecord) -> Dict[str, Any]:
+        return {key: value for key, value in dict.items(record) if key not in SPILLABLE_KEYS}
+
+    def _forget(self, file_id: str):
+        self._pending.pop(file_id, None)
+        self._records.pop(file_id, None)
+        self._versions.pop(file_id, None)
+        self._artifacts.pop(file_id, None)
+        self._sizes.pop(file_id, None)
+
+    def _artifact_path(self, artifact: str) -> str:
+        return os.path.join(self.artifact_dir, f"{artifact}.pkl")
+
+    def _discard_artifact(self, artifact: Optional[str]):
+        if artifact is None or self.db.artifact_in_use(artifact):
+            return
+        try:
+            os.remove(self._artifact_path(artifact))
+        except FileNotFoundError:
+            pass
+
+    def _load_record(self, file_id: str):
+        """
+        Read the record of a file from the database
+
+        Results already in memory are kept if the record still uses the same artifact.
+        """
+        row = self.db.get_file(file_id)
+        if row is None:
+            self._forget(file_id)
+            raise KeyError(file_id)
+        data, version, artifact, artifact_keys = row
+
+        previous = self._records.get(file_id)
+        record = FileRecord(self, file_id, data, spilled_keys=artifact_keys)
+        if previous is not None and artifact is not None and self._artifacts.get(file_id) == artifact:
+            values = {key: dict.get(previous, key) for key in SPILLABLE_KEYS
+                      if dict.__contains__(previous, key)}
+            dict.update(record, values)
+            record._spilled_keys = record._spilled_keys.difference(values)
+
+        self._records[file_id] = record
+        self._versions[file_id] = version
+        self._artifacts[file_id] = artifact
+        self._resize(file_id)
+
+    def _changed(self, file_id: str, keys: Iterable[str]):
+        """
+        Write the changed values of a record to the database and keep the store within its budget
+        """
+        keys = set(keys)
+        if not keys:
+            return
+        light_keys = keys.difference(SPILLABLE_KEYS)
+        if light_keys:
+            record = self._records[file_id]
+            values = {key: dict.get(record, key) for key in light_keys
+                      if dict.__contains__(record, key)}
+            self._set_version(file_id, self.db.update_file(
+                file_id, values, light_keys.difference(values)))
+        if not keys.isdisjoint(SPILLABLE_KEYS):
+            self._store_results(file_id)
+            self._resize(file_id)
+
+    def _set_version(self, file_id: str, versions: Optional[Tuple[int, int]]):
+        """
+        Record the version written by this process
+
+        If another process changed the record in the meantime, the record is
+        read again the next time it is used.
+        """
+        if versions is None:
+            return
+        previous, current = versions
+        self._versions[file_id] = current if previous == self._versions.get(file_id) else -1
+
+    def _store_results(self, file_id: str):
+        """
+        Pickle the processed results of a record to its artifact
+
+        With a running event loop the artifact is written in the background.
+        Until it is written, the record has no artifact: other processes do not
+        see the previous results and the results are not spilled.
+        """
+        record = self._records[file_id]
+        values = {key: dict.get(record, key) for key in SPILLABLE_KEYS
+                  if dict.__contains__(record, key)}
+        previous = self._artifacts.get(file_id)
+        self._pending.pop(file_id, None)
+        if previous is not None or not values:
+            self._set_artifact(file_id, None, [], previous)
+        if not values:
+            return
+
+        artifact = dict.get(record, "result_key") or uuid.uuid4().hex
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._artifact_written(file_id, None, artifact, list(values),
+                                   self._write_artifact(file_id, artifact, values))
+            return
+
+        token = object()
+        self._pending[file_id] = (token, artifact)
+        future = loop.run_in_executor(self._writer, self._write_artifact, file_id, artifact, values)
+        future.add_done_callback(lambda done: self._artifact_written(
+            file_id, token, artifact, list(values), not done.cancelled() and done.result()))
+
+    def _write_artifact(self, file_id: str, artifact: str, values: Dict[str, Any]) -> bool:
+        """
+        Pickle values to an artifact. Returns False if it could not be written.
+        """
+        path = self._artifact_path(artifact)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(self.artifact_dir, exist_ok=True)
+            with open(temp_path, "wb") as f:
+                pickle.dump(values, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+            return True
+        except Exception as e:
+            # The results stay in memory of this process only
+            logger.warning(f"Could not store results of file {file_id}: {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+
+    def _artifact_written(self, file_id: str, token: Optional[object], artifact: str,
+                          keys: List[str], written: bool):
+        """
+        Record a written artifact, unless the results were changed or removed meanwhile
+        """
+        if token is not None:
+            pending = self._pending.get(file_id)
+            if pending is None or pending[0] is not token:
+                if artifact not in {name for _, name in self._pending.values()}:
+                    self._discard_artifact(artifact)
+                return
+            del self._pending[file_id]
+        if written:
+            self._set_artifact(file_id, artifact, keys, None)
+            self._enforce_budget()
+
+    def _set_artifact(self, file_id: str, artifact: Optional[str], keys: List[str],
+                      previous: Optional[str]):
+        self._set_version(file_id, self.db.set_file_artifact(file_id, artifact, keys))
+        if file_id in self._records:
+            self._artifacts[file_id] = artifact
+        if previous not in (None, artifact):
+            self._discard_artifact(previous)
+
+    def _resize(self, file_id: str):
+        """
+        Measure the spillable values of a record and keep the store within its budget
+        """
+        record = self._records.get(file_id)
+        if record is None:
+            return
+        self._sizes[file_id] = sum(
+            estimate_size(dict.get(record, key)) for key in SPILLABLE_KEYS
+            if dict.__contains__(record, key))
+        self._records.move_to_end(file_id)
+        self._enforce_budget()
+
+    def _enforce_budget(self):
+        total = sum(self._sizes.values())
+        # Oldest first, never the most recently used record
+        for file_id in list(self._records)[:-1]:
+            if total <= self.max_bytes:
+                break
+            size = self._sizes.get(file_id, 0)
+            if size and self._spill(file_id):
+                total -= size
+
+    def _spill(self, file_id: str) -> bool:
+        # Results are already stored in the artifact, so spilling drops them from memory
+        if self._artifacts.get(file_id) is None:
+            return False
+        record = self._records[file_id]
+        keys = [key for key in SPILLABLE_KEYS if dict.__contains__(record, key)]
+        for key in keys:
+            dict.__delitem__(record, key)
+        record._spilled_keys = record._spilled_keys.union(keys)
+        logger.info(
+            f"Spilled results of file {file_id} to disk ({self._sizes[file_id]} bytes in memory)")
+        self._sizes[file_id] = 0
+        self.spills += 1
+        return True
+
+    def _reload(self, file_id: str):
+        record = self._records[file_id]
+        spilled_keys = record._spilled_keys
+        record._spilled_keys = frozenset()
+        try:
+            with open(self._artifact_path(self._artifacts[file_id]), "rb") as f:
+                values = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Could not reload results of file {file_id}: {str(e)}")
+            return
+
+        dict.update(record, {key: values[key] for key in spilled_keys if key in values})
+        self.reloads += 1
+        logger.info(f"Reloaded results of file {file_id} from disk")
+        self._resize(file_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the number of records and the memory and disk usage of their results
+        """
+        stored_bytes = 0
+        if os.path.isdir(self.artifact_dir):
+            for name in os.listdir(self.artifact_dir):
+                try:
+                    stored_bytes += os.path.getsize(os.path.join(self.artifact_dir, name))
+                except FileNotFoundError:
+                    pass
+        return {
+            "files": len(self),
+            "files_in_memory": len(self._records),
+            "memory_bytes": sum(self._sizes.values()),
+            "max_bytes": self.max_bytes,
+            "spilled_files": sum(1 for record in self._records.values() if record._spilled_keys),
+            "stored_bytes": stored_bytes,
+            "spills": self.spills,
+            "reloads": self.reloads
+        }
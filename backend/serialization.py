@@ -0,0 +1,172 @@
+"""
+JSON serialization of processing results.
+
+Responses are encoded with orjson, which writes floats, numpy arrays and
+datetimes natively and turns NaN and infinity into null. DataFrames are
+converted with vectorized masking instead of row-by-row cleaning, either to a
+list of row dictionaries ("records") or to one array per column ("columnar").
+
+Values that are stored (rather than sent) are encoded as tagged JSON, which
+restores timestamps as pandas Timestamps. Tagged JSON is strict JSON (NaN and
+infinity become null), so it can be edited with SQLite's JSON functions.
+"""
+
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Union
+
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi.responses import JSONResponse
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+# Datetimes and numpy values are passed to _encode_tagged to tag timestamps
+TAGGED_ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+# Output formats of tabular results
+RECORDS_FORMAT = "records"
+COLUMNAR_FORMAT = "columnar"
+RESPONSE_FORMATS = (RECORDS_FORMAT, COLUMNAR_FORMAT)
+
+
+def json_default(obj: Any) -> Any:
+    """
+    Encode the types orjson does not handle itself
+    """
+    if obj is pd.NaT:
+        return None
+    if isinstance(obj, (datetime, date)):
+        # Includes pandas Timestamps, which orjson treats as unknown subclasses
+        return obj.isoformat()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        # Arrays orjson cannot serialize natively (e.g. non-contiguous or object arrays)
+        return obj.tolist()
+    return str(obj)
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Serialize content to JSON bytes
+    """
+    return orjson.dumps(content, default=json_default, option=ORJSON_OPTIONS)
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson (NaN and infinity become null)
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def mask_invalid(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Return a copy of df with NaN, infinity and NaT replaced by None
+    """
+    numeric_columns = df.select_dtypes(include=[np.number]).columns
+    if len(numeric_columns) > 0:
+        df = df.copy()
+        df[numeric_columns] = df[numeric_columns].replace(
+            [np.inf, -np.inf], np.nan)
+    return df.astype(object).where(df.notna(), None)
+
+
+def dataframe_to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Convert a DataFrame to a list of row dictionaries with invalid values as None
+    """
+    if df.empty:
+        return []
+    return mask_invalid(df).to_dict(orient='records')
+
+
+def dataframe_to_dict(df: pd.DataFrame) -> Dict[str, Dict[str, Any]]:
+    """
+    Convert a DataFrame to a {column: {index: value}} dictionary with invalid values as None
+    """
+    if df.empty:
+        return {}
+    return mask_invalid(df).to_dict(orient='dict')
+
+
+def datetimes_to_epoch_ms(series: pd.Series) -> Union[np.ndarray, List[Any]]:
+    """
+    Convert a datetime Series to milliseconds since the epoch
+
+    Naive timestamps are taken as is (i.e. as UTC), timezone-aware ones are
+    converted to UTC. NaT becomes None.
+    """
+    if series.dt.tz is not None:
+        series = series.dt.tz_convert("UTC").dt.tz_localize(None)
+    epoch_ms = series.to_numpy(dtype="datetime64[ms]").astype(np.int64)
+    valid = series.notna().to_numpy()
+    if not valid.all():
+        return np.where(valid, epoch_ms.astype(object), None).tolist()
+    return epoch_ms
+
+
+def dataframe_to_columns(df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Convert a DataFrame to a {column: [values]} dictionary with invalid values as None
+
+    Datetime columns are converted to epoch milliseconds. Numeric columns are
+    kept as NumPy arrays, which orjson writes directly (NaN and infinity as null).
+    """
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            columns[col] = datetimes_to_epoch_ms(series)
+        elif series.dtype.kind in "biuf":
+            columns[col] = np.ascontiguousarray(series.to_numpy())
+        else:
+            columns[col] = mask_invalid(series.to_frame())[col].tolist()
+    return columns
+
+
+def records_to_columns(records: List[Dict[str, Any]], keys: List[str]) -> Dict[str, List[Any]]:
+    """
+    Convert a list of dictionaries to a {key: [values]} dictionary (missing values as None)
+    """
+    return {key: [record.get(key) for record in records] for key in keys}
+
+
+def dataframe_to_format(df: pd.DataFrame, output_format: str = RECORDS_FORMAT) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Convert a DataFrame to records or columnar output
+    """
+    if output_format == COLUMNAR_FORMAT:
+        return dataframe_to_columns(df)
+    return dataframe_to_records(df)
+
+
+def _encode_tagged(obj: Any) -> Any:
+    if isinstance(obj, (datetime, np.datetime64)) and not pd.isna(obj):
+        return {"__timestamp__": pd.Timestamp(obj).isoformat()}
+    return json_default(obj)
+
+
+def _decode_tagged(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1 and "__timestamp__" in obj:
+        return pd.Timestamp(obj["__timestamp__"])
+    return obj
+
+
+def dumps_tagged(content: Any) -> str:
+    """
+    Serialize content to JSON for storage, tagging timestamps so that loads_tagged restores them
+    """
+    return orjson.dumps(content, default=_encode_tagged, option=TAGGED_ORJSON_OPTIONS).decode("utf-8")
+
+
+def loads_tagged(text: Union[str, bytes]) -> Any:
+    """
+    Deserialize JSON written by dumps_tagged
+    """
+    return json.loads(text, object_hook=_decode_tagged)
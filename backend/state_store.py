@@ -0,0 +1,431 @@
+"""
+Shared persistent state.
+
+The state of uploaded files, blobs, background jobs and chunked upload
+sessions is kept in a SQLite database in WAL mode
+inside the shared artifact directory, so that several API worker processes (or
+replicas sharing the directory) see the same uploads and the state survives
+restarts. Each process opens its own connection on first use; writes are
+single statements or short transactions and concurrent writers wait for the
+lock (up to STATE_DB_BUSY_TIMEOUT_MS). Records are updated key by key, so
+processes changing different keys of the same record do not overwrite each
+other.
+"""
+
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from serialization import dumps_tagged, loads_tagged
+except ImportError:
+    from backend.serialization import dumps_tagged, loads_tagged
+
+# How long a connection waits for the write lock of another process
+STATE_DB_BUSY_TIMEOUT_MS = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    file_id TEXT PRIMARY KEY,
+    record TEXT NOT NULL,
+    uploaded_at REAL NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    artifact TEXT,
+    artifact_keys TEXT
+);
+CREATE INDEX IF NOT EXISTS files_uploaded_at ON files (uploaded_at);
+CREATE INDEX IF NOT EXISTS files_artifact ON files (artifact);
+CREATE TABLE IF NOT EXISTS blobs (
+    content_hash TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    dir TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    derived TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blob_refs (
+    file_id TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blob_refs_content_hash ON blob_refs (content_hash);
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    job_type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    error TEXT,
+    progress TEXT,
+    result_path TEXT,
+    owner_host TEXT,
+    owner_pid INTEGER,
+    owner_started_at REAL
+);
+CREATE TABLE IF NOT EXISTS upload_sessions (
+    upload_id TEXT PRIMARY KEY,
+    session TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS upload_ranges (
+    upload_id TEXT NOT NULL,
+    range_start INTEGER NOT NULL,
+    range_end INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS upload_ranges_upload_id ON upload_ranges (upload_id);
+"""
+
+JOB_COLUMNS = ("job_id", "job_type", "status", "created_at", "started_at",
+               "finished_at", "error", "progress", "result_path")
+
+
+def _json_path(key: str) -> str:
+    # Path of a top-level key in SQLite's JSON functions
+    return f'$."{key}"'
+
+
+class StateDatabase:
+    """
+    SQLite database holding the file records, blobs, jobs and upload sessions
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # Connections are not shared with forked processes
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(
+                self.path, timeout=STATE_DB_BUSY_TIMEOUT_MS / 1000,
+                isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def execute(self, sql: str, parameters: tuple = ()) -> sqlite3.Cursor:
+        return self.connection.execute(sql, parameters)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run several statements as one write transaction
+        """
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    # Files
+
+    def insert_file(self, file_id: str, record: Dict[str, Any]) -> int:
+        """
+        Insert or replace a file record and return its version
+        """
+        self.execute(
+            "INSERT OR REPLACE INTO files (file_id, record, uploaded_at, version) VALUES (?, ?, ?, 1)",
+            (file_id, dumps_tagged(record), time.time()))
+        return 1
+
+    def update_file(self, file_id: str, values: Dict[str, Any],
+                    removed_keys: Iterable[str] = ()) -> Optional[Tuple[int, int]]:
+        """
+        Set and remove single keys of the record of a file
+
+        Other keys are left as they are, so concurrent updates of different keys
+        by several processes are all kept. Returns the version before and after
+        the update (None if the file does not exist).
+        """
+        record_sql = "record"
+        parameters = []
+        if values:
+            record_sql = f"json_set({record_sql}{', ?, json(?)' * len(values)})"
+            for key, value in values.items():
+                parameters += [_json_path(key), dumps_tagged(value)]
+        removed_keys = list(removed_keys)
+        if removed_keys:
+            record_sql = f"json_remove({record_sql}{', ?' * len(removed_keys)})"
+            parameters += [_json_path(key) for key in removed_keys]
+
+        with self.transaction() as connection:
+            row = connection.execute(
+                "SELECT version FROM files WHERE file_id = ?", (file_id,)).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                f"UPDATE files SET record = {record_sql}, version = version + 1 WHERE file_id = ?",
+                (*parameters, file_id))
+        return row[0], row[0] + 1
+
+    def get_file(self, file_id: str) -> Optional[Tuple[Dict[str, Any], int, Optional[str], List[str]]]:
+        """
+        Return the record, version, artifact and artifact keys of a file, or None
+        """
+        row = self.execute(
+            "SELECT record, version, artifact, artifact_keys FROM files WHERE file_id = ?",
+            (file_id,)).fetchone()
+        if row is None:
+            return None
+        record, version, artifact, artifact_keys = row
+        return loads_tagged(record), version, artifact, loads_tagged(artifact_keys or "[]")
+
+    def get_file_version(self, file_id: str) -> Optional[int]:
+        row = self.execute(
+            "SELECT version FROM files WHERE file_id = ?", (file_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def set_file_artifact(self, file_id: str, artifact: Optional[str],
+                          keys: List[str]) -> Optional[Tuple[int, int]]:
+        """
+        Record the artifact holding the processed results of a file
+
+        Returns the version before and after the update (None if the file does not exist).
+        """
+        with self.transaction() as connection:
+            row = connection.execute(
+                "SELECT version FROM files WHERE file_id = ?", (file_id,)).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE files SET artifact = ?, artifact_keys = ?, version = version + 1 WHERE file_id = ?",
+                (artifact, dumps_tagged(keys), file_id))
+        return row[0], row[0] + 1
+
+    def delete_file(self, file_id: str) -> Optional[str]:
+        """
+        Delete a file record and return its artifact
+        """
+        with self.transaction() as connection:
+            row = connection.execute(
+                "SELECT artifact FROM files WHERE file_id = ?", (file_id,)).fetchone()
+            connection.execute("DELETE FROM files WHERE file_id = ?", (file_id,))
+        return None if row is None else row[0]
+
+    def artifact_in_use(self, artifact: str) -> bool:
+        return self.execute(
+            "SELECT 1 FROM files WHERE artifact = ? LIMIT 1", (artifact,)).fetchone() is not None
+
+    def list_files(self) -> List[str]:
+        return [row[0] for row in self.execute("SELECT file_id FROM files ORDER BY uploaded_at")]
+
+    def count_files(self) -> int:
+        return self.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def files_uploaded_before(self, timestamp: float) -> List[str]:
+        return [row[0] for row in self.execute(
+            "SELECT file_id FROM files WHERE uploaded_at < ?", (timestamp,))]
+
+    def clear_files(self):
+        self.execute("DELETE FROM files")
+
+    # Blobs
+
+    def insert_blob(self, blob: Dict[str, Any]):
+        self.execute(
+            "INSERT OR REPLACE INTO blobs (content_hash, path, dir, size, derived, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (blob["content_hash"], blob["path"], blob["dir"], blob["size"],
+             dumps_tagged(blob["derived"]), blob["created_at"]))
+
+    def get_blob(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        row = self.execute(
+            "SELECT content_hash, path, dir, size, derived, created_at FROM blobs WHERE content_hash = ?",
+            (content_hash,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "content_hash": row[0],
+            "path": row[1],
+            "dir": row[2],
+            "size": row[3],
+            "derived": loads_tagged(row[4]),
+            "created_at": row[5]
+        }
+
+    def set_blob_derived(self, content_hash: str, key: str, value: Any):
+        """
+        Set one derived value of a blob (json_set keeps concurrent updates of other keys)
+        """
+        self.execute(
+            "UPDATE blobs SET derived = json_set(derived, ?, json(?)) WHERE content_hash = ?",
+            (_json_path(key), dumps_tagged(value), content_hash))
+
+    def add_blob_ref(self, content_hash: str, file_id: str):
+        self.execute(
+            "INSERT OR REPLACE INTO blob_refs (file_id, content_hash) VALUES (?, ?)",
+            (file_id, content_hash))
+
+    def remove_blob_ref(self, file_id: str) -> Optional[str]:
+        with self.transaction() as connection:
+            row = connection.execute(
+                "SELECT content_hash FROM blob_refs WHERE file_id = ?", (file_id,)).fetchone()
+            connection.execute("DELETE FROM blob_refs WHERE file_id = ?", (file_id,))
+        return None if row is None else row[0]
+
+    def get_blob_ref(self, file_id: str) -> Optional[str]:
+        row = self.execute(
+            "SELECT content_hash FROM blob_refs WHERE file_id = ?", (file_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def blob_file_ids(self, content_hash: str) -> List[str]:
+        return [row[0] for row in self.execute(
+            "SELECT file_id FROM blob_refs WHERE content_hash = ?", (content_hash,))]
+
+    def delete_blob_if_unused(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Delete a blob without references and return it (None if it is still used)
+        """
+        with self.transaction() as connection:
+            row = connection.execute(
+                "SELECT dir, size FROM blobs WHERE content_hash = ? AND NOT EXISTS "
+                "(SELECT 1 FROM blob_refs WHERE content_hash = ?)",
+                (content_hash, content_hash)).fetchone()
+            if row is not None:
+                connection.execute("DELETE FROM blobs WHERE content_hash = ?", (content_hash,))
+        return None if row is None else {"dir": row[0], "size": row[1]}
+
+    def blob_stats(self) -> Tuple[int, int, int, int]:
+        """
+        Return the number of blobs and references, the stored bytes and the referenced bytes
+        """
+        blobs, stored = self.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        refs, referenced = self.execute(
+            "SELECT COUNT(*), COALESCE(SUM(blobs.size), 0) FROM blob_refs "
+            "JOIN blobs USING (content_hash)").fetchone()
+        return blobs, refs, stored, referenced
+
+    def clear_blobs(self):
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM blob_refs")
+            connection.execute("DELETE FROM blobs")
+
+    # Jobs
+
+    def insert_job(self, job_id: str, job_type: str, status: str, created_at: float,
+                   owner: Tuple[str, int, float]):
+        """
+        Insert a job run by owner, the (host, pid, start time) of its process
+        """
+        self.execute(
+            "INSERT INTO jobs (job_id, job_type, status, created_at, owner_host, owner_pid, owner_started_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, job_type, status, created_at, *owner))
+
+    def update_job(self, job_id: str, **values):
+        """
+        Set columns of a job (progress is stored as JSON)
+        """
+        if "progress" in values:
+            values["progress"] = dumps_tagged(values["progress"])
+        assignments = ", ".join(f"{column} = ?" for column in values)
+        self.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?",
+                     (*values.values(), job_id))
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self.execute(
+            f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(JOB_COLUMNS, row))
+        job["progress"] = loads_tagged(job["progress"]) if job["progress"] else None
+        return job
+
+    def unfinished_jobs(self) -> List[Tuple[str, Tuple[str, int, float]]]:
+        """
+        Return the IDs and owners of the jobs that are queued or running
+        """
+        return [(row[0], tuple(row[1:])) for row in self.execute(
+            "SELECT job_id, owner_host, owner_pid, owner_started_at FROM jobs WHERE finished_at IS NULL")]
+
+    def fail_unfinished_job(self, job_id: str, status: str, error: str, finished_at: float) -> bool:
+        """
+        Mark a job that has not finished yet as failed. Returns False if it finished meanwhile.
+        """
+        cursor = self.execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE job_id = ? AND finished_at IS NULL",
+            (status, error, finished_at, job_id))
+        return cursor.rowcount > 0
+
+    def delete_jobs_finished_before(self, timestamp: float) -> List[Tuple[str, Optional[str]]]:
+        """
+        Delete the jobs that finished before timestamp and return their IDs and result paths
+        """
+        with self.transaction() as connection:
+            rows = connection.execute(
+                "SELECT job_id, result_path FROM jobs WHERE finished_at < ?", (timestamp,)).fetchall()
+            connection.execute("DELETE FROM jobs WHERE finished_at < ?", (timestamp,))
+        return rows
+
+    def count_jobs_by_status(self) -> Dict[str, int]:
+        return dict(self.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    # Upload sessions
+
+    def insert_upload_session(self, upload_id: str, session: Dict[str, Any], created_at: float):
+        self.execute(
+            "INSERT INTO upload_sessions (upload_id, session, created_at, updated_at) VALUES (?, ?, ?, ?)",
+            (upload_id, dumps_tagged(session), created_at, created_at))
+
+    def get_upload_session(self, upload_id: str) -> Optional[Tuple[Dict[str, Any], float, float, List[Tuple[int, int]]]]:
+        """
+        Return the session, creation time, last update time and received byte ranges of an upload, or None
+        """
+        row = self.execute(
+            "SELECT session, created_at, updated_at FROM upload_sessions WHERE upload_id = ?",
+            (upload_id,)).fetchone()
+        if row is None:
+            return None
+        ranges = self.execute(
+            "SELECT range_start, range_end FROM upload_ranges WHERE upload_id = ?",
+            (upload_id,)).fetchall()
+        return loads_tagged(row[0]), row[1], row[2], ranges
+
+    def add_upload_range(self, upload_id: str, start: int, end: int, updated_at: float) -> bool:
+        """
+        Record the byte range [start, end) as received. Returns False if the session does not exist.
+        """
+        with self.transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE upload_sessions SET updated_at = ? WHERE upload_id = ?",
+                (updated_at, upload_id))
+            if cursor.rowcount == 0:
+                return False
+            if end > start:
+                connection.execute(
+                    "INSERT INTO upload_ranges (upload_id, range_start, range_end) VALUES (?, ?, ?)",
+                    (upload_id, start, end))
+        return True
+
+    def delete_upload_session(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Delete an upload session and return it (None if it does not exist)
+
+        Only one of several processes deleting the same session gets it back.
+        """
+        with self.transaction() as connection:
+            row = connection.execute(
+                "SELECT session FROM upload_sessions WHERE upload_id = ?", (upload_id,)).fetchone()
+            connection.execute("DELETE FROM upload_sessions WHERE upload_id = ?", (upload_id,))
+            connection.execute("DELETE FROM upload_ranges WHERE upload_id = ?", (upload_id,))
+        return None if row is None else loads_tagged(row[0])
+
+    def upload_sessions_updated_before(self, timestamp: float) -> List[str]:
+        return [row[0] for row in self.execute(
+            "SELECT upload_id FROM upload_sessions WHERE updated_at < ?", (timestamp,))]
+
+    def list_upload_sessions(self) -> List[str]:
+        return [row[0] for row in self.execute("SELECT upload_id FROM upload_sessions")]
@@ -0,0 +1,40 @@
+"""
+Shared fixtures of the backend tests.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+try:
+    import processing
+    from preprocess_cache import CachedDataHandler
+except ImportError:
+    from backend import processing
+    from backend.preprocess_cache import CachedDataHandler
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_FILE = os.path.join(BACKEND_DIR, "data", "sample", "sample_data_single.csv")
+
+
+@pytest.fixture(scope="session")
+def handlers():
+    """
+    Handlers of three subjects: the sample recording and two variants of it
+    """
+    handler = processing.build_handler({
+        "handler": "generic",
+        "kwargs": {
+            "file_path": SAMPLE_FILE, "data_format": "csv", "data_type": "accelerometer-mg",
+            "time_format": "unix-s", "time_column": "timestamp", "data_columns": ["x", "y", "z"]
+        }
+    }, {})
+    ml_data = handler.get_ml_data()
+    # Further subjects with a different activity level and rhythm
+    subjects = [handler]
+    for scale, shift in [(0.5, 180), (2.0, -240)]:
+        data = ml_data.copy()
+        data["enmo"] = np.roll(data["enmo"].to_numpy() * scale, shift)
+        subjects.append(CachedDataHandler(data, dict(handler.get_meta_data())))
+    return subjects
@@ -0,0 +1,44 @@
+"""
+Batch CosinorAge predictions must match the predictions of CosinorAge.
+"""
+
+import numpy as np
+import pytest
+from cosinorage.bioages.cosinorage import CosinorAge
+from cosinorage.features.utils.cosinor_analysis import cosinor_multiday
+
+try:
+    import bioage
+except ImportError:
+    from backend import bioage
+
+
+@pytest.mark.parametrize("gender", ["female", "male", "unknown"])
+def test_batch_prediction_matches_cosinorage(handlers, gender):
+    ages = [35.0, 52.5, 70.0]
+    records = [{"handler": handler, "age": age, "gender": gender}
+               for handler, age in zip(handlers, ages)]
+    CosinorAge(records)
+
+    params = [cosinor_multiday(handler.get_ml_data())[0] for handler in handlers]
+    prediction = bioage.predict_cosinorage_batch(
+        [p["mesor"] for p in params], [p["amplitude"] for p in params],
+        [p["acrophase"] for p in params], ages, gender)
+
+    np.testing.assert_allclose(
+        prediction["cosinorage"], [record["cosinorage"] for record in records], rtol=1e-12)
+    np.testing.assert_allclose(
+        prediction["cosinorage_advance"], [record["cosinorage_advance"] for record in records],
+        rtol=1e-12, atol=1e-9)
+
+
+def test_batch_prediction_with_mixed_genders_and_missing_values():
+    prediction = bioage.predict_cosinorage_batch(
+        [7.1, 7.1, 7.1, np.nan], [2.5, 2.5, 2.5, 2.5], [-0.1, -0.1, -0.1, -0.1],
+        [50.0, 50.0, 50.0, 50.0], ["female", "male", "unknown", "male"])
+
+    for i, gender in enumerate(["female", "male", "unknown"]):
+        expected = bioage.predict_cosinorage_batch([7.1], [2.5], [-0.1], [50.0], gender)
+        assert prediction["cosinorage"][i] == pytest.approx(expected["cosinorage"][0], rel=1e-12)
+    assert len(set(prediction["cosinorage"][:3])) == 3
+    assert np.isnan(prediction["cosinorage"][3])
@@ -0,0 +1,36 @@
+"""
+Cohort statistics of per-subject features must match BulkWearableFeatures.
+"""
+
+import pytest
+from cosinorage.features.bulk_features import BulkWearableFeatures
+from cosinorage.features.features import WearableFeatures
+
+try:
+    import bulk_features
+except ImportError:
+    from backend import bulk_features
+
+
+def test_distribution_stats_match_bulk_wearable_features(handlers):
+    expected = BulkWearableFeatures(handlers).get_distribution_stats()
+    # Failed subjects are left out of the statistics
+    individual_features = [WearableFeatures(handler).get_features() for handler in handlers]
+    stats = bulk_features.compute_distribution_stats(individual_features + [None])
+
+    assert expected
+    assert stats.keys() == expected.keys()
+    for feature, feature_stats in expected.items():
+        assert stats[feature].keys() == feature_stats.keys(), feature
+        for name, value in feature_stats.items():
+            assert stats[feature][name] == pytest.approx(value, rel=1e-9, nan_ok=True), (feature, name)
+
+
+def test_parallel_bulk_features_report_failed_subjects(handlers):
+    features = [WearableFeatures(handlers[0]).get_features(), None]
+    bulk = bulk_features.ParallelBulkWearableFeatures.from_individual_features(
+        features, failed_handlers=[(1, "error")])
+
+    assert bulk.get_distribution_stats() == bulk_features.compute_distribution_stats(features)
+    assert bulk.failed_handlers == [(1, "error")]
+    assert bulk.get_distribution_stats()["cosinor_mesor"]["count"] == 1
@@ -0,0 +1,75 @@
+"""
+Columnar copies must read back exactly like the CSV files they replace.
+"""
+
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+try:
+    import columnar
+except ImportError:
+    from backend import columnar
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_FILES = [
+    os.path.join(BACKEND_DIR, "data", "sample", "sample_data_single.csv"),
+    os.path.join(os.path.dirname(BACKEND_DIR), "data", "test", "sample1.csv"),
+]
+
+MISSING_VALUES_CSV = """timestamp,x,label,count,flag,time
+1448925300,1.5,walk,1,True,2023-11-30T19:45:00.000Z
+1448925360,NA,null,,False,2023-11-30T19:46:00.000Z
+1448925420,,NA,3,,
+1448925480,2.25,,NULL,True,2023-11-30T19:48:00.000Z
+1448925540,nan,None,5,N/A,2023-11-30T19:49:00.000Z
+1448925600,-1.0,"run, fast",#N/A,False,n/a
+"""
+
+
+def _columnar_file(source_path: str, tmp_path) -> str:
+    # The copy is written next to the CSV file, so convert a copy of the sample
+    file_path = os.path.join(tmp_path, os.path.basename(source_path))
+    shutil.copyfile(source_path, file_path)
+    assert columnar.convert_to_columnar(file_path) == columnar.get_columnar_path(file_path)
+    return file_path
+
+
+@pytest.mark.parametrize("source_path", SAMPLE_FILES, ids=os.path.basename)
+def test_read_table_matches_read_csv(source_path, tmp_path):
+    file_path = _columnar_file(source_path, tmp_path)
+
+    pd.testing.assert_frame_equal(columnar.read_table(file_path), pd.read_csv(file_path))
+    assert columnar.read_column_names(file_path) == pd.read_csv(file_path, nrows=0).columns.tolist()
+
+
+def test_read_table_matches_read_csv_with_missing_values(tmp_path):
+    source_path = os.path.join(tmp_path, "source", "missing.csv")
+    os.makedirs(os.path.dirname(source_path))
+    with open(source_path, "w") as f:
+        f.write(MISSING_VALUES_CSV)
+    file_path = _columnar_file(source_path, tmp_path)
+
+    expected = pd.read_csv(file_path)
+    assert expected["label"].isna().sum() == 4
+    pd.testing.assert_frame_equal(columnar.read_table(file_path), expected)
+    pd.testing.assert_frame_equal(
+        columnar.read_table(file_path, nrows=3, columns=["x", "label"]),
+        pd.read_csv(file_path, nrows=3, usecols=["x", "label"]))
+
+
+def test_columnar_reader_matches_cosinorage_reader(tmp_path):
+    from cosinorage.datahandlers.utils.generic import read_generic_xD_data
+
+    file_path = _columnar_file(SAMPLE_FILES[0], tmp_path)
+    read_columnar = columnar.with_columnar_reads(read_generic_xD_data)
+    args = dict(data_type="accelerometer-mg", n_dimensions=3, time_format="unix-s")
+
+    expected_meta, meta = {}, {}
+    expected = read_generic_xD_data(file_path, meta_dict=expected_meta, **args)
+    pd.testing.assert_frame_equal(read_columnar(file_path, meta_dict=meta, **args), expected)
+    assert meta == expected_meta
@@ -0,0 +1,63 @@
+"""
+LTTB and resolution downsampling of level frames.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+try:
+    import downsampling
+except ImportError:
+    from backend import downsampling
+
+
+def _level(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2024-01-01", periods=n, freq="min", name="TIMESTAMP")
+    values = pd.Series(rng.gamma(2.0, 20.0, n), index=index)
+    wear = pd.Series(rng.integers(-1, 2, n), index=index)
+    return downsampling.series_to_level(values, wear)
+
+
+@pytest.mark.parametrize("n, points", [(10000, 3), (10000, 500), (1001, 1000), (8640, 1440)])
+def test_lttb_keeps_endpoints_and_returns_points_rows(n, points):
+    level = _level(n)
+    result = downsampling.downsample_points(level, points)
+
+    assert len(result) == points
+    assert result["timestamp"].iloc[0] == level.index[0]
+    assert result["timestamp"].iloc[-1] == level.index[-1]
+    assert result["value"].iloc[0] == level["mean"].iloc[0]
+    assert result["value"].iloc[-1] == level["mean"].iloc[-1]
+    assert result["timestamp"].is_monotonic_increasing and result["timestamp"].is_unique
+
+
+def test_lttb_envelope_covers_selected_points():
+    level = _level(5000, seed=1)
+    result = downsampling.downsample_points(level, 200)
+
+    assert (result["min"] <= result["value"]).all() and (result["value"] <= result["max"]).all()
+    assert (result["min"] <= result["mean"]).all() and (result["mean"] <= result["max"]).all()
+    assert result["min"].min() == level["min"].min()
+    assert result["max"].max() == level["max"].max()
+
+
+def test_lttb_returns_short_series_unchanged():
+    level = _level(50)
+    result = downsampling.downsample_points(level, 100)
+
+    assert len(result) == 50
+    np.testing.assert_array_equal(result["value"], level["mean"])
+
+
+def test_resolution_matches_resample():
+    level = _level(3000, seed=2)
+    values = pd.Series(level["mean"].to_numpy(), index=level.index)
+    result = downsampling.downsample_level(level, resolution="15min")
+    resampled = values.resample("15min")
+
+    np.testing.assert_array_equal(result["timestamp"], resampled.mean().index)
+    np.testing.assert_allclose(result["value"], resampled.mean())
+    np.testing.assert_array_equal(result["min"], resampled.min())
+    np.testing.assert_array_equal(result["max"], resampled.max())
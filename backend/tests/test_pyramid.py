@@ -0,0 +1,53 @@
+"""
+Every level of the ENMO pyramid must match resampling the minute-level data.
+"""
+
+import numpy as np
+import pytest
+
+try:
+    import pyramid
+except ImportError:
+    from backend import pyramid
+
+
+@pytest.fixture(scope="module", params=["sample", "gaps"])
+def ml_data(handlers, request):
+    # Processed data as stored by process_data
+    data = handlers[0].get_ml_data().rename(columns={"enmo": "ENMO"})
+    if request.param == "gaps":
+        # Minutes without wear detection and without ENMO
+        data = data.copy()
+        data.iloc[100:700, data.columns.get_loc("wear")] = -1
+        data.iloc[2000:2090, data.columns.get_loc("ENMO")] = np.nan
+    return data
+
+
+@pytest.mark.parametrize("level_name", pyramid.PYRAMID_LEVELS)
+def test_pyramid_level_matches_resample(ml_data, level_name):
+    level = pyramid.build_enmo_pyramid(ml_data)[level_name]
+    resampled = ml_data["ENMO"].resample(level_name)
+    mean = resampled.mean().dropna()
+    # Minutes without wear detection (-1) or without ENMO are left out of the wear fraction
+    wear = ml_data["wear"].where((ml_data["wear"] >= 0) & ml_data["ENMO"].notna())
+    wear = wear.resample(level_name).mean()
+
+    assert level.index.equals(mean.index)
+    np.testing.assert_allclose(level["mean"], mean, rtol=1e-9)
+    np.testing.assert_allclose(level["min"], resampled.min()[mean.index])
+    np.testing.assert_allclose(level["max"], resampled.max()[mean.index])
+    np.testing.assert_array_equal(level["count"], resampled.count()[mean.index])
+    np.testing.assert_allclose(level["wear"], wear[mean.index], rtol=1e-9)
+
+
+def test_downsampled_pyramid_matches_minute_data(ml_data):
+    pyramid_levels = pyramid.build_enmo_pyramid(ml_data)
+    for resolution in ["15min", "2h", "1D"]:
+        level_name, result = pyramid.downsample_enmo_pyramid(
+            pyramid_levels, ml_data, resolution=resolution)
+        _, expected = pyramid.downsample_enmo_pyramid(None, ml_data, resolution=resolution)
+
+        assert level_name != pyramid.RAW_LEVEL
+        np.testing.assert_array_equal(result["timestamp"], expected["timestamp"])
+        for column in ["value", "min", "max", "wear"]:
+            np.testing.assert_allclose(result[column], expected[column], rtol=1e-9)
@@ -0,0 +1,78 @@
+"""
+Queries over processed minute-level data.
+
+After processing, the minute-level frame of a file is kept with a sorted
+DatetimeIndex, so that time ranges are located by binary search and only the
+requested rows and columns are serialized.
+"""
+
+from typing import List, Optional, Tuple
+
+import pandas as pd
+
+# Index name of processed minute-level frames
+TIME_INDEX = "TIMESTAMP"
+
+# Default number of rows per page (one day of minute-level data)
+DEFAULT_PAGE_SIZE = 1440
+
+# Largest page size accepted by timeseries queries
+MAX_PAGE_SIZE = 100000
+
+
+def to_time_indexed(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Return the processed data with a sorted TIMESTAMP index
+    """
+    frame = df.set_index(TIME_INDEX)
+    frame.index = pd.DatetimeIndex(frame.index, name=TIME_INDEX)
+    if not frame.index.is_monotonic_increasing:
+        frame = frame.sort_index()
+    return frame
+
+
+def parse_time_bound(value: Optional[str]) -> Optional[pd.Timestamp]:
+    """
+    Parse a start/end bound given as ISO 8601 datetime or epoch milliseconds
+
+    Raises ValueError if the value cannot be parsed.
+    """
+    if value is None or value == "":
+        return None
+    if value.lstrip("-").isdigit():
+        return pd.Timestamp(int(value), unit="ms")
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        # Processed data is in naive local time
+        timestamp = timestamp.tz_localize(None)
+    return timestamp
+
+
+def select_timeseries(frame: pd.DataFrame, start: Optional[pd.Timestamp] = None,
+                      end: Optional[pd.Timestamp] = None,
+                      columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Select the rows between start and end (both inclusive) and the given columns
+
+    Raises ValueError for columns that do not exist.
+    """
+    if columns:
+        unknown = [col for col in columns if col not in frame.columns]
+        if unknown:
+            raise ValueError(
+                f"Unknown columns: {', '.join(unknown)}. Available columns: {', '.join(map(str, frame.columns))}")
+        frame = frame[columns]
+
+    # Binary search on the sorted index
+    lower = 0 if start is None else frame.index.searchsorted(start, side="left")
+    upper = len(frame) if end is None else frame.index.searchsorted(end, side="right")
+    return frame.iloc[lower:upper]
+
+
+def paginate(frame: pd.DataFrame, page: int, page_size: int) -> Tuple[pd.DataFrame, int]:
+    """
+    Return the rows of a 1-based page and the total number of pages
+    """
+    total_pages = max(1, -(-len(frame) // page_size))
+    offset = (page - 1) * page_size
+    return frame.iloc[offset:offset + page_size], total_pages
@@ -0,0 +1,273 @@
+"""
+Resumable chunked uploads.
+
+Large files can be uploaded as a sequence of chunks instead of a single request.
+A client initiates an upload session, sends the chunks (in any order and in
+parallel) with their byte offset, and finalizes the session with a checksum of
+the whole file. After a dropped connection only the missing byte ranges need to
+be sent again.
+
+Sessions are recorded in the shared state database and their files are
+assembled in the shared artifact directory, so the chunks of one upload may be
+sent to different API worker processes.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import aiofiles
+
+try:
+    from state_store import StateDatabase
+except ImportError:
+    from backend.state_store import StateDatabase
+
+logger = logging.getLogger(__name__)
+
+# Chunk size suggested to clients when an upload session is initiated
+DEFAULT_UPLOAD_CHUNK_SIZE_BYTES = 8 * 1024 * 1024  # 8MB
+
+# Block size used to hash the assembled file
+CHECKSUM_BLOCK_SIZE_BYTES = 1024 * 1024
+
+SUPPORTED_CHECKSUM_ALGORITHMS = ("sha256", "md5")
+
+
+class UploadSessionError(Exception):
+    """
+    Raised when a chunk or a finalize request is inconsistent with its upload session
+    """
+
+
+def _add_range(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+    """
+    Add the byte range [start, end) to a sorted list of disjoint ranges and merge overlaps
+    """
+    merged = []
+    for range_start, range_end in sorted(ranges + [[start, end]]):
+        if merged and range_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], range_end)
+        else:
+            merged.append([range_start, range_end])
+    return merged
+
+
+def _missing_ranges(ranges: List[List[int]], total_size: int) -> List[List[int]]:
+    """
+    Return the byte ranges of [0, total_size) that are not covered by ranges
+    """
+    missing = []
+    position = 0
+    for range_start, range_end in ranges:
+        if range_start > position:
+            missing.append([position, range_start])
+        position = max(position, range_end)
+    if position < total_size:
+        missing.append([position, total_size])
+    return missing
+
+
+def compute_file_checksum(file_path: str, algorithm: str = "sha256") -> str:
+    """
+    Return the hex digest of a file, read in fixed-size blocks
+    """
+    digest = hashlib.new(algorithm)
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(CHECKSUM_BLOCK_SIZE_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class UploadSessionManager:
+    """
+    Keeps track of chunked upload sessions and assembles their files on disk
+
+    The file of every session is assembled in its own directory below root_dir.
+    """
+
+    def __init__(self, db: StateDatabase, root_dir: str):
+        self.db = db
+        self.root_dir = root_dir
+
+    def create(self, filename: str, total_size: int,
+               metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Start an upload session and preallocate the target file
+
+        metadata is kept with the session and returned on finalize so that the
+        upload can be registered like a regular one.
+        """
+        if total_size < 0:
+            raise UploadSessionError("total_size must not be negative")
+
+        upload_id = uuid.uuid4().hex
+        temp_dir = os.path.join(self.root_dir, upload_id)
+        os.makedirs(temp_dir)
+        file_name = os.path.basename(filename)
+        part_path = os.path.join(temp_dir, f"{file_name}.part")
+
+        # Preallocate the file so that chunks can be written at any offset
+        with open(part_path, "wb") as f:
+            f.truncate(total_size)
+
+        session = {
+            "upload_id": upload_id,
+            "filename": file_name,
+            "total_size": total_size,
+            "metadata": metadata or {},
+            "temp_dir": temp_dir,
+            "part_path": part_path,
+            "file_path": os.path.join(temp_dir, file_name)
+        }
+        self.db.insert_upload_session(upload_id, session, time.time())
+        logger.info(
+            f"Started upload session {upload_id} for {file_name} ({total_size} bytes)")
+        return self.get(upload_id)
+
+    def get(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the session for upload_id, or None if it does not exist
+        """
+        row = self.db.get_upload_session(upload_id)
+        if row is None:
+            return None
+        session, created_at, updated_at, ranges = row
+        received_ranges = []
+        for start, end in ranges:
+            received_ranges = _add_range(received_ranges, start, end)
+        return {
+            **session,
+            "received_ranges": received_ranges,
+            "created_at": datetime.fromtimestamp(created_at),
+            "updated_at": datetime.fromtimestamp(updated_at)
+        }
+
+    def get_status(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the received and missing byte ranges of an upload session
+        """
+        session = self.get(upload_id)
+        if session is None:
+            return None
+
+        received_bytes = sum(end - start for start,
+                             end in session["received_ranges"])
+        return {
+            "upload_id": upload_id,
+            "filename": session["filename"],
+            "total_size": session["total_size"],
+            "received_bytes": received_bytes,
+            "received_ranges": session["received_ranges"],
+            "missing_ranges": _missing_ranges(session["received_ranges"], session["total_size"]),
+            "complete": received_bytes == session["total_size"]
+        }
+
+    async def write_chunk(self, upload_id: str, offset: int,
+                          chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+        """
+        Write the bytes produced by chunks to the session file starting at offset
+
+        Chunks of the same session may be written concurrently (also by
+        different processes) since every call uses its own file handle and
+        writes to its own byte range.
+        """
+        session = self.get(upload_id)
+        if session is None:
+            raise KeyError(upload_id)
+        if offset < 0 or offset > session["total_size"]:
+            raise UploadSessionError(
+                f"Offset {offset} is outside of the file (size {session['total_size']} bytes)")
+
+        position = offset
+        async with aiofiles.open(session["part_path"], "r+b") as buffer:
+            await buffer.seek(offset)
+            async for data in chunks:
+                if not data:
+                    continue
+                if position + len(data) > session["total_size"]:
+                    raise UploadSessionError(
+                        f"Chunk exceeds the declared file size of {session['total_size']} bytes")
+                await buffer.write(data)
+                position += len(data)
+
+        if not self.db.add_upload_range(upload_id, offset, position, time.time()):
+            # The session was finalized or aborted meanwhile
+            raise KeyError(upload_id)
+        return self.get_status(upload_id)
+
+    async def finalize(self, upload_id: str, checksum: str,
+                       algorithm: str = "sha256") -> Dict[str, Any]:
+        """
+        Verify that the file is complete and matches checksum, and close the session
+
+        Returns the session; its file_path points to the assembled file and its
+        content_hash is the SHA-256 digest of the file.
+        """
+        session = self.get(upload_id)
+        if session is None:
+            raise KeyError(upload_id)
+
+        algorithm = algorithm.lower()
+        if algorithm not in SUPPORTED_CHECKSUM_ALGORITHMS:
+            raise UploadSessionError(
+                f"Unsupported checksum algorithm '{algorithm}'. Supported: {', '.join(SUPPORTED_CHECKSUM_ALGORITHMS)}")
+
+        missing = _missing_ranges(
+            session["received_ranges"], session["total_size"])
+        if missing:
+            raise UploadSessionError(
+                f"Upload is incomplete, missing byte ranges: {missing}")
+
+        # Hash the assembled file without blocking the event loop
+        loop = asyncio.get_event_loop()
+        actual_checksum = await loop.run_in_executor(
+            None, compute_file_checksum, session["part_path"], algorithm)
+        if actual_checksum != checksum.lower():
+            raise UploadSessionError(
+                f"Checksum mismatch: expected {checksum}, got {actual_checksum}")
+        if algorithm == "sha256":
+            session["content_hash"] = actual_checksum
+        else:
+            session["content_hash"] = await loop.run_in_executor(
+                None, compute_file_checksum, session["part_path"], "sha256")
+
+        # Only one of concurrent finalize requests closes the session
+        if self.db.delete_upload_session(upload_id) is None:
+            raise KeyError(upload_id)
+        os.replace(session["part_path"], session["file_path"])
+        logger.info(
+            f"Finalized upload session {upload_id} for {session['filename']}")
+        return session
+
+    def abort(self, upload_id: str) -> bool:
+        """
+        Discard an upload session and its partial file. Returns False if it does not exist.
+        """
+        session = self.db.delete_upload_session(upload_id)
+        if session is None:
+            return False
+        shutil.rmtree(session["temp_dir"], ignore_errors=True)
+        logger.info(f"Aborted upload session {upload_id}")
+        return True
+
+    def cleanup(self, cutoff_time: datetime) -> int:
+        """
+        Abort sessions without activity since cutoff_time. Returns the number of removed sessions.
+        """
+        sessions_to_remove = self.db.upload_sessions_updated_before(
+            cutoff_time.timestamp())
+        return sum(self.abort(upload_id) for upload_id in sessions_to_remove)
+
+    def clear(self):
+        """
+        Abort all upload sessions
+        """
+        for upload_id in self.db.list_upload_sessions():
+            self.abort(upload_id)